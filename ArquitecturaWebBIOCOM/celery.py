@@ -1,4 +1,4 @@
-import os, time
+import os
 from celery import Celery
 from django.conf import settings
 
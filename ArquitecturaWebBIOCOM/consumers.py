@@ -17,6 +17,9 @@ class NotificacionConsumer(AsyncWebsocketConsumer):
             await self.accept()
 
     async def disconnect(self, close_code):
+        # Conexiones rechazadas en connect() no llegaron a unirse al grupo
+        if not hasattr(self, 'user_group_name'):
+            return
         await self.channel_layer.group_discard(
             self.user_group_name,
             self.channel_name
@@ -11,7 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 import os
 from pathlib import Path
-from decouple import config
+from decouple import config, Csv
 import matplotlib
 matplotlib.use('Agg')
 
@@ -173,6 +173,10 @@ CELERY_BROKER_TRANSPORT_OPTIONS = {
         ("127.0.0.1", 26381),
         ("127.0.0.1", 26382),
     ],
+    # Prioridad por mensaje (0 = la más alta); la usan los carriles del outbox
+    "priority_steps": list(range(10)),
+    "sep": ":",
+    "queue_order_strategy": "priority",
 }
 
 CELERY_TASK_ALWAYS_EAGER = False
@@ -199,10 +203,248 @@ CELERY_WORKER_PREFETCH_MULTIPLIER = 1
 import multiprocessing
 CELERY_WORKER_CONCURRENCY = multiprocessing.cpu_count()
 
+# Hilos de inferencia por proceso (torch/TF/onnxruntime/BLAS); 0 = núcleos / concurrencia.
+# Ver analysis/thread_budget.py y `manage.py benchmark_threads`
+ANALYSIS_THREADS_PER_PROCESS = config('ANALYSIS_THREADS_PER_PROCESS', default=0, cast=int)
+ANALYSIS_INTEROP_THREADS     = config('ANALYSIS_INTEROP_THREADS', default=1, cast=int)
+
 # Timeouts razonables
 CELERY_TASK_TIME_LIMIT      = 300
 CELERY_TASK_SOFT_TIME_LIMIT = 240
 
+# Los hijos precargan modelos en worker_process_init (analysis/warmup.py) antes
+# de consumir tareas; el padre espera hasta este tiempo a que terminen
+CELERY_WORKER_PROC_ALIVE_TIMEOUT = config('CELERY_WORKER_PROC_ALIVE_TIMEOUT', default=120, cast=float)
+
+# Afinidad de modelo: launch_analysis_task va a la cola del nodo que elige el
+# rendezvous hashing sobre las colas <prefijo><hostname> vivas (analysis/routing.py)
+CELERY_TASK_ROUTES = ['analysis.routing.AffinityRouter']
+ANALYSIS_AFFINITY_ENABLED         = config('ANALYSIS_AFFINITY_ENABLED', default=False, cast=bool)
+ANALYSIS_AFFINITY_KEY             = config('ANALYSIS_AFFINITY_KEY', default='model')  # 'model' o 'framework'
+ANALYSIS_AFFINITY_REPLICAS        = config('ANALYSIS_AFFINITY_REPLICAS', default=1, cast=int)
+ANALYSIS_AFFINITY_QUEUE_PREFIX    = config('ANALYSIS_AFFINITY_QUEUE_PREFIX', default='analysis.')
+ANALYSIS_AFFINITY_REFRESH_SECONDS = config('ANALYSIS_AFFINITY_REFRESH_SECONDS', default=30, cast=int)
+ANALYSIS_AFFINITY_INSPECT_TIMEOUT = config('ANALYSIS_AFFINITY_INSPECT_TIMEOUT', default=0.5, cast=float)
+# Colas vivas cacheadas para todos los procesos (un solo inspect() por intervalo)
+ANALYSIS_AFFINITY_CACHE           = config('ANALYSIS_AFFINITY_CACHE', default='shared')
+
+# Servicio de Análisis: cache LRU de modelos deserializados (por proceso)
+ANALYSIS_MODEL_CACHE_MAX_ENTRIES = config('ANALYSIS_MODEL_CACHE_MAX_ENTRIES', default=8, cast=int)
+ANALYSIS_MODEL_CACHE_MAX_BYTES   = config('ANALYSIS_MODEL_CACHE_MAX_BYTES', default=2 * 1024 ** 3, cast=int)
+
+# Warm-up de workers: ids explícitos o los TOP_N modelos más usados en la ventana
+ANALYSIS_WARMUP_ENABLED      = config('ANALYSIS_WARMUP_ENABLED', default=True, cast=bool)
+ANALYSIS_WARMUP_MODEL_IDS    = config('ANALYSIS_WARMUP_MODEL_IDS', default='', cast=Csv(int))
+ANALYSIS_WARMUP_TOP_N        = config('ANALYSIS_WARMUP_TOP_N', default=3, cast=int)
+ANALYSIS_WARMUP_WINDOW_HOURS = config('ANALYSIS_WARMUP_WINDOW_HOURS', default=24, cast=int)
+
+# Micro-batching: tope de la espera batch_window_ms de cada MLModel; la tarea
+# líder ocupa su proceso de prefork (prefetch 1) mientras espera
+ANALYSIS_BATCH_MAX_WINDOW_MS = config('ANALYSIS_BATCH_MAX_WINDOW_MS', default=50, cast=int)
+
+# Inferencia síncrona (?sync=1) para payloads pequeños; si no cabe, va por Celery
+ANALYSIS_SYNC_ENABLED   = config('ANALYSIS_SYNC_ENABLED', default=True, cast=bool)
+ANALYSIS_SYNC_MAX_ROWS  = config('ANALYSIS_SYNC_MAX_ROWS', default=16, cast=int)
+ANALYSIS_SYNC_BUDGET_MS = config('ANALYSIS_SYNC_BUDGET_MS', default=200, cast=int)
+ANALYSIS_SYNC_THREADS   = config('ANALYSIS_SYNC_THREADS', default=4, cast=int)
+# Pool aparte para precargar modelos fríos (no ocupa hilos de predict)
+ANALYSIS_SYNC_WARM_THREADS = config('ANALYSIS_SYNC_WARM_THREADS', default=1, cast=int)
+
+# Puntuación de dataset completo: filas por chunk leído del CSV
+ANALYSIS_DATASET_CHUNK_ROWS = config('ANALYSIS_DATASET_CHUNK_ROWS', default=10000, cast=int)
+# Datasets desde este tamaño se reparten en shards paralelos de ANALYSIS_SHARD_BYTES
+ANALYSIS_SHARD_MIN_BYTES    = config('ANALYSIS_SHARD_MIN_BYTES', default=64 * 1024 ** 2, cast=int)
+ANALYSIS_SHARD_BYTES        = config('ANALYSIS_SHARD_BYTES', default=32 * 1024 ** 2, cast=int)
+
+# Formato de los archivos de predicciones: 'npy' (mmap, por defecto) o 'json'
+ANALYSIS_RESULT_FORMAT    = config('ANALYSIS_RESULT_FORMAT', default='npy')
+# Filas devueltas por defecto en GET /analisis/<id>/ (?offset=&limit=)
+ANALYSIS_RESULT_PAGE_SIZE = config('ANALYSIS_RESULT_PAGE_SIZE', default=1000, cast=int)
+# Desde cuántas filas los adaptadores devuelven ndarray en vez de lista
+ANALYSIS_NUMPY_OUTPUT_MIN_ROWS = config('ANALYSIS_NUMPY_OUTPUT_MIN_ROWS', default=1024, cast=int)
+
+# Modelos ONNX con el grafo ya optimizado (vacío = MEDIA_ROOT/cache/onnx)
+ANALYSIS_ONNX_CACHE_DIR = config('ANALYSIS_ONNX_CACHE_DIR', default='')
+
+# Preparación de modelos PyTorch al cargarlos: '' (eager), 'trace', 'script' o 'compile'
+ANALYSIS_TORCH_COMPILE = config('ANALYSIS_TORCH_COMPILE', default='')
+
+# Variantes ONNX/int8 de modelos sklearn y PyTorch (MLModel.auto_optimize)
+ANALYSIS_VARIANT_QUANTIZE    = config('ANALYSIS_VARIANT_QUANTIZE', default=True, cast=bool)
+ANALYSIS_VARIANT_PARITY_ROWS = config('ANALYSIS_VARIANT_PARITY_ROWS', default=256, cast=int)
+ANALYSIS_VARIANT_BENCH_RUNS  = config('ANALYSIS_VARIANT_BENCH_RUNS', default=20, cast=int)
+# Tolerancias de paridad: salidas continuas (máx. diferencia) y etiquetas (fracción distinta)
+ANALYSIS_VARIANT_MAX_DELTA    = config('ANALYSIS_VARIANT_MAX_DELTA', default=0.01, cast=float)
+ANALYSIS_VARIANT_MAX_MISMATCH = config('ANALYSIS_VARIANT_MAX_MISMATCH', default=0.01, cast=float)
+
+# Circuit breakers por MLModel y por framework (estado en CACHES[ANALYSIS_BREAKER_CACHE];
+# con RedisCache las transiciones son un script Lua atómico compartido por los workers,
+# con el reloj del servidor Redis)
+ANALYSIS_BREAKER_CACHE                  = config('ANALYSIS_BREAKER_CACHE', default='shared')
+ANALYSIS_BREAKER_MAX_FAILURES           = config('ANALYSIS_BREAKER_MAX_FAILURES', default=5, cast=int)
+ANALYSIS_BREAKER_FRAMEWORK_MAX_FAILURES = config('ANALYSIS_BREAKER_FRAMEWORK_MAX_FAILURES', default=20, cast=int)
+ANALYSIS_BREAKER_RESET_TIMEOUT          = config('ANALYSIS_BREAKER_RESET_TIMEOUT', default=60, cast=int)
+# Segundos que cada proceso reutiliza el último estado leído (0 = consulta siempre)
+ANALYSIS_BREAKER_STATE_TTL              = config('ANALYSIS_BREAKER_STATE_TTL', default=1.0, cast=float)
+
+# Limiter adaptativo (AIMD) de análisis concurrentes por MLModel y framework. Necesita Redis
+# en ANALYSIS_LIMITER_CACHE (con una cache local al proceso se desactiva con un warning).
+# El objetivo de latencia de predict por fila es ANALYSIS_LIMITER_TARGET_MS o, si es 0,
+# la mínima observada * ANALYSIS_LIMITER_TOLERANCE.
+ANALYSIS_LIMITER_ENABLED        = config('ANALYSIS_LIMITER_ENABLED', default=True, cast=bool)
+ANALYSIS_LIMITER_CACHE          = config('ANALYSIS_LIMITER_CACHE', default='shared')
+ANALYSIS_LIMITER_INITIAL        = config('ANALYSIS_LIMITER_INITIAL', default=8, cast=int)
+ANALYSIS_LIMITER_MIN            = config('ANALYSIS_LIMITER_MIN', default=1, cast=int)
+ANALYSIS_LIMITER_MAX            = config('ANALYSIS_LIMITER_MAX', default=64, cast=int)
+ANALYSIS_LIMITER_TARGET_MS      = config('ANALYSIS_LIMITER_TARGET_MS', default=0, cast=float)
+ANALYSIS_LIMITER_TOLERANCE      = config('ANALYSIS_LIMITER_TOLERANCE', default=2.0, cast=float)
+ANALYSIS_LIMITER_BACKOFF        = config('ANALYSIS_LIMITER_BACKOFF', default=0.9, cast=float)
+# Saturado: se reintenta hasta MAX_DEFERRALS veces (cada DEFER_SECONDS..2x) y luego se descarta
+ANALYSIS_LIMITER_MAX_DEFERRALS  = config('ANALYSIS_LIMITER_MAX_DEFERRALS', default=5, cast=int)
+ANALYSIS_LIMITER_DEFER_SECONDS  = config('ANALYSIS_LIMITER_DEFER_SECONDS', default=2.0, cast=float)
+
+# /metrics (Prometheus): cada proceso vuelca sus contadores a CACHES[ANALYSIS_METRICS_CACHE]
+# cada FLUSH_SECONDS y collect_metrics_task calcula los gauges de BD cada COLLECT_SECONDS.
+# Debe ser compartida: con LocMem cada proceso vería solo sus propios contadores.
+ANALYSIS_METRICS_CACHE           = config('ANALYSIS_METRICS_CACHE', default='shared')
+ANALYSIS_METRICS_FLUSH_SECONDS   = config('ANALYSIS_METRICS_FLUSH_SECONDS', default=15, cast=int)
+ANALYSIS_METRICS_COLLECT_SECONDS = config('ANALYSIS_METRICS_COLLECT_SECONDS', default=15, cast=int)
+# /metrics exige 'Authorization: Bearer <token>'. Sin token responde 401, salvo que
+# ANALYSIS_METRICS_PUBLIC lo abra explícitamente (scrape desde la red interna)
+ANALYSIS_METRICS_TOKEN           = config('ANALYSIS_METRICS_TOKEN', default='')
+ANALYSIS_METRICS_PUBLIC          = config('ANALYSIS_METRICS_PUBLIC', default=False, cast=bool)
+CELERY_BEAT_SCHEDULE = {
+    'analysis-collect-metrics': {
+        'task': 'analysis.tasks.collect_metrics_task',
+        'schedule': ANALYSIS_METRICS_COLLECT_SECONDS,
+    },
+}
+
+# Outbox de launch_analysis_task (analysis/outbox.py): la vista solo inserta la
+# fila; `manage.py dispatch_outbox` la publica en lotes (esperando POLL_SECONDS
+# cuando no hay nada) y beat barre cada SWEEP_SECONDS por si no está corriendo.
+ANALYSIS_OUTBOX_BATCH_SIZE    = config('ANALYSIS_OUTBOX_BATCH_SIZE', default=100, cast=int)
+ANALYSIS_OUTBOX_POLL_SECONDS  = config('ANALYSIS_OUTBOX_POLL_SECONDS', default=0.2, cast=float)
+ANALYSIS_OUTBOX_SWEEP_SECONDS = config('ANALYSIS_OUTBOX_SWEEP_SECONDS', default=5, cast=int)
+ANALYSIS_OUTBOX_SWEEP_BATCHES = config('ANALYSIS_OUTBOX_SWEEP_BATCHES', default=10, cast=int)
+CELERY_BEAT_SCHEDULE['analysis-dispatch-outbox'] = {
+    'task': 'analysis.tasks.dispatch_outbox_task',
+    'schedule': ANALYSIS_OUTBOX_SWEEP_SECONDS,
+}
+
+# Reparto justo del outbox (analysis/fair_scheduler.py): como mucho
+# MAX_IN_FLIGHT análisis publicados sin terminar (0 = sin tope; conviene algo
+# por encima de la concurrencia total de los workers). Los cupos se reparten
+# por round-robin ponderado entre carriles (en orden de prioridad) y, dentro
+# de cada uno, entre usuarios. USER_WEIGHTS: "usuario=peso,otro=peso".
+# DISPATCH_TTL: segundos tras publicar un análisis que sigue PENDING para volver a publicarlo.
+ANALYSIS_FAIR_MAX_IN_FLIGHT        = config('ANALYSIS_FAIR_MAX_IN_FLIGHT', default=64, cast=int)
+ANALYSIS_FAIR_DISPATCH_TTL         = config('ANALYSIS_FAIR_DISPATCH_TTL', default=900, cast=int)
+ANALYSIS_FAIR_INTERACTIVE_MAX_ROWS = config('ANALYSIS_FAIR_INTERACTIVE_MAX_ROWS', default=10, cast=int)
+ANALYSIS_FAIR_USER_WEIGHTS         = config('ANALYSIS_FAIR_USER_WEIGHTS', default='', cast=Csv())
+ANALYSIS_FAIR_LANES = {
+    'interactive': {
+        'weight': config('ANALYSIS_FAIR_INTERACTIVE_WEIGHT', default=4, cast=int),
+        'priority': 0,
+    },
+    'bulk': {
+        'weight': config('ANALYSIS_FAIR_BULK_WEIGHT', default=1, cast=int),
+        'priority': 6,
+    },
+}
+
+# Control de admisión (analysis/admission.py) para POST /api/v1/analysis/
+# ('analysis') y la subida de datasets ('upload'): token bucket por usuario
+# (RATES = reposición, '' = sin límite; BURSTS = capacidad) y tope global de
+# peticiones en curso (CONCURRENCY, 0 = sin tope). Rechazos: 429 + Retry-After.
+# La cache debe ser Redis (el límite es del cluster); con una cache local al proceso
+# no se aplica ningún control y se registra un warning.
+ANALYSIS_ADMISSION_CACHE = config('ANALYSIS_ADMISSION_CACHE', default='shared')
+ANALYSIS_ADMISSION_RATES = {
+    'analysis': config('ANALYSIS_ADMISSION_ANALYSIS_RATE', default='120/min'),
+    'upload': config('ANALYSIS_ADMISSION_UPLOAD_RATE', default='10/min'),
+}
+ANALYSIS_ADMISSION_BURSTS = {
+    'analysis': config('ANALYSIS_ADMISSION_ANALYSIS_BURST', default=30, cast=int),
+    'upload': config('ANALYSIS_ADMISSION_UPLOAD_BURST', default=3, cast=int),
+}
+ANALYSIS_ADMISSION_CONCURRENCY = {
+    'analysis': config('ANALYSIS_ADMISSION_ANALYSIS_CONCURRENCY', default=64, cast=int),
+    'upload': config('ANALYSIS_ADMISSION_UPLOAD_CONCURRENCY', default=8, cast=int),
+}
+# Un slot sin liberar (proceso caído) vence a los LEASE segundos
+ANALYSIS_ADMISSION_SLOT_LEASE    = config('ANALYSIS_ADMISSION_SLOT_LEASE', default=600, cast=int)
+ANALYSIS_ADMISSION_RETRY_SECONDS = config('ANALYSIS_ADMISSION_RETRY_SECONDS', default=2, cast=int)
+
+# Channel layer de NotificacionConsumer (ws/analysis/): los workers publican
+# en el grupo user_<id> el avance de análisis y PreprocessingJob. Usa los
+# mismos sentinels que el broker; en desarrollo sin Redis se puede usar
+# CHANNEL_LAYER_BACKEND=channels.layers.InMemoryChannelLayer (solo un proceso).
+CHANNEL_LAYER_BACKEND = config('CHANNEL_LAYER_BACKEND', default='channels_redis.core.RedisChannelLayer')
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': CHANNEL_LAYER_BACKEND,
+    },
+}
+if CHANNEL_LAYER_BACKEND.startswith('channels_redis'):
+    CHANNEL_LAYERS['default']['CONFIG'] = {
+        'hosts': [{
+            'sentinels': CELERY_BROKER_TRANSPORT_OPTIONS['sentinels'],
+            'master_name': CELERY_BROKER_TRANSPORT_OPTIONS['master_name'],
+        }],
+        'capacity': config('CHANNEL_LAYER_CAPACITY', default=200, cast=int),
+        'expiry': config('CHANNEL_LAYER_EXPIRY', default=60, cast=int),
+    }
+
+# Long-poll/SSE de estado (GET .../<pk>/status/, ver analysis/status_watch.py).
+# La cache guarda el último mensaje de cada objeto; es la señal de cambio
+# cuando no hay channel layer, así que debe ser compartida con los workers.
+ANALYSIS_STATUS_CACHE          = config('ANALYSIS_STATUS_CACHE', default='shared')
+ANALYSIS_STATUS_TTL            = config('ANALYSIS_STATUS_TTL', default=3600, cast=int)
+ANALYSIS_STATUS_TIMEOUT        = config('ANALYSIS_STATUS_TIMEOUT', default=25, cast=float)
+ANALYSIS_STATUS_MAX_TIMEOUT    = config('ANALYSIS_STATUS_MAX_TIMEOUT', default=60, cast=float)
+ANALYSIS_STATUS_STREAM_SECONDS = config('ANALYSIS_STATUS_STREAM_SECONDS', default=300, cast=float)
+ANALYSIS_STATUS_POLL_SECONDS   = config('ANALYSIS_STATUS_POLL_SECONDS', default=1.0, cast=float)
+# GET /api/v1/analysis/status/: máximo de ids (o de filas con updated_since) por petición
+ANALYSIS_BULK_STATUS_MAX       = config('ANALYSIS_BULK_STATUS_MAX', default=200, cast=int)
+
+# Cache compartida por web, workers y beat: lo que debe valer para todo el
+# cluster (CACHES['shared']). En desarrollo sin Redis se puede usar
+# ANALYSIS_SHARED_CACHE_BACKEND=django.core.cache.backends.locmem.LocMemCache
+# (cada proceso ve solo lo suyo).
+ANALYSIS_SHARED_CACHE_BACKEND  = config('ANALYSIS_SHARED_CACHE_BACKEND', default='django.core.cache.backends.redis.RedisCache')
+ANALYSIS_SHARED_CACHE_LOCATION = config('ANALYSIS_SHARED_CACHE_LOCATION', default='redis://127.0.0.1:6379/1')
+
+# Cache de predicciones (MLModel + sha256 del archivo + vector_2d). Por
+# defecto en el mismo Redis compartido: la vista encuentra lo que guardaron
+# los workers. Con Redis el tamaño lo acota maxmemory + allkeys-lru del
+# servidor, no MAX_ENTRIES (que solo aplica a LocMem).
+ANALYSIS_PREDICTION_CACHE_ENABLED  = config('ANALYSIS_PREDICTION_CACHE_ENABLED', default=True, cast=bool)
+ANALYSIS_PREDICTION_CACHE_BACKEND  = config('ANALYSIS_PREDICTION_CACHE_BACKEND', default=ANALYSIS_SHARED_CACHE_BACKEND)
+ANALYSIS_PREDICTION_CACHE_LOCATION = config('ANALYSIS_PREDICTION_CACHE_LOCATION', default=ANALYSIS_SHARED_CACHE_LOCATION)
+ANALYSIS_PREDICTION_CACHE_TTL      = config('ANALYSIS_PREDICTION_CACHE_TTL', default=3600, cast=int)
+ANALYSIS_PREDICTION_CACHE_ENTRIES  = config('ANALYSIS_PREDICTION_CACHE_ENTRIES', default=10000, cast=int)
+# Resultados con más filas no se cachean
+ANALYSIS_PREDICTION_CACHE_MAX_ROWS = config('ANALYSIS_PREDICTION_CACHE_MAX_ROWS', default=1000, cast=int)
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': ANALYSIS_SHARED_CACHE_BACKEND,
+        'LOCATION': ANALYSIS_SHARED_CACHE_LOCATION,
+    },
+    'predictions': {
+        'BACKEND': ANALYSIS_PREDICTION_CACHE_BACKEND,
+        'LOCATION': ANALYSIS_PREDICTION_CACHE_LOCATION,
+        'TIMEOUT': ANALYSIS_PREDICTION_CACHE_TTL,
+        'KEY_PREFIX': 'analysis',
+    },
+}
+if 'redis' not in ANALYSIS_PREDICTION_CACHE_BACKEND:
+    CACHES['predictions']['OPTIONS'] = {'MAX_ENTRIES': ANALYSIS_PREDICTION_CACHE_ENTRIES}
+
 
 
 
@@ -19,7 +19,7 @@ from django.urls import path, include
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 from django.conf.urls.static import static
 from django.conf import settings
-from analysis.views import HyperparameterListView, UserAnalysisAPIView, UserAnalysisListAPIView, LastUserAnalysisAPIView
+from analysis.views import HyperparameterListView, UserAnalysisAPIView, UserAnalysisListAPIView, LastUserAnalysisAPIView, metrics_view
 
 
 urlpatterns = [
@@ -34,6 +34,7 @@ urlpatterns = [
     path('analisis/<int:pk>/', UserAnalysisAPIView.as_view(), name='user-analysis-detail'),
     path('analisis/', UserAnalysisListAPIView.as_view(), name='user-analysis-list'),
     path('analisis/ultimo/', LastUserAnalysisAPIView.as_view(), name='last-user-analysis'),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 if settings.DEBUG:
@@ -1,15 +1,36 @@
 # analysis/adapters.py
+"""
+Registro de adaptadores por framework.
 
-import io
+Los adaptadores se declaran por nombre ('sklearn', 'pytorch', ...) y el
+framework que los respalda (torch, tensorflow, onnxruntime) solo se importa
+la primera vez que el adaptador carga o ejecuta un modelo. Así los procesos
+web y los workers que nunca usan un framework no pagan su arranque ni su RSS.
+
+    from analysis.adapters import ADAPTERS, loaded_frameworks
+    loaded_frameworks()  # {'torch': 2.91} -> segundos que tomó cada import
+"""
+
+import sys
+import time
+import logging
+import importlib
+import threading
 from abc import ABC, abstractmethod
-import joblib
-import torch
-import tensorflow as tf
-import onnxruntime as ort
 import numpy as np
+from django.conf import settings
+from . import thread_budget
+from .onnx_session import OnnxSession, build_session
+from .torch_runtime import TorchModel
+
+logger = logging.getLogger(__name__)
 
 ADAPTERS = {}
 
+# módulo -> segundos que tomó importarlo en este proceso
+_LOADED_FRAMEWORKS = {}
+_import_lock = threading.Lock()
+
 def register_adapter(name):
     """Decorator para registrar cada adaptador por clave 'sklearn', 'pytorch', etc."""
     def decorator(cls):
@@ -17,9 +38,53 @@ def register_adapter(name):
         return cls
     return decorator
 
+def import_framework(module_name):
+    """
+    Importa el módulo del framework bajo demanda y registra cuánto tardó.
+    Las llamadas siguientes devuelven el módulo ya importado.
+    """
+    module = sys.modules.get(module_name)
+    if module is not None and module_name in _LOADED_FRAMEWORKS:
+        return module
+    with _import_lock:
+        if module_name not in _LOADED_FRAMEWORKS:
+            thread_budget.prepare_import()
+            start = time.perf_counter()
+            module = importlib.import_module(module_name)
+            _LOADED_FRAMEWORKS[module_name] = round(time.perf_counter() - start, 3)
+            thread_budget.configure_framework(module_name, module)
+            logger.info("Framework %s importado en %.3fs", module_name, _LOADED_FRAMEWORKS[module_name])
+        return sys.modules[module_name]
+
+def loaded_frameworks() -> dict:
+    """Frameworks importados por los adaptadores en este proceso y su tiempo de import."""
+    return dict(_LOADED_FRAMEWORKS)
+
+def as_predictions(arr, copy=False):
+    """
+    Salida de predict: lista para resultados chicos; desde
+    ANALYSIS_NUMPY_OUTPUT_MIN_ROWS filas se devuelve el ndarray tal cual,
+    sin el costo de .tolist() (result_store lo escribe directo a .npy).
+    copy=True cuando `arr` es un buffer que el adaptador reutiliza.
+    """
+    if len(arr) < getattr(settings, 'ANALYSIS_NUMPY_OUTPUT_MIN_ROWS', 1024):
+        return arr.tolist()
+    return arr.copy() if copy else arr
+
 class BaseAdapter(ABC):
     """Interfaz común: carga un modelo y ofrece un método `predict(data, **params)`."""
 
+    # Si es True, execute() lee el dataset y lo pasa como predict(..., dataset=df)
+    uses_dataset = False
+
+    # Módulo que respalda al adaptador; se importa en el primer uso
+    framework_module = None
+
+    @property
+    def fw(self):
+        """Módulo del framework, importado perezosamente."""
+        return import_framework(self.framework_module)
+
     @abstractmethod
     def load(self, file_obj):
         """Carga el modelo desde un file-like object y retorna un objeto runnable."""
@@ -32,38 +97,46 @@ class BaseAdapter(ABC):
 
 @register_adapter('sklearn')
 class SklearnAdapter(BaseAdapter):
+    framework_module = 'joblib'
+
     def load(self, file_obj):
-        return joblib.load(file_obj)
+        return self.fw.load(file_obj)
 
-    def predict(self, model, data_2d):
+    def predict(self, model, data_2d, **params):
         X = np.array(data_2d)  # shape (batch, n_features)
         return model.predict(X).tolist()
 
 @register_adapter('pytorch')
 class PyTorchAdapter(BaseAdapter):
+    framework_module = 'torch'
+
     def load(self, file_obj):
-        return torch.load(file_obj, map_location='cpu')
+        torch = self.fw
+        # Los .pt del admin son módulos completos (no solo state_dict)
+        module = torch.load(file_obj, map_location='cpu', weights_only=False)
+        # eval(), trace/script/compile y buffers se preparan una vez y quedan en la cache
+        return TorchModel(torch, module)
 
     def predict(self, model, data, **params):
-        model.eval()
-        inputs = torch.tensor(data, **params.get('tensor_kwargs', {}))
-        with torch.no_grad():
-            return model(inputs).numpy().tolist()
+        return as_predictions(model.run(data))
 
 @register_adapter('tensorflow')
 class TFAdapter(BaseAdapter):
+    framework_module = 'tensorflow'
+
     def load(self, file_obj):
-        return tf.keras.models.load_model(file_obj)
+        return self.fw.keras.models.load_model(file_obj)
 
     def predict(self, model, data, **params):
         return model.predict(data, **params).tolist()
 
 @register_adapter('onnx')
 class ONNXAdapter(BaseAdapter):
+    framework_module = 'onnxruntime'
+
     def load(self, file_obj):
-        sess = ort.InferenceSession(file_obj.read_bytes())
-        return sess
+        # La sesión (grafo optimizado, hilos, IO binding) queda en la cache del proceso
+        return OnnxSession(build_session(self.fw, file_obj.read()))
 
     def predict(self, model, data, **params):
-        input_name = model.get_inputs()[0].name
-        return model.run(None, {input_name: data})[0].tolist()
+        return as_predictions(model.run(data), copy=True)
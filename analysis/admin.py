@@ -4,7 +4,7 @@ from django.contrib import admin
 from django.urls import path
 from django.contrib import admin
 from unfold.admin import ModelAdmin as UnfoldModelAdmin  # Renombrar para evitar confusión
-from .models import MLModel, HyperparameterDefinition, AnalysisResult, MapeoResultado, UserAnalysis
+from .models import MLModel, HyperparameterDefinition, AnalysisResult, AnalysisShard, ModelVariant, MapeoResultado, UserAnalysis
 from django.http import HttpResponse
 from .reportes import SimpleReportGenerator
 
@@ -14,21 +14,62 @@ class HyperparameterInline(admin.TabularInline):
     fields = ('position', 'key_hint', 'dtype', 'required', 'help_text')
     ordering = ('position',)
 
+class AnalysisShardInline(admin.TabularInline):
+    model = AnalysisShard
+    extra = 0
+    can_delete = False
+    fields = ('index', 'status', 'rows', 'start_byte', 'end_byte', 'started_at', 'finished_at', 'error_message')
+    readonly_fields = fields
+
+class ModelVariantInline(admin.TabularInline):
+    model = ModelVariant
+    extra = 0
+    can_delete = False
+    fields = ('kind', 'status', 'latency_ms', 'baseline_latency_ms', 'speedup', 'accuracy_delta', 'serving', 'error_message')
+    readonly_fields = fields
+
+    @admin.display(description='Aceleración')
+    def speedup(self, obj):
+        if obj.latency_ms and obj.baseline_latency_ms:
+            return f"{obj.baseline_latency_ms / obj.latency_ms:.2f}x"
+        return '-'
+
+    @admin.display(description='En uso', boolean=True)
+    def serving(self, obj):
+        return obj.model.serving_variant_id == obj.pk
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
 @admin.register(MLModel)
 class MLModelAdmin(UnfoldModelAdmin):
     list_display    = ('name', 'version', 'framework', 'owner', 'created_at')
     list_filter     = ('framework', 'created_at', 'owner')
     search_fields   = ('name', 'version')
-    readonly_fields = ('created_at',)
+    readonly_fields = ('created_at', 'serving_variant')
     fieldsets = (
         (None, {
             'fields': ('name', 'version', 'framework', 'file')
         }),
+        ('Inferencia', {
+            'fields': ('batch_window_ms', 'max_batch_size', 'auto_optimize', 'serving_variant'),
+        }),
         ('Ownership & Audit', {
             'fields': ('owner', 'created_at'),
         }),
     )
-    inlines = [HyperparameterInline]
+    inlines = [HyperparameterInline, ModelVariantInline]
+    actions = ['generar_variantes']
+
+    @admin.action(description='Generar variantes ONNX/int8')
+    def generar_variantes(self, request, queryset):
+        from .tasks import convert_model_task
+        from .variants import CONVERTIBLE_FRAMEWORKS
+        models = list(queryset.filter(framework__in=CONVERTIBLE_FRAMEWORKS))
+        for mlmodel in models:
+            convert_model_task.delay(mlmodel.pk)
+        self.message_user(request, f"Conversión encolada para {len(models)} modelo(s).")
+
     def save_model(self, request, obj, form, change):
         if not change:
             obj.owner = request.user
@@ -37,6 +78,7 @@ class MLModelAdmin(UnfoldModelAdmin):
 @admin.register(AnalysisResult)
 class AnalysisResultAdmin(UnfoldModelAdmin):
     change_list_template = "admin/analysis/analysisresult/change_list.html"
+    inlines = [AnalysisShardInline]
 
     def get_urls(self):
         """
@@ -0,0 +1,243 @@
+# analysis/admission.py
+"""
+Control de admisión para los endpoints caros: POST /api/v1/analysis/
+(clase 'analysis') y la subida de datasets (clase 'upload').
+
+- Token bucket por usuario y clase (TokenBucketThrottle, throttle de DRF).
+  Cada usuario acumula hasta ANALYSIS_ADMISSION_BURSTS[clase] tokens, que
+  se reponen al ritmo de ANALYSIS_ADMISSION_RATES[clase] (p. ej. '60/min').
+  Sin token la respuesta es 429 con Retry-After igual a lo que falta para
+  el siguiente.
+- Tope global de peticiones en curso por clase
+  (ANALYSIS_ADMISSION_CONCURRENCY), para todo el cluster. Usa los slots con
+  lease de AdaptiveLimiter con el límite fijo, así que un proceso que muere
+  a mitad de una subida no deja el slot tomado. Si no hay slot, la
+  respuesta es 429 con Retry-After de ANALYSIS_ADMISSION_RETRY_SECONDS.
+
+El estado vive en la cache ANALYSIS_ADMISSION_CACHE, que tiene que ser
+Redis: cada consulta es un script Lua, atómico entre procesos y nodos, y el
+reloj es el del servidor Redis (TIME), no el de cada proceso web. Con un
+backend local al proceso cada worker tendría su propio límite, así que no
+se aplica ningún control y se avisa una vez. El camino get + set bajo lock
+del proceso queda para las pruebas. Si la cache falla se deja pasar la
+petición.
+
+Ambos controles corren en APIView.initial(), antes de parsear el cuerpo:
+una subida rechazada no se escribe en disco ni en la BD. Si el tope de
+concurrencia rechaza una petición que ya pagó su token, el token se
+devuelve.
+"""
+
+import time
+import logging
+import threading
+from typing import Optional
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.exceptions import Throttled
+from rest_framework.throttling import BaseThrottle
+from .circuit_breaker import AdaptiveLimiter, _redis_client, shared_cache
+
+logger = logging.getLogger(__name__)
+
+# Reposición continua: tokens = min(burst, tokens + (now - ts) * rate), con
+# now = TIME del servidor. Un cost negativo devuelve tokens (sin pasar de burst).
+TOKEN_BUCKET_LUA = """
+local rate, burst, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed, wait = 0, 0
+if tokens >= cost then
+  tokens = math.min(burst, tokens - cost)
+  allowed = 1
+else
+  wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring(wait)}
+"""
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate) -> Optional[float]:
+    """'60/min' -> 1.0 tokens por segundo; vacío o None -> sin límite."""
+    if not rate:
+        return None
+    num, period = str(rate).split('/')
+    return int(num) / PERIODS[period.strip()[0]]
+
+
+def _take(tokens, ts, now, rate, burst, cost):
+    """
+    Token bucket (la misma lógica que TOKEN_BUCKET_LUA; cost < 0 devuelve).
+    Devuelve (permitido, segundos hasta poder pagar `cost`, tokens, ts).
+    """
+    tokens = min(burst, tokens + max(0.0, now - ts) * rate)
+    if tokens >= cost:
+        return True, 0.0, min(burst, tokens - cost), now
+    return False, (cost - tokens) / rate, tokens, now
+
+
+def admission_cache_alias() -> str:
+    alias = getattr(settings, 'ANALYSIS_ADMISSION_CACHE', 'shared')
+    return alias if alias in settings.CACHES else 'default'
+
+
+def admission_cache():
+    return caches[admission_cache_alias()]
+
+
+def enforced() -> bool:
+    """Solo se limita con una cache compartida (ver shared_cache)."""
+    return shared_cache(admission_cache_alias(), "el control de admisión")
+
+
+class TokenBucket:
+    """Bucket de una clase de endpoint; cada identidad (usuario o IP) tiene su estado."""
+    _fallback_lock = threading.Lock()
+
+    def __init__(self, scope: str, rate: float, burst: float):
+        self.scope = scope
+        self.rate = rate
+        self.burst = max(1.0, float(burst))
+        self._script = None
+
+    def key(self, ident) -> str:
+        return f"admission:bucket:{self.scope}:{ident}"
+
+    def take(self, ident, cost=1.0) -> tuple:
+        """Una sola ida a la cache. Devuelve (permitido, retry_after en segundos)."""
+        backend = admission_cache()
+        key = self.key(ident)
+        client = _redis_client(backend)
+        if client is not None:
+            if self._script is None:
+                self._script = client.register_script(TOKEN_BUCKET_LUA)
+            raw = self._script(keys=[backend.make_key(key)], args=[self.rate, self.burst, cost], client=client)
+            return bool(int(raw[0])), float(raw[1])
+
+        now = time.time()
+        with self._fallback_lock:
+            tokens, ts = backend.get(key) or (self.burst, now)
+            allowed, wait, tokens, ts = _take(tokens, ts, now, self.rate, self.burst, cost)
+            backend.set(key, (tokens, ts), timeout=int(self.burst / self.rate) + 1)
+        return allowed, wait
+
+    def refund(self, ident, cost=1.0) -> None:
+        """Devuelve tokens de una petición que se rechazó por otro motivo."""
+        self.take(ident, cost=-cost)
+
+
+def bucket_for(scope) -> Optional[TokenBucket]:
+    rate = parse_rate(getattr(settings, 'ANALYSIS_ADMISSION_RATES', {}).get(scope))
+    if not rate:
+        return None
+    burst = getattr(settings, 'ANALYSIS_ADMISSION_BURSTS', {}).get(scope, 1)
+    return TokenBucket(scope, rate, burst)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Throttle de DRF sobre TokenBucket; DRF responde 429 con Retry-After = wait()."""
+
+    def __init__(self, scope: str):
+        self.scope = scope
+        self.retry_after = None
+        self.charged = None  # (bucket, ident) si esta petición pagó un token
+
+    def allow_request(self, request, view) -> bool:
+        bucket = bucket_for(self.scope)
+        if bucket is None or not enforced():
+            return True
+        user = request.user
+        ident = f"user:{user.pk}" if user and user.is_authenticated else f"ip:{self.get_ident(request)}"
+        try:
+            allowed, self.retry_after = bucket.take(ident)
+        except Exception:
+            logger.exception("Token bucket %s no disponible; se admite la petición", self.scope)
+            return True
+        if allowed:
+            self.charged = (bucket, ident)
+        return allowed
+
+    def refund(self) -> None:
+        if self.charged is None:
+            return
+        bucket, ident = self.charged
+        self.charged = None
+        try:
+            bucket.refund(ident)
+        except Exception:
+            logger.exception("No se pudo devolver el token de %s", self.scope)
+
+    def wait(self) -> Optional[float]:
+        return self.retry_after
+
+
+def concurrency_limiter(scope) -> Optional[AdaptiveLimiter]:
+    """Semáforo global de la clase (None si no hay tope o la cache no es compartida)."""
+    cap = getattr(settings, 'ANALYSIS_ADMISSION_CONCURRENCY', {}).get(scope, 0)
+    if not cap or not enforced():
+        return None
+    lease = float(getattr(settings, 'ANALYSIS_ADMISSION_SLOT_LEASE', 600))
+    return AdaptiveLimiter(
+        f"admission:{scope}", cache_alias=admission_cache_alias(),
+        initial=float(cap), min_limit=float(cap), max_limit=float(cap), lease=lease, expiry=int(lease * 2),
+    )
+
+
+def acquire_slot(scope):
+    """LimiterSlot de la clase, None si no hay tope; lanza Throttled si está lleno."""
+    limiter = concurrency_limiter(scope)
+    if limiter is None:
+        return None
+    try:
+        slot = limiter.acquire()
+    except Exception:
+        logger.exception("Tope de concurrencia %s no disponible; se admite la petición", scope)
+        return None
+    if slot is None:
+        raise Throttled(
+            wait=getattr(settings, 'ANALYSIS_ADMISSION_RETRY_SECONDS', 2),
+            detail="Servicio saturado, reintenta en unos segundos.",
+        )
+    return slot
+
+
+class AdmissionMixin:
+    """
+    Para ViewSets: aplica el token bucket y el tope de concurrencia de
+    `admission_scope` a la acción create. El slot se libera en
+    finalize_response, que DRF llama también cuando la vista lanza; si no
+    hay slot, el token que ya se pagó se devuelve.
+    """
+    admission_scope = None
+    _admission_slot = None
+    _admission_throttle = None
+
+    def get_throttles(self):
+        if self.admission_scope and getattr(self, 'action', None) == 'create':
+            self._admission_throttle = TokenBucketThrottle(self.admission_scope)
+            return [self._admission_throttle]
+        return super().get_throttles()
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.admission_scope and getattr(self, 'action', None) == 'create':
+            try:
+                self._admission_slot = acquire_slot(self.admission_scope)
+            except Throttled:
+                if self._admission_throttle is not None:
+                    self._admission_throttle.refund()
+                raise
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if self._admission_slot is not None:
+            self._admission_slot.release()
+            self._admission_slot = None
+        return super().finalize_response(request, response, *args, **kwargs)
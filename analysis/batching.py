@@ -0,0 +1,117 @@
+# analysis/batching.py
+"""
+Micro-batching de análisis concurrentes sobre el mismo MLModel.
+
+La tarea que toma un análisis actúa como "líder": espera la ventana
+`batch_window_ms` del modelo (acotada por ANALYSIS_BATCH_MAX_WINDOW_MS:
+mientras espera ocupa su proceso de prefork), reclama atómicamente hasta
+`max_batch_size` análisis PENDING de ese modelo (marcándolos RUNNING) y
+ejecuta un solo predict vectorizado. Las tareas encoladas para los análisis
+ya reclamados encuentran el registro fuera de PENDING y terminan sin hacer
+nada.
+
+Si el worker del líder muere, los análisis del batch quedan RUNNING. El
+próximo líder del mismo modelo los puede reclamar pasado stale_cutoff(), y
+outbox.requeue_stale() (desde beat) los devuelve a PENDING y al outbox
+aunque no llegue otro análisis de ese modelo.
+"""
+
+import time
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, When, IntegerField, Q
+from django.utils import timezone
+from .models import AnalysisResult
+from .notifications import notify_analyses
+
+logger = logging.getLogger(__name__)
+
+
+def stale_cutoff():
+    # Un RUNNING más viejo que el time limit de Celery solo puede venir de un
+    # worker caído; se permite reclamarlo de nuevo para no dejarlo colgado.
+    return timezone.now() - timedelta(seconds=getattr(settings, 'CELERY_TASK_TIME_LIMIT', 300))
+
+
+def is_dataset_mode(analysis) -> bool:
+    params = analysis.parameters
+    return isinstance(params, dict) and params.get("mode") == "dataset"
+
+
+def claim_batch(analysis):
+    """
+    Reclama `analysis` y, si el modelo lo permite, otros análisis PENDING
+    del mismo modelo. Devuelve la lista de AnalysisResult reclamados (el
+    propio `analysis` primero) o [] si otro worker ya lo tomó.
+    """
+    mlmodel = analysis.model
+    limit = max(1, mlmodel.max_batch_size)
+    if is_dataset_mode(analysis):
+        # Puntuar un dataset completo ya es vectorizado; no se mezcla con otros
+        limit = 1
+
+    window_ms = min(mlmodel.batch_window_ms, getattr(settings, 'ANALYSIS_BATCH_MAX_WINDOW_MS', 50))
+    if limit > 1 and window_ms > 0:
+        time.sleep(window_ms / 1000.0)
+
+    # También los RUNNING colgados del modelo (p. ej. seguidores de un líder caído)
+    claimable = Q(status="PENDING") | Q(status="RUNNING", updated_at__lt=stale_cutoff())
+    with transaction.atomic():
+        qs = (
+            AnalysisResult.objects
+            .select_for_update(skip_locked=True, of=("self",))
+            .filter(claimable, model_id=mlmodel.pk)
+            .select_related("model__serving_variant", "dataset")
+            .annotate(_leader=Case(When(pk=analysis.pk, then=0), default=1, output_field=IntegerField()))
+            .order_by("_leader", "created_at")
+        )
+        if limit == 1:
+            qs = qs.filter(pk=analysis.pk)
+        else:
+            # Solo análisis de vector (los de modo dataset se puntúan aparte)
+            qs = qs.filter(Q(pk=analysis.pk) | ~Q(parameters__has_key="mode") | Q(parameters__mode="vector"))
+        batch = list(qs[:limit])
+        if not batch or batch[0].pk != analysis.pk:
+            # Otro líder ya reclamó (o tiene bloqueado) este análisis
+            return []
+
+        now = timezone.now()
+        AnalysisResult.objects.filter(pk__in=[a.pk for a in batch]).update(status="RUNNING", updated_at=now)
+        for a in batch:
+            a.status = "RUNNING"
+            a.updated_at = now
+
+    if len(batch) > 1:
+        logger.info("Micro-batch de %s análisis para MLModel %s", len(batch), mlmodel.pk)
+    notify_analyses(batch, "RUNNING")
+    return batch
+
+
+def complete_batch(batch, results):
+    """
+    Reparte los resultados de execute_batch en cada AnalysisResult y los
+    persiste con un único bulk_update.
+    """
+    now = timezone.now()
+    for a in batch:
+        metrics, output_path = results[a.pk]
+        a.metrics = metrics
+        a.output_path = output_path
+        a.status = "SUCCESS"
+        a.error_message = None
+        a.completed_at = now
+        a.updated_at = now
+    AnalysisResult.objects.bulk_update(
+        batch, ["metrics", "output_path", "status", "error_message", "completed_at", "updated_at"]
+    )
+    notify_analyses(batch, "SUCCESS")
+
+
+def fail_batch(batch, message):
+    """Marca todos los análisis del batch como FAILURE con el mismo mensaje."""
+    AnalysisResult.objects.filter(pk__in=[a.pk for a in batch]).update(
+        status="FAILURE", error_message=message, updated_at=timezone.now()
+    )
+    notify_analyses(batch, "FAILURE", error=message)
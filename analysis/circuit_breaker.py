@@ -1,144 +1,262 @@
 # analysis/circuit_breaker.py
 """
 RedisCircuitBreaker
-Implementación compatible con backends Django cache (django-redis o LocMemCache).
-Incluye _safe_incr para soportar backends sin argumento `default` en incr.
+Implementación compatible con backends Django cache (django-redis,
+RedisCache de Django o LocMemCache).
+
+El estado de cada breaker (state, fails, open_at) vive en una sola clave y
+cada lectura o transición es una única operación atómica:
+  - Redis: un script Lua sobre un hash (un round trip por operación).
+  - Otros backends: get + set bajo un lock del proceso (atómico para
+    LocMemCache, que de todas formas es por proceso).
+Además cada proceso guarda el último estado leído durante
+ANALYSIS_BREAKER_STATE_TTL segundos, así una tarea con el circuito cerrado
+no consulta la cache, y un éxito sin fallos previos no escribe nada.
+
+model_breaker() devuelve el wrapper con breakers por MLModel y por
+framework: un modelo roto abre solo su circuito; el de framework (con un
+umbral mayor) corta si falla el runtime entero.
+
+AdaptiveLimiter es el bulkhead que acompaña al breaker: un semáforo
+compartido por MLModel y framework cuyo límite sube de a poco mientras la
+latencia de predict por fila se mantiene cerca de la mínima observada y
+baja multiplicativamente cuando la supera (AIMD). launch_analysis_task pide
+un slot antes de reclamar el análisis; si no hay, la tarea se difiere con
+retry o, agotados los reintentos, se descarta. El limiter solo se aplica con
+Redis en ANALYSIS_LIMITER_CACHE: con una cache del proceso cada worker
+tendría su propio límite.
+
 Uso:
-    from analysis.circuit_breaker import RedisCircuitBreaker, CircuitOpen
+    from analysis.circuit_breaker import RedisCircuitBreaker, CircuitOpen, model_breaker
     breaker = RedisCircuitBreaker("execute", max_failures=5, reset_timeout=60)
     wrapped = breaker(execute)  # wrap sin decorator
     # o usar como decorator:
     @breaker()
     def mycall(...): ...
+    # o por modelo:
+    wrapped = model_breaker(mlmodel.pk, mlmodel.runtime_framework)(execute)
+    # limiter:
+    slot = model_limiter(mlmodel.pk, mlmodel.runtime_framework).acquire()
+    if slot:
+        try:
+            metrics, out_path = execute(...)
+            slot.observe(metrics)
+        finally:
+            slot.release()
 """
 
 import time
+import uuid
 import logging
+import threading
 from functools import wraps
-from typing import Callable, Optional, Any
-from django.core.cache import cache
+from typing import Callable, Optional
+from django.conf import settings
+from django.core.cache import caches
 
 logger = logging.getLogger(__name__)
 
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half-open'
+
+# KEYS[1] = hash del breaker; ARGV = op, max_failures, reset_timeout, expiry; now = TIME
+# del servidor. Misma máquina de estados que _transition(); devuelve
+# {resultado, state, fails, open_at, now}.
+TRANSITION_LUA = """
+local state = redis.call('HGET', KEYS[1], 'state') or 'closed'
+local fails = tonumber(redis.call('HGET', KEYS[1], 'fails') or '0')
+local open_at = tonumber(redis.call('HGET', KEYS[1], 'open_at') or '0')
+local op, now = ARGV[1], tonumber(redis.call('TIME')[1])
+local max_failures, reset_timeout = tonumber(ARGV[2]), tonumber(ARGV[3])
+local result = state
+if op == 'check' then
+  if state ~= 'closed' then
+    if now - open_at >= reset_timeout then
+      state, open_at, result = 'half-open', now, 'half-open'
+    else
+      result = 'open'
+    end
+  end
+elseif op == 'failure' then
+  if state == 'half-open' then
+    state, open_at = 'open', now
+  else
+    fails = fails + 1
+    if fails >= max_failures then state, open_at = 'open', now end
+  end
+  result = state
+elseif op == 'success' then
+  state, fails, open_at, result = 'closed', 0, 0, 'closed'
+elseif op == 'abort' then
+  if state == 'half-open' then
+    state, open_at = 'open', open_at - reset_timeout
+  end
+  result = state
+end
+if op ~= 'peek' then
+  redis.call('HSET', KEYS[1], 'state', state, 'fails', fails, 'open_at', open_at)
+  redis.call('EXPIRE', KEYS[1], tonumber(ARGV[4]))
+end
+return {result, state, fails, open_at, now}
+"""
+
 
 class CircuitOpen(Exception):
     """Se lanza cuando el circuito está abierto y la llamada es rechazada."""
     pass
 
 
+def _transition(op, state, fails, open_at, now, max_failures, reset_timeout):
+    """
+    Máquina de estados del breaker (la misma que TRANSITION_LUA).
+    op: 'peek' (solo lee), 'check' (decide si se permite la llamada;
+    open -> half-open deja pasar una única prueba), 'failure', 'success',
+    'abort' (la prueba no llegó a ejecutarse: vuelve a open ya vencido, así
+    el próximo check entrega otra prueba).
+    Devuelve (resultado, state, fails, open_at).
+    """
+    result = state
+    if op == 'check':
+        if state != CLOSED:
+            if now - open_at >= reset_timeout:
+                state, open_at, result = HALF_OPEN, now, HALF_OPEN
+            else:
+                result = OPEN
+    elif op == 'failure':
+        if state == HALF_OPEN:
+            state, open_at = OPEN, now
+        else:
+            fails += 1
+            if fails >= max_failures:
+                state, open_at = OPEN, now
+        result = state
+    elif op == 'success':
+        state, fails, open_at, result = CLOSED, 0, 0, CLOSED
+    elif op == 'abort':
+        if state == HALF_OPEN:
+            state, open_at = OPEN, open_at - reset_timeout
+        result = state
+    return result, state, fails, open_at
+
+
+def _redis_client(backend):
+    """Cliente redis-py del backend si es RedisCache o django-redis; None si no."""
+    for attr in ('_cache', 'client'):
+        inner = getattr(backend, attr, None)
+        if inner is not None and hasattr(inner, 'get_client'):
+            try:
+                return inner.get_client(write=True)
+            except TypeError:
+                return inner.get_client()
+    return None
+
+
 class RedisCircuitBreaker:
+    # Serializa el get+set del camino sin Redis dentro del proceso
+    _fallback_lock = threading.Lock()
+
     def __init__(
         self,
         name: str,
         max_failures: int = 5,
         reset_timeout: int = 60,
         expiry: int = 3600,
+        state_ttl: Optional[float] = None,
+        cache_alias: Optional[str] = None,
     ):
         """
         name: clave base en cache para este breaker.
         max_failures: número de fallos consecutivos para abrir el circuito.
         reset_timeout: tiempo (segundos) que estará abierto antes de pasar a half-open.
         expiry: expiración en segundos de las keys de cache para limpieza.
+        state_ttl: segundos que el proceso reutiliza el último estado leído
+                   (por defecto ANALYSIS_BREAKER_STATE_TTL; 0 = siempre consulta).
+        cache_alias: alias de CACHES (por defecto ANALYSIS_BREAKER_CACHE).
         """
         self.name = str(name)
         self.max_failures = int(max_failures)
         self.reset_timeout = int(reset_timeout)
         self.expiry = int(expiry)
+        self.state_ttl = state_ttl
+        self.cache_alias = cache_alias
+        self.key = f"cb:{self.name}"
+        self._local = None  # (state, fails, fin de open y válido hasta, en monotonic)
+        self._script = None
 
-        self.fail_key = f"cb:{self.name}:fails"
-        self.state_key = f"cb:{self.name}:state"      # valores: 'closed','open','half-open'
-        self.open_at_key = f"cb:{self.name}:open_at"  # timestamp cuando se abrió
+    @property
+    def cache(self):
+        return caches[self.cache_alias or getattr(settings, 'ANALYSIS_BREAKER_CACHE', 'shared')]
 
     def _now(self) -> int:
+        """Reloj del camino sin Redis (con Redis manda el TIME del servidor)."""
         return int(time.time())
 
-    def _safe_incr(self, key: str) -> int:
+    def _ttl(self) -> float:
+        if self.state_ttl is not None:
+            return self.state_ttl
+        return float(getattr(settings, 'ANALYSIS_BREAKER_STATE_TTL', 1.0))
+
+    def _apply(self, op: str) -> tuple:
         """
-        Incrementa de forma segura la clave en cache devolviendo el nuevo valor.
-        Compatible con LocMemCache y django-redis.
+        Ejecuta la operación en una sola ida a la cache y refresca el estado
+        local. Devuelve (resultado, state, fails, open_at).
         """
-        try:
-            # Intento directo: muchos backends soportan incr(key)
-            return cache.incr(key)
-        except ValueError:
-            # LocMemCache lanza ValueError si la key no existe
-            cache.set(key, 1, timeout=self.expiry)
-            return 1
-        except TypeError:
-            # Algunos backends puede que rechacen la firma, fallback get/set
-            val = cache.get(key)
-            if val is None:
-                cache.set(key, 1, timeout=self.expiry)
-                return 1
-            try:
-                new = int(val) + 1
-            except Exception:
-                new = 1
-            cache.set(key, new, timeout=self.expiry)
-            return new
-        except Exception as exc:
-            # En caso de error inesperado, logueamos y tratamos como 1 para no bloquear
-            logger.exception("Error en _safe_incr cache.incr: %s", exc)
-            # fallback seguro
-            val = cache.get(key)
-            if val is None:
-                cache.set(key, 1, timeout=self.expiry)
-                return 1
-            try:
-                new = int(val) + 1
-            except Exception:
-                new = 1
-            cache.set(key, new, timeout=self.expiry)
-            return new
+        backend = self.cache
+        client = _redis_client(backend)
+        if client is not None:
+            if self._script is None:
+                self._script = client.register_script(TRANSITION_LUA)
+            raw = self._script(
+                keys=[backend.make_key(self.key)],
+                args=[op, self.max_failures, self.reset_timeout, self.expiry],
+                client=client,
+            )
+            result, state = (v.decode() if isinstance(v, bytes) else v for v in raw[:2])
+            fails, open_at, now = int(raw[2]), int(raw[3]), int(raw[4])
+        else:
+            now = self._now()
+            with self._fallback_lock:
+                current = backend.get(self.key) or (CLOSED, 0, 0)
+                result, state, fails, open_at = _transition(
+                    op, *current, now, self.max_failures, self.reset_timeout,
+                )
+                if op != 'peek' and (state, fails, open_at) != tuple(current):
+                    backend.set(self.key, (state, fails, open_at), timeout=self.expiry)
+
+        if op == 'check' and result == HALF_OPEN:
+            logger.info("Circuit %s transitions open -> half-open (timeout elapsed)", self.name)
+        elif op == 'failure' and state == OPEN:
+            logger.warning("Circuit %s opened (fails=%s)", self.name, fails)
+        # half-open nunca se cachea: solo el que recibió la prueba puede pasar.
+        # El fin de open se guarda en monotonic para no comparar con el reloj local
+        mono = time.monotonic()
+        self._local = (
+            (state, fails, mono + open_at + self.reset_timeout - now, mono + self._ttl())
+            if state != HALF_OPEN else None
+        )
+        return result, state, fails, open_at
 
     def get_state(self) -> str:
         """
-        Recupera el estado actual del circuito. Si está 'open' y ha pasado
-        reset_timeout, se transita a 'half-open' y se guarda en cache.
+        Decide si la llamada puede pasar: 'closed', 'open' o 'half-open' (esta
+        llamada es la prueba). Usa el estado local si aún es válido.
         """
-        state = cache.get(self.state_key) or 'closed'
-        if state == 'open':
-            open_at = cache.get(self.open_at_key) or 0
-            if self._now() - int(open_at) >= self.reset_timeout:
-                # transitar a half-open
-                cache.set(self.state_key, 'half-open', timeout=self.expiry)
-                logger.info("Circuit %s transitions open -> half-open (timeout elapsed)", self.name)
-                return 'half-open'
-        return state
+        local = self._local
+        if local and time.monotonic() < local[3]:
+            state, _, open_until, _ = local
+            if state == CLOSED:
+                return CLOSED
+            if state == OPEN and time.monotonic() < open_until:
+                return OPEN
+        return self._apply('check')[0]
 
     def increment_failure(self) -> None:
-        """
-        Incrementa el contador de fallos y abre el circuito si se supera el umbral.
-        Maneja compatibilidad con diferentes backends.
-        """
-        fails = self._safe_incr(self.fail_key)
-        # Asegurar que la key tenga timeout configurado
-        try:
-            # django-redis expone expire; si no existe, set será suficiente
-            expire_func = getattr(cache, 'expire', None)
-            if callable(expire_func):
-                expire_func(self.fail_key, self.expiry)
-            else:
-                cache.set(self.fail_key, fails, timeout=self.expiry)
-        except Exception:
-            # No interrumpir por fallo de expiración
-            try:
-                cache.set(self.fail_key, fails, timeout=self.expiry)
-            except Exception:
-                logger.exception("No se pudo asegurar expiración de fail_key para %s", self.name)
-
-        if fails >= self.max_failures:
-            cache.set(self.state_key, 'open', timeout=self.expiry)
-            cache.set(self.open_at_key, self._now(), timeout=self.expiry)
-            logger.warning("Circuit %s opened after %s failures", self.name, fails)
+        """Suma un fallo y abre el circuito si se supera el umbral."""
+        self._apply('failure')
 
     def reset(self) -> None:
         """Cierra el circuito y resetea contadores."""
         try:
-            cache.delete(self.fail_key)
-            cache.set(self.state_key, 'closed', timeout=self.expiry)
-            cache.delete(self.open_at_key)
-            logger.info("Circuit %s reset -> closed", self.name)
+            self._apply('success')
         except Exception:
             logger.exception("Error al resetear Circuit %s", self.name)
 
@@ -148,12 +266,21 @@ class RedisCircuitBreaker:
 
     def half_open_failure(self) -> None:
         """Fallo durante half-open: volver a abrir con timestamp actualizado."""
+        self._apply('failure')
+
+    def release_probe(self) -> None:
+        """La prueba half-open no se ejecutó (la rechazó otro breaker): se devuelve."""
         try:
-            cache.set(self.state_key, 'open', timeout=self.expiry)
-            cache.set(self.open_at_key, self._now(), timeout=self.expiry)
-            logger.warning("Circuit %s re-opened from half-open", self.name)
+            self._apply('abort')
         except Exception:
-            logger.exception("Error al re-open Circuit %s desde half-open", self.name)
+            logger.exception("Error al devolver la prueba del Circuit %s", self.name)
+
+    def record_success(self) -> None:
+        """Éxito normal: solo escribe si había fallos acumulados."""
+        local = self._local
+        if local and local[0] == CLOSED and local[1] == 0 and time.monotonic() < local[3]:
+            return
+        self.reset()
 
     def __call__(self, func: Optional[Callable] = None, *, fallback: Optional[Callable] = None):
         """
@@ -168,7 +295,7 @@ class RedisCircuitBreaker:
             @wraps(f)
             def _wrapped(*args, **kwargs):
                 state = self.get_state()
-                if state == 'open':
+                if state == OPEN:
                     logger.error("Circuit %s is open; refusing call", self.name)
                     if fallback:
                         try:
@@ -179,23 +306,24 @@ class RedisCircuitBreaker:
                     raise CircuitOpen(f"Circuit {self.name} is open")
                 try:
                     result = f(*args, **kwargs)
-                except Exception as exc:
+                except CircuitOpen:
+                    # Un breaker interno rechazó la llamada: no es un fallo de
+                    # este, y si era la prueba half-open se devuelve sin usar
+                    if state == HALF_OPEN:
+                        self.release_probe()
+                    raise
+                except Exception:
                     # Si estábamos en half-open, reabrimos inmediatamente
-                    if state == 'half-open':
+                    if state == HALF_OPEN:
                         self.half_open_failure()
                     else:
                         self.increment_failure()
                     raise
                 else:
-                    # En caso de éxito y estado half-open -> cerrar y resetear
-                    if state == 'half-open':
+                    if state == HALF_OPEN:
                         self.half_open_success()
                     else:
-                        # Política: al éxito normal podemos limpiar contador de fallos
-                        try:
-                            cache.delete(self.fail_key)
-                        except Exception:
-                            logger.debug("No se pudo borrar fail_key tras éxito para %s", self.name)
+                        self.record_success()
                     return result
             return _wrapped
 
@@ -211,14 +339,12 @@ class RedisCircuitBreaker:
         Útil para endpoints de health/monitoring.
         """
         try:
-            state = self.get_state()
-            fails = cache.get(self.fail_key) or 0
-            open_at = cache.get(self.open_at_key) or None
+            _, state, fails, open_at = self._apply('peek')
             return {
                 "name": self.name,
                 "state": state,
-                "fails": int(fails),
-                "open_at": int(open_at) if open_at else None,
+                "fails": fails,
+                "open_at": open_at or None,
                 "max_failures": self.max_failures,
                 "reset_timeout": self.reset_timeout,
             }
@@ -232,3 +358,277 @@ class RedisCircuitBreaker:
                 "max_failures": self.max_failures,
                 "reset_timeout": self.reset_timeout,
             }
+
+
+# Un breaker por nombre y proceso, para que el estado local sobreviva entre tareas
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str, **kwargs) -> RedisCircuitBreaker:
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = RedisCircuitBreaker(name, **kwargs)
+        return breaker
+
+
+def breaker_for_model(model_id) -> RedisCircuitBreaker:
+    """Breaker del MLModel con la configuración de settings."""
+    return get_breaker(
+        f"model:{model_id}",
+        max_failures=getattr(settings, 'ANALYSIS_BREAKER_MAX_FAILURES', 5),
+        reset_timeout=getattr(settings, 'ANALYSIS_BREAKER_RESET_TIMEOUT', 60),
+    )
+
+
+def breaker_for_framework(framework) -> RedisCircuitBreaker:
+    """Breaker del framework con la configuración de settings."""
+    return get_breaker(
+        f"framework:{framework}",
+        max_failures=getattr(settings, 'ANALYSIS_BREAKER_FRAMEWORK_MAX_FAILURES', 20),
+        reset_timeout=getattr(settings, 'ANALYSIS_BREAKER_RESET_TIMEOUT', 60),
+    )
+
+
+def model_breaker(model_id, framework) -> Callable:
+    """
+    Devuelve wrap(func) que protege func con el breaker del framework y,
+    dentro, con el del MLModel. Un CircuitOpen del modelo no cuenta como
+    fallo del framework, y si la llamada llevaba la prueba half-open del
+    framework, la prueba se devuelve para la siguiente llamada.
+    """
+    by_model = breaker_for_model(model_id)
+    by_framework = breaker_for_framework(framework)
+
+    def wrap(func):
+        return by_framework(by_model(func))
+    return wrap
+
+
+# ---------------------------------------------------------------------------
+# Limitador de concurrencia adaptativo (bulkhead)
+# ---------------------------------------------------------------------------
+
+# KEYS[1] = hash {limit, min_ms}; KEYS[2] = zset token -> hora de adquisición.
+# ARGV = op, now, token, latency_ms, initial, min_limit, max_limit, target_ms,
+#        tolerance, backoff, lease, expiry, rows. Misma lógica que _limiter_transition().
+LIMITER_LUA = """
+local now, lease = tonumber(ARGV[2]), tonumber(ARGV[11])
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now - lease)
+local limit = tonumber(redis.call('HGET', KEYS[1], 'limit') or ARGV[5])
+local min_ms = tonumber(redis.call('HGET', KEYS[1], 'min_ms') or '0')
+local op, token, latency = ARGV[1], ARGV[3], tonumber(ARGV[4])
+local min_limit, max_limit = tonumber(ARGV[6]), tonumber(ARGV[7])
+local target_ms, tolerance, backoff = tonumber(ARGV[8]), tonumber(ARGV[9]), tonumber(ARGV[10])
+local granted = 0
+if op == 'acquire' then
+  if redis.call('ZCARD', KEYS[2]) < math.floor(limit) then
+    redis.call('ZADD', KEYS[2], now, token)
+    granted = 1
+  end
+elseif op == 'release' or op == 'overload' then
+  redis.call('ZREM', KEYS[2], token)
+  local slow = op == 'overload'
+  if op == 'release' and latency >= 0 then
+    latency = latency / math.max(1, tonumber(ARGV[13]))
+    if min_ms == 0 or latency < min_ms then
+      min_ms = latency
+    else
+      min_ms = min_ms + (latency - min_ms) * 0.01
+    end
+    local target = target_ms
+    if target <= 0 then target = min_ms * tolerance end
+    slow = latency > target
+    if not slow then limit = math.min(max_limit, limit + 1 / limit) end
+  end
+  if slow then limit = math.max(min_limit, limit * backoff) end
+end
+if op ~= 'peek' then
+  redis.call('HSET', KEYS[1], 'limit', tostring(limit), 'min_ms', tostring(min_ms))
+  redis.call('EXPIRE', KEYS[1], tonumber(ARGV[12]))
+  redis.call('EXPIRE', KEYS[2], tonumber(ARGV[12]))
+end
+return {granted, redis.call('ZCARD', KEYS[2]), tostring(limit), tostring(min_ms)}
+"""
+
+
+def _limiter_transition(op, slots, limit, min_ms, now, token, latency_ms, cfg, rows=1):
+    """
+    Semáforo con límite AIMD (la misma lógica que LIMITER_LUA).
+    slots: {token: hora de adquisición}; los más viejos que cfg['lease']
+    son de workers caídos y se liberan solos.
+      acquire:  concede un slot si hay menos de floor(limit) en uso.
+      release:  libera; con latency_ms >= 0 ajusta el límite según la
+                latencia por fila (latency_ms / rows): +1/limit si está bajo
+                el objetivo, * backoff si lo supera.
+      overload: libera y reduce el límite (time limit u otra saturación).
+    El objetivo es target_ms o, si es 0, min_ms * tolerance, donde min_ms
+    es la latencia mínima observada (sube lentamente si la carga cambia).
+    Devuelve (concedido, slots, limit, min_ms).
+    """
+    slots = {t: ts for t, ts in slots.items() if ts > now - cfg['lease']}
+    granted = False
+    if op == 'acquire':
+        if len(slots) < int(limit):
+            slots[token] = now
+            granted = True
+    elif op in ('release', 'overload'):
+        slots.pop(token, None)
+        slow = op == 'overload'
+        if op == 'release' and latency_ms >= 0:
+            latency_ms = latency_ms / max(1, rows)
+            min_ms = latency_ms if not min_ms or latency_ms < min_ms else min_ms + (latency_ms - min_ms) * 0.01
+            target = cfg['target_ms'] if cfg['target_ms'] > 0 else min_ms * cfg['tolerance']
+            slow = latency_ms > target
+            if not slow:
+                limit = min(cfg['max_limit'], limit + 1 / limit)
+        if slow:
+            limit = max(cfg['min_limit'], limit * cfg['backoff'])
+    return granted, slots, limit, min_ms
+
+
+class LimiterSlot:
+    """Slot concedido por AdaptiveLimiter; se libera con release()."""
+
+    def __init__(self, limiter, token):
+        self.limiter = limiter
+        self.token = token
+        self.latency_ms = None
+        self.rows = 1
+        self.overloaded = False
+
+    def observe(self, metrics, rows=None) -> None:
+        """
+        Toma la latencia de predict de las métricas de execute*()
+        (timings.predict_ms) y las filas que cubrió (`rows` o metrics['samples']).
+        """
+        metrics = metrics or {}
+        timings = metrics.get('timings') or {}
+        if 'predict_ms' in timings:
+            self.latency_ms = timings['predict_ms']
+            self.rows = max(1, int(rows or metrics.get('samples') or 1))
+
+    def release(self) -> None:
+        try:
+            self.limiter.release(self.token, self.latency_ms, overloaded=self.overloaded, rows=self.rows)
+        except Exception:
+            logger.exception("Error al liberar slot del limiter %s", self.limiter.name)
+
+
+class AdaptiveLimiter:
+    """
+    Semáforo compartido por todos los workers (cache ANALYSIS_LIMITER_CACHE)
+    cuyo límite se ajusta AIMD con la latencia por fila observada de
+    predict. Igual que RedisCircuitBreaker, cada operación es un script Lua
+    con Redis o un get + set bajo lock con otros backends (solo útil en
+    pruebas: model_limiter() no lo usa si la cache no es compartida).
+    """
+    _fallback_lock = threading.Lock()
+
+    def __init__(self, name: str, cache_alias: Optional[str] = None, **overrides):
+        self.name = str(name)
+        self.cache_alias = cache_alias
+        self.overrides = overrides
+        self.key = f"limiter:{self.name}"
+        self._script = None
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias or limiter_cache_alias()]
+
+    def config(self) -> dict:
+        lease = getattr(settings, 'CELERY_TASK_TIME_LIMIT', 300)
+        cfg = {
+            'initial': float(getattr(settings, 'ANALYSIS_LIMITER_INITIAL', 8)),
+            'min_limit': float(getattr(settings, 'ANALYSIS_LIMITER_MIN', 1)),
+            'max_limit': float(getattr(settings, 'ANALYSIS_LIMITER_MAX', 64)),
+            'target_ms': float(getattr(settings, 'ANALYSIS_LIMITER_TARGET_MS', 0)),
+            'tolerance': float(getattr(settings, 'ANALYSIS_LIMITER_TOLERANCE', 2.0)),
+            'backoff': float(getattr(settings, 'ANALYSIS_LIMITER_BACKOFF', 0.9)),
+            # Un slot no puede durar más que el time limit de la tarea que lo tiene
+            'lease': float(lease),
+            'expiry': int(lease * 2),
+        }
+        cfg.update(self.overrides)
+        return cfg
+
+    def _apply(self, op: str, token: str = '', latency_ms: Optional[float] = None, rows: int = 1) -> tuple:
+        """Una sola ida a la cache. Devuelve (concedido, en uso, limit, min_ms)."""
+        cfg = self.config()
+        now = time.time()
+        latency = -1.0 if latency_ms is None else float(latency_ms)
+        backend = self.cache
+        client = _redis_client(backend)
+        if client is not None:
+            if self._script is None:
+                self._script = client.register_script(LIMITER_LUA)
+            raw = self._script(
+                keys=[backend.make_key(self.key), backend.make_key(f"{self.key}:slots")],
+                args=[op, now, token, latency, cfg['initial'], cfg['min_limit'], cfg['max_limit'],
+                      cfg['target_ms'], cfg['tolerance'], cfg['backoff'], cfg['lease'], cfg['expiry'], rows],
+                client=client,
+            )
+            return bool(int(raw[0])), int(raw[1]), float(raw[2]), float(raw[3])
+
+        with self._fallback_lock:
+            slots, limit, min_ms = backend.get(self.key) or ({}, cfg['initial'], 0.0)
+            granted, slots, limit, min_ms = _limiter_transition(
+                op, slots, limit, min_ms, now, token, latency, cfg, rows=rows,
+            )
+            if op != 'peek':
+                backend.set(self.key, (slots, limit, min_ms), timeout=cfg['expiry'])
+        return granted, len(slots), limit, min_ms
+
+    def acquire(self) -> Optional[LimiterSlot]:
+        """Devuelve un LimiterSlot, o None si el modelo está saturado."""
+        token = uuid.uuid4().hex
+        granted, in_use, limit, _ = self._apply('acquire', token)
+        if not granted:
+            logger.info("Limiter %s saturado (%s en curso, límite %.2f)", self.name, in_use, limit)
+            return None
+        return LimiterSlot(self, token)
+
+    def release(self, token: str, latency_ms: Optional[float] = None, overloaded: bool = False, rows: int = 1) -> None:
+        self._apply('overload' if overloaded else 'release', token, latency_ms, rows)
+
+    def stats(self) -> dict:
+        _, in_use, limit, min_ms = self._apply('peek')
+        return {"name": self.name, "in_flight": in_use, "limit": round(limit, 2), "min_latency_ms": round(min_ms, 3)}
+
+
+# Alias ya avisados como locales al proceso (un warning por proceso y alias)
+_local_warned = set()
+
+
+def limiter_cache_alias() -> str:
+    alias = getattr(settings, 'ANALYSIS_LIMITER_CACHE', 'shared')
+    return alias if alias in settings.CACHES else 'default'
+
+
+def shared_cache(alias: str, purpose: str) -> bool:
+    """
+    True si CACHES[alias] es Redis: el único backend donde un semáforo o un
+    bucket es atómico y común a todos los procesos. Si no, avisa una vez.
+    """
+    if _redis_client(caches[alias]) is not None:
+        return True
+    if alias not in _local_warned:
+        _local_warned.add(alias)
+        logger.warning(
+            "CACHES['%s'] no es Redis: %s sería por proceso y no se aplica", alias, purpose,
+        )
+    return False
+
+
+def model_limiter(model_id, framework) -> Optional[AdaptiveLimiter]:
+    """
+    Limiter de un MLModel servido con `framework`; None si está desactivado
+    o si ANALYSIS_LIMITER_CACHE no es una cache compartida.
+    """
+    if not getattr(settings, 'ANALYSIS_LIMITER_ENABLED', True):
+        return None
+    alias = limiter_cache_alias()
+    if not shared_cache(alias, "el limiter de concurrencia"):
+        return None
+    return AdaptiveLimiter(f"model:{model_id}:{framework}", cache_alias=alias)
@@ -0,0 +1,118 @@
+# analysis/fair_scheduler.py
+"""
+Reparto justo del outbox entre usuarios y carriles de prioridad.
+
+Con una sola cola FIFO y prefetch 1, quien encola 10.000 análisis hace
+esperar a todos los demás. El dispatcher del outbox (analysis/outbox.py)
+ya no publica por orden de llegada:
+
+- Cada fila del outbox tiene dueño y carril. Las filas pendientes de un
+  (carril, usuario) forman su cola virtual.
+- Solo hay ANALYSIS_FAIR_MAX_IN_FLIGHT análisis publicados y sin terminar a
+  la vez. El resto espera en el outbox, donde todavía se puede reordenar;
+  en el broker ya no.
+- Cada pasada reparte los cupos libres por round-robin ponderado: primero
+  entre carriles (ANALYSIS_FAIR_LANES, en orden de prioridad) y dentro de
+  cada carril entre usuarios (peso 1, o el de ANALYSIS_FAIR_USER_WEIGHTS).
+  Entre usuarios el orden es por la fila más antigua, así que quien no
+  entró en una pasada va primero en la siguiente.
+- El carril también fija la prioridad del mensaje en Redis
+  (queue_order_strategy='priority'; 0 es la más alta).
+
+Carriles: 'interactive' para vectores de hasta
+ANALYSIS_FAIR_INTERACTIVE_MAX_ROWS filas, 'bulk' para el resto y para el
+modo dataset. Las subtareas de shards (score_shard_task) las publica el
+worker directamente: un dataset fragmentado ocupa un solo cupo.
+"""
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from .batching import is_dataset_mode
+
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+
+DEFAULT_LANES = {
+    INTERACTIVE: {'weight': 4, 'priority': 0},
+    BULK: {'weight': 1, 'priority': 6},
+}
+
+
+def lanes() -> dict:
+    """Carriles configurados, en orden de prioridad."""
+    return getattr(settings, 'ANALYSIS_FAIR_LANES', DEFAULT_LANES)
+
+
+def lane_for(analysis) -> str:
+    if is_dataset_mode(analysis):
+        return BULK
+    params = analysis.parameters if isinstance(analysis.parameters, dict) else {}
+    rows = len(params.get('vector_2d') or [])
+    return INTERACTIVE if rows <= getattr(settings, 'ANALYSIS_FAIR_INTERACTIVE_MAX_ROWS', 10) else BULK
+
+
+def lane_priority(lane):
+    return lanes().get(lane, {}).get('priority')
+
+
+def user_weights(owner_ids) -> dict:
+    """Peso por owner_id a partir de ANALYSIS_FAIR_USER_WEIGHTS ('usuario=peso')."""
+    configured = {}
+    for item in getattr(settings, 'ANALYSIS_FAIR_USER_WEIGHTS', []) or []:
+        username, _, weight = str(item).partition('=')
+        if username.strip() and weight.strip():
+            configured[username.strip()] = max(1, int(weight))
+    if not configured:
+        return {}
+    users = get_user_model().objects.filter(pk__in=owner_ids, username__in=configured)
+    return {pk: configured[username] for pk, username in users.values_list('pk', 'username')}
+
+
+def weighted_round_robin(demand, budget, weights=None) -> dict:
+    """
+    Reparte `budget` cupos entre las claves de `demand` (clave -> pendientes,
+    en el orden en que se atienden). En cada ronda cada clave recibe hasta
+    su peso; lo que una no usa queda para las demás.
+    """
+    weights = weights or {}
+    remaining = {key: n for key, n in demand.items() if n > 0}
+    share = dict.fromkeys(remaining, 0)
+    while budget > 0 and remaining:
+        for key in list(remaining):
+            take = min(weights.get(key, 1), remaining[key], budget)
+            share[key] += take
+            budget -= take
+            remaining[key] -= take
+            if not remaining[key]:
+                del remaining[key]
+            if not budget:
+                break
+    return share
+
+
+def plan(demand, budget, weights=None) -> dict:
+    """
+    demand: {carril: {owner_id: pendientes}} (usuarios por antigüedad).
+    Devuelve {(carril, owner_id): cupos}.
+    """
+    config = lanes()
+    ordered = sorted(demand, key=lambda lane: list(config).index(lane) if lane in config else len(config))
+    per_lane = weighted_round_robin(
+        {lane: sum(demand[lane].values()) for lane in ordered},
+        budget,
+        {lane: config.get(lane, {}).get('weight', 1) for lane in ordered},
+    )
+    result = {}
+    for lane, slots in per_lane.items():
+        for owner_id, n in weighted_round_robin(demand[lane], slots, weights).items():
+            if n:
+                result[(lane, owner_id)] = n
+    return result
+
+
+def interleave(groups) -> list:
+    """[[a1, a2], [b1], [c1, c2]] -> [a1, b1, c1, a2, c2]: el broker ve los usuarios alternados."""
+    out = []
+    for i in range(max((len(g) for g in groups), default=0)):
+        out.extend(g[i] for g in groups if i < len(g))
+    return out
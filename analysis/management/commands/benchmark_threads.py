@@ -0,0 +1,114 @@
+# analysis/management/commands/benchmark_threads.py
+"""
+Mide el throughput de un MLModel con distintos repartos procesos x hilos.
+
+Para cada reparto PxT se lanzan P procesos (fork, como el prefork de
+Celery), cada uno con un presupuesto de T hilos (thread_budget), que
+ejecutan predict en bucle durante --seconds. Se reporta el total de filas
+por segundo y la latencia media por predict. El modelo se carga en cada
+hijo: el padre nunca importa el framework, así los pools se crean después
+del fork con el presupuesto indicado.
+
+Uso:
+    python manage.py benchmark_threads 3
+    python manage.py benchmark_threads 3 --splits 8x1,4x2,2x4,1x8 --rows 64 --seconds 10
+
+El reparto por defecto es un proceso Celery por núcleo
+(CELERY_WORKER_CONCURRENCY) con núcleos // concurrencia hilos cada uno.
+Antes de cambiar ANALYSIS_THREADS_PER_PROCESS, correr este comando en el
+host de producción, con el modelo real y CELERY_WORKER_CONCURRENCY igual a
+los núcleos, y comparar filas/s y ms/predict de cada reparto.
+"""
+import time
+import queue as queue_mod
+import multiprocessing
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+def _default_splits(cores):
+    splits, procs = [], cores
+    while procs >= 1:
+        splits.append((procs, max(1, cores // procs)))
+        procs //= 2
+    return splits
+
+
+def _parse_splits(value):
+    try:
+        return [tuple(int(n) for n in item.lower().split('x')) for item in value.split(',')]
+    except ValueError:
+        raise CommandError(f"--splits inválido: {value!r} (formato PxT,PxT,...)")
+
+
+def _run_child(framework, model_path, inputs, threads, seconds, queue):
+    from analysis import thread_budget
+    from analysis.ml_inference import get_adapter
+
+    thread_budget.set_override(threads)
+    thread_budget.apply_process_budget()
+    adapter = get_adapter(framework)
+    with open(model_path, 'rb') as f:
+        model_obj = adapter.load(f)
+    adapter.predict(model_obj, inputs)  # warm-up, no se mide
+
+    calls, start = 0, time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        adapter.predict(model_obj, inputs)
+        calls += 1
+    queue.put((calls, time.perf_counter() - start))
+
+
+class Command(BaseCommand):
+    help = "Compara el throughput de inferencia de un MLModel con distintos repartos procesos x hilos."
+
+    def add_arguments(self, parser):
+        parser.add_argument('model_id', type=int, help='Id del MLModel a medir.')
+        parser.add_argument('--splits', help='Repartos PxT separados por coma (por defecto: potencias de 2 sobre los núcleos).')
+        parser.add_argument('--rows', type=int, default=32, help='Filas por predict.')
+        parser.add_argument('--seconds', type=float, default=5.0, help='Duración de cada medición por proceso.')
+
+    def handle(self, *args, **options):
+        from analysis.models import MLModel
+        from analysis.warmup import dummy_inputs
+
+        try:
+            mlmodel = MLModel.objects.prefetch_related('hyperparams').get(pk=options['model_id'])
+        except MLModel.DoesNotExist:
+            raise CommandError(f"MLModel {options['model_id']} no existe")
+
+        cores = multiprocessing.cpu_count()
+        splits = _parse_splits(options['splits']) if options['splits'] else _default_splits(cores)
+        inputs = dummy_inputs(mlmodel) * options['rows']
+        model_path = mlmodel.runtime_path
+        # Los hijos heredan el proceso: no deben compartir la conexión a la BD
+        connections.close_all()
+        ctx = multiprocessing.get_context('fork')
+
+        self.stdout.write(f"MLModel {mlmodel.pk} ({mlmodel.runtime_framework}), {cores} núcleos, {options['rows']} filas por predict")
+        self.stdout.write(f"  {'procesos x hilos':<18}{'filas/s':>12}{'ms/predict':>12}")
+        for procs, threads in splits:
+            queue = ctx.Queue()
+            children = [
+                ctx.Process(target=_run_child, args=(
+                    mlmodel.runtime_framework, model_path, inputs, threads, options['seconds'], queue,
+                ))
+                for _ in range(procs)
+            ]
+            for child in children:
+                child.start()
+            try:
+                # Un hijo que falla no responde: se corta con un margen sobre --seconds
+                results = [queue.get(timeout=options['seconds'] + 120) for _ in children]
+            except queue_mod.Empty:
+                for child in children:
+                    child.terminate()
+                raise CommandError(f"Un proceso del reparto {procs}x{threads} no terminó (ver logs)")
+            for child in children:
+                child.join()
+
+            calls = sum(r[0] for r in results)
+            elapsed = max(r[1] for r in results)
+            rows_per_s = calls * options['rows'] / elapsed if elapsed else 0.0
+            ms_per_call = sum(r[1] * 1000 / r[0] for r in results if r[0]) / len(results)
+            self.stdout.write(f"  {f'{procs}x{threads}':<18}{rows_per_s:>12.1f}{ms_per_call:>12.3f}")
@@ -0,0 +1,86 @@
+# analysis/management/commands/benchmark_torch.py
+"""
+Microbenchmark por CPU del PyTorchAdapter: camino anterior vs camino rápido.
+
+El camino anterior reproduce el predict original (eval() en cada llamada,
+torch.tensor desde listas anidadas, no_grad y .tolist()). El nuevo usa
+TorchModel (eval una vez, buffer float32, inference_mode, salida numpy) en
+cada modo de ANALYSIS_TORCH_COMPILE indicado. Por defecto mide un MLP
+sintético; con --model-id mide un MLModel PyTorch real.
+
+Uso:
+    python manage.py benchmark_torch
+    python manage.py benchmark_torch --rows 1 --rows 64 --rows 4096 --modes ,trace
+    python manage.py benchmark_torch --model-id 3
+"""
+import time
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+
+def _time_per_call(fn, seconds):
+    fn()  # calentamiento (y trace en el primer llamado)
+    calls, start = 0, time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        fn()
+        calls += 1
+    return (time.perf_counter() - start) * 1000 / calls
+
+
+class Command(BaseCommand):
+    help = "Compara el predict anterior de PyTorch con el camino rápido (inference_mode, buffer float32, trace/compile)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model-id', type=int, help='MLModel PyTorch a medir (por defecto, un MLP sintético).')
+        parser.add_argument('--features', type=int, default=32, help='Columnas del MLP sintético.')
+        parser.add_argument('--hidden', type=int, default=256, help='Ancho de las capas ocultas del MLP sintético.')
+        parser.add_argument('--rows', type=int, action='append', help='Filas por predict (repetible). Por defecto 1, 64 y 4096.')
+        parser.add_argument('--modes', default=',trace', help="Modos de preparación separados por coma ('' = eager).")
+        parser.add_argument('--seconds', type=float, default=2.0, help='Duración de cada medición.')
+
+    def handle(self, *args, **options):
+        from analysis.adapters import ADAPTERS
+        from analysis.torch_runtime import TorchModel, COMPILE_MODES
+
+        adapter = ADAPTERS['pytorch']
+        torch = adapter.fw
+        modes = options['modes'].split(',')
+        for mode in modes:
+            if mode not in COMPILE_MODES:
+                raise CommandError(f"Modo inválido {mode!r}; opciones: {COMPILE_MODES}")
+
+        if options['model_id']:
+            from analysis.models import MLModel
+            mlmodel = MLModel.objects.get(pk=options['model_id'])
+            if mlmodel.framework != 'pytorch':
+                raise CommandError(f"MLModel {mlmodel.pk} no es PyTorch")
+            with open(mlmodel.file.path, 'rb') as f:
+                module = adapter.load(f).module
+            features = mlmodel.hyperparams.count()
+        else:
+            features, hidden = options['features'], options['hidden']
+            module = torch.nn.Sequential(
+                torch.nn.Linear(features, hidden), torch.nn.ReLU(),
+                torch.nn.Linear(hidden, hidden), torch.nn.ReLU(),
+                torch.nn.Linear(hidden, 2),
+            )
+
+        def legacy_predict(data):
+            module.eval()
+            inputs = torch.tensor(data)
+            with torch.no_grad():
+                return module(inputs).numpy().tolist()
+
+        fast = {mode: TorchModel(torch, module, mode=mode) for mode in modes}
+        rng = np.random.default_rng(0)
+        self.stdout.write(f"torch {torch.__version__}, {torch.get_num_threads()} hilos, {features} columnas")
+        header = f"  {'filas':>6}  {'anterior ms':>12}" + ''.join(f"  {('fast ' + (m or 'eager')) + ' ms':>18}" for m in modes)
+        self.stdout.write(header)
+        for rows in options['rows'] or [1, 64, 4096]:
+            data = rng.normal(size=(rows, features)).tolist()
+            legacy_ms = _time_per_call(lambda: legacy_predict(data), options['seconds'])
+            line = f"  {rows:>6}  {legacy_ms:>12.4f}"
+            for mode in modes:
+                ms = _time_per_call(lambda: adapter.predict(fast[mode], data), options['seconds'])
+                line += f"  {ms:>10.4f} ({legacy_ms / ms:.2f}x)"
+            self.stdout.write(line)
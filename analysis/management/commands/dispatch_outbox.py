@@ -0,0 +1,43 @@
+# analysis/management/commands/dispatch_outbox.py
+"""
+Publica en el broker los análisis pendientes del outbox (analysis/outbox.py).
+
+Corre en bucle: mientras haya filas publica lotes seguidos y, cuando el
+outbox queda vacío, espera ANALYSIS_OUTBOX_POLL_SECONDS. Pueden correr varias
+instancias: cada lote se reclama con SKIP LOCKED.
+
+Uso:
+    python manage.py dispatch_outbox
+    python manage.py dispatch_outbox --once
+"""
+import time
+import logging
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from analysis.outbox import drain
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Publica en Celery, por lotes, los análisis pendientes del outbox."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Vacía el outbox una vez y termina.')
+
+    def handle(self, *args, **options):
+        if options['once']:
+            self.stdout.write(f"{drain()} análisis publicados")
+            return
+
+        poll = getattr(settings, 'ANALYSIS_OUTBOX_POLL_SECONDS', 0.2)
+        self.stdout.write(f"Dispatcher del outbox activo (espera {poll}s sin filas)")
+        while True:
+            try:
+                drain()
+            except Exception:
+                logger.exception("Falló una pasada del dispatcher del outbox")
+                close_old_connections()
+            time.sleep(poll)
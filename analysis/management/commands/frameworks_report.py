@@ -0,0 +1,51 @@
+# analysis/management/commands/frameworks_report.py
+"""
+Reporta qué frameworks de ML quedan importados al arrancar un proceso.
+
+Importa la misma cadena que un proceso web (ROOT_URLCONF -> views -> tasks
+-> ml_inference -> adapters) y lista, por adaptador, si su framework ya está
+cargado. Con --load fuerza el import de todos y mide cuánto tarda cada uno.
+
+Uso:
+    python manage.py frameworks_report
+    python manage.py frameworks_report --load
+"""
+import sys
+import time
+import importlib
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Lista los frameworks de ML importados al arrancar (y opcionalmente su costo de import)."
+    # Sin checks: así el import de ROOT_URLCONF se mide desde cero
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--load', action='store_true',
+            help='Importa el framework de cada adaptador y reporta el tiempo de import.'
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        importlib.import_module(settings.ROOT_URLCONF)
+        importlib.import_module('analysis.tasks')
+        startup = time.perf_counter() - start
+
+        from analysis.adapters import ADAPTERS, loaded_frameworks
+
+        self.stdout.write(f"Arranque (urls + tasks): {startup:.3f}s")
+        for name, adapter in sorted(ADAPTERS.items()):
+            module = adapter.framework_module
+            if options['load']:
+                try:
+                    adapter.fw
+                except ImportError as exc:
+                    self.stdout.write(f"  {name:<11} {module:<12} no instalado ({exc})")
+                    continue
+            state = 'cargado' if module in sys.modules else 'no cargado'
+            elapsed = loaded_frameworks().get(module)
+            extra = f" ({elapsed:.3f}s)" if elapsed is not None else ''
+            self.stdout.write(f"  {name:<11} {module:<12} {state}{extra}")
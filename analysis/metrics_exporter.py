@@ -0,0 +1,274 @@
+# analysis/metrics_exporter.py
+"""
+Métricas en formato de texto de Prometheus para GET /metrics.
+
+Nada de esto consulta la BD en cada scrape:
+
+- Cada proceso (workers y web) agrega en memoria contadores e histogramas
+  (latencia por etapa de cada análisis, duración de PreprocessingJob) y,
+  como mucho cada ANALYSIS_METRICS_FLUSH_SECONDS, vuelca un snapshot
+  acumulado en la cache ANALYSIS_METRICS_CACHE (al terminar cada tarea
+  Celery, vía task_postrun). El snapshot incluye los stats de la cache de
+  modelos y de predicciones del proceso.
+- collect_metrics_task (Celery beat, cada ANALYSIS_METRICS_COLLECT_SECONDS)
+  cuenta AnalysisResult por estado y lee el estado de breakers y limiters;
+  el resultado queda también en la cache.
+- /metrics solo lee la cache: suma los snapshots vivos y agrega los gauges.
+
+Los snapshots expiran si el proceso deja de volcarlos, así que los
+contadores de un worker reiniciado vuelven a empezar (Prometheus lo trata
+como un reset del contador). Para que web y workers compartan los datos la
+cache tiene que ser compartida (p. ej. RedisCache).
+"""
+
+import os
+import math
+import time
+import socket
+import logging
+import threading
+from celery.signals import task_postrun
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count
+from .models import AnalysisOutbox, AnalysisResult, MLModel
+from .model_cache import model_cache
+from .prediction_cache import prediction_cache
+from .circuit_breaker import breaker_for_framework, breaker_for_model, model_limiter
+
+logger = logging.getLogger(__name__)
+
+WORKERS_KEY = "metrics:workers"
+GAUGES_KEY = "metrics:gauges"
+
+# Segundos; cubren desde un predict en cache hasta un dataset grande
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, math.inf)
+
+# nombre -> (tipo, ayuda)
+METRICS = {
+    'analysis_stage_seconds': ('histogram', 'Duración de cada etapa de un análisis (cola, dataset, modelo, predict, escritura, total).'),
+    'analysis_completed_total': ('counter', 'Análisis completados por este proceso.'),
+    'preprocessing_job_seconds': ('histogram', 'Duración de PreprocessingJob (started_at -> finished_at).'),
+    'model_cache_hits_total': ('counter', 'Aciertos de la cache de modelos del proceso.'),
+    'model_cache_misses_total': ('counter', 'Fallos de la cache de modelos del proceso.'),
+    'model_cache_evictions_total': ('counter', 'Modelos expulsados de la cache de modelos.'),
+    'model_cache_entries': ('gauge', 'Modelos cargados en memoria.'),
+    'model_cache_bytes': ('gauge', 'Bytes estimados de los modelos cargados.'),
+    'prediction_cache_hits_total': ('counter', 'Aciertos de la cache de predicciones.'),
+    'prediction_cache_misses_total': ('counter', 'Fallos de la cache de predicciones.'),
+    'analysis_results': ('gauge', 'AnalysisResult por estado (último collect_metrics_task).'),
+    'analysis_outbox_pending': ('gauge', 'Análisis del outbox aún sin publicar en el broker, por carril.'),
+    'analysis_outbox_in_flight': ('gauge', 'Análisis publicados por el outbox que aún no terminan.'),
+    'circuit_breaker_state': ('gauge', 'Estado del breaker: 0 closed, 1 half-open, 2 open.'),
+    'circuit_breaker_failures': ('gauge', 'Fallos consecutivos acumulados por el breaker.'),
+    'concurrency_limit': ('gauge', 'Límite actual del limiter adaptativo.'),
+    'concurrency_in_flight': ('gauge', 'Slots en uso del limiter adaptativo.'),
+    'metrics_processes': ('gauge', 'Procesos con snapshot vigente.'),
+    'metrics_gauges_age_seconds': ('gauge', 'Antigüedad de los gauges de collect_metrics_task.'),
+}
+
+BREAKER_STATES = {'closed': 0, 'half-open': 1, 'open': 2}
+
+
+def metrics_cache():
+    return caches[getattr(settings, 'ANALYSIS_METRICS_CACHE', 'shared')]
+
+
+def _labels(labels) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in (labels or {}).items()))
+
+
+class Collector:
+    """Contadores e histogramas del proceso; thread-safe."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self._last_flush = 0.0
+
+    def inc(self, name, labels=None, value=1.0) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0.0) + value
+
+    def observe(self, name, seconds, labels=None) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = {'buckets': [0] * len(BUCKETS), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    hist['buckets'][i] += 1
+            hist['sum'] += seconds
+            hist['count'] += 1
+
+    def observe_analysis(self, metrics, framework, status="SUCCESS") -> None:
+        """Registra las etapas de metrics['timings'] (ver analysis/timing.py)."""
+        for key, ms in (metrics.get('timings') or {}).items():
+            if key.endswith('_ms'):
+                self.observe('analysis_stage_seconds', ms / 1000, {'stage': key[:-3], 'framework': framework})
+        self.inc('analysis_completed_total', {
+            'framework': framework, 'status': status, 'cache_hit': bool(metrics.get('cache_hit')),
+        })
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+            histograms = {k: {'buckets': list(h['buckets']), 'sum': h['sum'], 'count': h['count']}
+                          for k, h in self.histograms.items()}
+        gauges = {}
+        models, predictions = model_cache.stats(), prediction_cache.stats()
+        for name, value in (
+            ('model_cache_hits_total', models['hits']), ('model_cache_misses_total', models['misses']),
+            ('model_cache_evictions_total', models['evictions']),
+            ('prediction_cache_hits_total', predictions['hits']),
+            ('prediction_cache_misses_total', predictions['misses']),
+        ):
+            counters[(name, ())] = float(value)
+        gauges[('model_cache_entries', ())] = models['entries']
+        gauges[('model_cache_bytes', ())] = models['bytes']
+        return {'counters': counters, 'histograms': histograms, 'gauges': gauges}
+
+    def flush(self, force=False) -> bool:
+        """Vuelca el snapshot a la cache si pasó el intervalo (o si force)."""
+        interval = getattr(settings, 'ANALYSIS_METRICS_FLUSH_SECONDS', 15)
+        now = time.monotonic()
+        if not force and now - self._last_flush < interval:
+            return False
+        self._last_flush = now
+
+        backend = metrics_cache()
+        ttl = max(int(interval * 4), 60)
+        key = f"metrics:process:{socket.gethostname()}:{os.getpid()}"
+        backend.set(key, self.snapshot(), timeout=ttl)
+        # Índice de procesos: get + set sin lock; una carrera se corrige en el siguiente flush
+        workers = backend.get(WORKERS_KEY) or {}
+        workers[key] = time.time()
+        cutoff = time.time() - ttl
+        backend.set(WORKERS_KEY, {k: ts for k, ts in workers.items() if ts >= cutoff}, timeout=None)
+        return True
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self._last_flush = 0.0
+
+
+# Instancia única por proceso
+collector = Collector()
+
+
+@task_postrun.connect
+def flush_after_task(**kwargs):
+    try:
+        collector.flush()
+    except Exception:
+        logger.exception("No se pudieron volcar las métricas del proceso")
+
+
+def collect_gauges() -> dict:
+    """
+    Gauges que requieren BD o cache compartida; los calcula
+    collect_metrics_task, nunca el scrape.
+    """
+    gauges = {}
+    counts = dict(AnalysisResult.objects.order_by().values_list('status').annotate(n=Count('id')))
+    for status, _ in AnalysisResult.STATUS_CHOICES:
+        gauges[('analysis_results', _labels({'status': status}))] = counts.get(status, 0)
+    pending = dict(
+        AnalysisOutbox.objects.filter(dispatched_at__isnull=True).order_by()
+        .values_list('lane').annotate(n=Count('id'))
+    )
+    for lane, _ in AnalysisOutbox.LANE_CHOICES:
+        gauges[('analysis_outbox_pending', _labels({'lane': lane}))] = pending.get(lane, 0)
+    gauges[('analysis_outbox_in_flight', ())] = AnalysisOutbox.objects.filter(dispatched_at__isnull=False).count()
+
+    frameworks = set()
+    for mlmodel in MLModel.objects.select_related('serving_variant'):
+        framework = mlmodel.runtime_framework
+        frameworks.add(framework)
+        _breaker_gauges(gauges, breaker_for_model(mlmodel.pk))
+        limiter = model_limiter(mlmodel.pk, framework)
+        if limiter:
+            stats = limiter.stats()
+            labels = _labels({'limiter': limiter.name})
+            gauges[('concurrency_limit', labels)] = stats['limit']
+            gauges[('concurrency_in_flight', labels)] = stats['in_flight']
+    for framework in frameworks:
+        _breaker_gauges(gauges, breaker_for_framework(framework))
+    return {'gauges': gauges, 'collected_at': time.time()}
+
+
+def _breaker_gauges(gauges, breaker) -> None:
+    stats = breaker.stats()
+    labels = _labels({'breaker': breaker.name})
+    gauges[('circuit_breaker_state', labels)] = BREAKER_STATES.get(stats['state'], -1)
+    gauges[('circuit_breaker_failures', labels)] = stats['fails'] or 0
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=()) -> str:
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def _format_value(value) -> str:
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(snapshots, gauges=None) -> str:
+    """Suma los snapshots de todos los procesos y genera el texto de exposición."""
+    counters, histograms, merged_gauges = {}, {}, {}
+    for snap in snapshots:
+        for key, value in snap.get('counters', {}).items():
+            counters[key] = counters.get(key, 0.0) + value
+        for key, value in snap.get('gauges', {}).items():
+            merged_gauges[key] = merged_gauges.get(key, 0) + value
+        for key, hist in snap.get('histograms', {}).items():
+            total = histograms.setdefault(key, {'buckets': [0] * len(BUCKETS), 'sum': 0.0, 'count': 0})
+            total['buckets'] = [a + b for a, b in zip(total['buckets'], hist['buckets'])]
+            total['sum'] += hist['sum']
+            total['count'] += hist['count']
+
+    merged_gauges[('metrics_processes', ())] = len(snapshots)
+    if gauges:
+        merged_gauges.update(gauges['gauges'])
+        merged_gauges[('metrics_gauges_age_seconds', ())] = round(time.time() - gauges['collected_at'], 3)
+
+    series = {}
+    for (name, labels), value in list(counters.items()) + list(merged_gauges.items()):
+        series.setdefault(name, []).append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    for (name, labels), hist in histograms.items():
+        lines = series.setdefault(name, [])
+        for bound, count in zip(BUCKETS, hist['buckets']):
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', _format_value(bound))])} {count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(hist['sum'])}")
+        lines.append(f"{name}_count{_format_labels(labels)} {hist['count']}")
+
+    out = []
+    for name in sorted(series):
+        kind, help_text = METRICS.get(name, ('untyped', ''))
+        out.append(f"# HELP {name} {help_text}")
+        out.append(f"# TYPE {name} {kind}")
+        out.extend(sorted(series[name]))
+    return '\n'.join(out) + '\n'
+
+
+def scrape() -> str:
+    """Texto para /metrics: solo lecturas de cache (snapshots + gauges)."""
+    backend = metrics_cache()
+    # El proceso que atiende el scrape también aporta lo suyo
+    collector.flush()
+    workers = backend.get(WORKERS_KEY) or {}
+    snapshots = [s for s in backend.get_many(list(workers)).values() if s]
+    return render(snapshots, backend.get(GAUGES_KEY))
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0007_mapeoresultado_useranalysis'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mlmodel',
+            name='batch_window_ms',
+            field=models.PositiveIntegerField(default=0, help_text='Milisegundos que se esperan para juntar análisis pendientes (0 = sin espera)'),
+        ),
+        migrations.AddField(
+            model_name='mlmodel',
+            name='max_batch_size',
+            field=models.PositiveIntegerField(default=1, help_text='Máximo de análisis por predict vectorizado (1 = sin micro-batching)'),
+        ),
+    ]
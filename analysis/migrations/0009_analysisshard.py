@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0008_mlmodel_batching'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalysisShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField()),
+                ('start_byte', models.BigIntegerField()),
+                ('end_byte', models.BigIntegerField()),
+                ('status', models.CharField(choices=[('PENDING', 'Pendiente'), ('RUNNING', 'En ejecución'), ('SUCCESS', 'Éxito'), ('FAILURE', 'Fallo')], default='PENDING', max_length=10)),
+                ('rows', models.PositiveIntegerField(default=0)),
+                ('output_path', models.CharField(blank=True, max_length=255)),
+                ('error_message', models.TextField(blank=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('analysis', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shards', to='analysis.analysisresult')),
+            ],
+            options={
+                'ordering': ['index'],
+                'unique_together': {('analysis', 'index')},
+            },
+        ),
+    ]
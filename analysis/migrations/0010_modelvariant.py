@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0009_analysisshard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mlmodel',
+            name='auto_optimize',
+            field=models.BooleanField(default=False, help_text='Exporta el modelo a ONNX (y a int8) al subirlo y usa la variante validada más rápida'),
+        ),
+        migrations.CreateModel(
+            name='ModelVariant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('onnx', 'ONNX fp32'), ('onnx-int8', 'ONNX int8 (cuantización dinámica)')], max_length=20)),
+                ('framework', models.CharField(default='onnx', max_length=20)),
+                ('file', models.FileField(blank=True, upload_to='models/variants/')),
+                ('source_sha256', models.CharField(help_text='Hash del archivo original convertido', max_length=64)),
+                ('status', models.CharField(choices=[('PENDING', 'Pendiente'), ('VALID', 'Validada'), ('INVALID', 'Sin paridad'), ('FAILED', 'Falló')], default='PENDING', max_length=10)),
+                ('latency_ms', models.FloatField(blank=True, help_text='Mediana por predict del lote de prueba', null=True)),
+                ('baseline_latency_ms', models.FloatField(blank=True, help_text='Lo mismo para el archivo original', null=True)),
+                ('accuracy_delta', models.FloatField(blank=True, help_text='Máx. diferencia absoluta (salidas continuas) o fracción de etiquetas distintas', null=True)),
+                ('error_message', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('model', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='variants', to='analysis.mlmodel')),
+            ],
+            options={
+                'ordering': ['model', 'kind'],
+                'unique_together': {('model', 'kind')},
+            },
+        ),
+        migrations.AddField(
+            model_name='mlmodel',
+            name='serving_variant',
+            field=models.ForeignKey(blank=True, help_text='Variante con la que se ejecuta la inferencia (vacío = archivo original)', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='analysis.modelvariant'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0012_analysisoutbox'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysisoutbox',
+            name='owner',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='analysis_outbox', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='analysisoutbox',
+            name='lane',
+            field=models.CharField(choices=[('interactive', 'Interactivo'), ('bulk', 'Masivo')], default='interactive', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='analysisoutbox',
+            name='dispatched_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='analysisoutbox',
+            index=models.Index(condition=models.Q(('dispatched_at__isnull', True)), fields=['lane', 'owner', 'id'], name='analysis_outbox_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='analysisoutbox',
+            index=models.Index(fields=['dispatched_at'], name='analysis_outbox_inflight_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:49
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def backfill_hashes(apps, schema_editor):
+    """Hash de los archivos ya subidos (los que falten se calculan al primer uso)."""
+    for model_cls, field, target in (('MLModel', 'file', 'file_sha256'), ('ModelVariant', 'file', 'sha256')):
+        Model = apps.get_model('analysis', model_cls)
+        for obj in Model.objects.exclude(**{field: ''}).only('pk', field):
+            digest = hashlib.sha256()
+            try:
+                with open(getattr(obj, field).path, 'rb') as f:
+                    for block in iter(lambda: f.read(1024 * 1024), b''):
+                        digest.update(block)
+            except (OSError, ValueError):
+                continue
+            Model.objects.filter(pk=obj.pk).update(**{target: digest.hexdigest()})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0013_analysisoutbox_fair_scheduling'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mlmodel',
+            name='file_sha256',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='modelvariant',
+            name='sha256',
+            field=models.CharField(blank=True, help_text='Hash del archivo de la variante', max_length=64),
+        ),
+        migrations.RunPython(backfill_hashes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0014_model_file_sha256'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysisoutbox',
+            name='queue',
+            field=models.CharField(blank=True, max_length=200),
+        ),
+    ]
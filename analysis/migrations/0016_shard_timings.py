@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0015_outbox_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysisshard',
+            name='timings',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_owner(apps, schema_editor):
+    """Dueño de los análisis existentes = dueño de su dataset."""
+    AnalysisResult = apps.get_model('analysis', 'AnalysisResult')
+    MetaData = apps.get_model('datasets', 'MetaData')
+    AnalysisResult.objects.filter(owner__isnull=True).update(
+        owner_id=models.Subquery(MetaData.objects.filter(pk=models.OuterRef('dataset_id')).values('owner_id')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0016_shard_timings'),
+        ('datasets', '0004_alter_metadata_file'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='analysisresult',
+            name='analysis_dataset_updated_idx',
+        ),
+        migrations.AddField(
+            model_name='analysisresult',
+            name='owner',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='analysis_results', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(backfill_owner, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='analysisresult',
+            index=models.Index(fields=['owner', 'updated_at', 'id'], name='analysis_owner_updated_idx'),
+        ),
+    ]
@@ -1,11 +1,31 @@
 # analysis/inference.py
 
-import os, json
+import os
 import pandas as pd
 from django.conf import settings
 from .adapters import ADAPTERS
+from .model_cache import model_cache
+from .sharding import open_shard
+from .result_store import PredictionWriter, write_predictions
+from .prediction_cache import prediction_cache
+from .timing import StageTimer
 from django.utils.text import slugify
 
+def count_rows(path):
+    """
+    Cuenta las filas de datos de un CSV (sin cabecera) leyendo en bloques
+    binarios, sin parsear. Se usa para reportar progreso.
+    """
+    lines = 0
+    last = b'\n'
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            lines += block.count(b'\n')
+            last = block[-1:]
+    if last != b'\n':
+        lines += 1  # última línea sin salto final
+    return max(lines - 1, 0)
+
 def load_dataset(path):
     """
     - Si son CSV, carga con pandas.
@@ -16,33 +36,53 @@ def load_dataset(path):
     # otros casos…
     raise ValueError(f"Formato de dataset no soportado: {ext}")
 
-def execute(model_path, framework, dataset_path, parameters, analysis_id):
+class LazyDataset:
     """
-    1. Selecciona adaptador según framework.
-    2. Abre el archivo de modelo (file-like).
-    3. Carga y ejecuta predict con data + parámetros.
-    4. Devuelve métricas crudas y ruta de salida.
+    Envuelve la ruta del dataset y solo lo lee la primera vez que se llama
+    a load(). Así un análisis de un único vector no paga el parseo del CSV.
     """
-    # 1. Selecciona adaptador
+
+    def __init__(self, path):
+        self.path = path
+        self.loaded = False
+        self._data = None
+
+    def load(self):
+        if not self.loaded:
+            try:
+                self._data = load_dataset(self.path)
+            except FileNotFoundError:
+                # Error 2.1: Dataset no encontrado
+                raise FileNotFoundError(f"El dataset seleccionado no se encuentra en el sistema. Por favor, carguelo nuevamente.")
+            except Exception as e:
+                # Error 2.2: Otro error al cargar el dataset
+                raise RuntimeError(f"Error al cargar el dataset. Intentelo de nuevo.")
+            self.loaded = True
+        return self._data
+
+def get_adapter(framework):
+    """Devuelve el adaptador registrado para el framework o lanza ValueError."""
     adapter = ADAPTERS.get(framework)
     if not adapter:
         # Error 1: Framework no soportado
         raise ValueError(f"Framework no soportado: {framework}")
+    return adapter
 
-    # 2. Prepara la data
-    try:
-        data = load_dataset(dataset_path)
-    except FileNotFoundError:
-        # Error 2.1: Dataset no encontrado
-        raise FileNotFoundError(f"El dataset seleccionado no se encuentra en el sistema. Por favor, carguelo nuevamente.")
-    except Exception as e:
-        # Error 2.2: Otro error al cargar el dataset
-        raise RuntimeError(f"Error al cargar el dataset. Intentelo de nuevo.")
-
-    # 3. Carga el modelo desde filesystem (file-like)
+def load_model(adapter, framework, model_path, model_id=None, timer=None):
+    """
+    Carga el modelo desde la cache del proceso (si se indica model_id) o
+    desde filesystem, traduciendo los errores a mensajes para el usuario.
+    Con `timer` se mide la etapa model_load y si hubo acierto de cache.
+    """
+    timer = timer or StageTimer()
     try:
-        with open(model_path, 'rb') as f:
-            model_obj = adapter.load(f)
+        with timer.stage('model_load'):
+            if model_id is not None:
+                model_obj, timer.model_cache_hit = model_cache.get_or_load(model_id, model_path, adapter)
+            else:
+                with open(model_path, 'rb') as f:
+                    model_obj = adapter.load(f)
+                timer.model_cache_hit = False
     except FileNotFoundError:
         # Error 3.1: Modelo no encontrado
         raise FileNotFoundError(f"El archivo del modelo no se encontró en el directorio. Por favor, reporte este insidenTE.")
@@ -52,6 +92,61 @@ def execute(model_path, framework, dataset_path, parameters, analysis_id):
     except Exception as e:
         # Error 3.3: Error de deserialización o carga del adaptador
         raise RuntimeError(f"Error al cargar el modelo con el adaptador '{framework}' desde {model_path}: {e}")
+    return model_obj
+
+def run_predict(adapter, model_obj, inputs, model_path, **predict_kwargs):
+    """Ejecuta adapter.predict traduciendo cualquier fallo a RuntimeError."""
+    try:
+        return adapter.predict(model_obj, inputs, **predict_kwargs)
+    except Exception as e:
+        # Error 5: Fallo durante la predicción
+        raise RuntimeError(f"Error durante la ejecucion del modelo '{model_path}': {e}")
+
+def results_base(model_path, analysis_id):
+    """
+    Ruta base (sin extensión) out_<slug>_<id>, creando el directorio si falta.
+    El writer de result_store añade .npy o .json.
+    """
+    out_dir = os.path.join(settings.MEDIA_ROOT, 'data/results')
+    os.makedirs(out_dir, exist_ok=True)
+    model_slug = slugify(os.path.splitext(os.path.basename(model_path))[0])
+    if analysis_id:
+        return os.path.join(out_dir, f"out_{model_slug}_{analysis_id}")
+    return os.path.join(out_dir, f"out_{model_slug}")
+
+def write_results(predictions, model_path, analysis_id):
+    """Escribe las predicciones en MEDIA_ROOT/data/results y devuelve la ruta."""
+    try:
+        out_path = write_predictions(predictions, results_base(model_path, analysis_id))
+            
+    except OSError as e:
+        # Error 6.1: Problemas con la creación de directorios o permisos de escritura
+        raise OSError(f"Error de sistema al crear el directorio de salida o escribir el resultado. Por favor, reporte este insidente.")
+    except Exception as e:
+        # Error 6.2: Otro error al guardar
+        raise RuntimeError(f"Error inesperado al guardar los resultados. Por favor, reporte este insidente e intentelo nuevamente.")
+    return out_path
+
+def execute(model_path, framework, dataset_path, parameters, analysis_id, model_id=None, model_sha256=None):
+    """
+    1. Selecciona adaptador según framework.
+    2. Abre el archivo de modelo (file-like), o lo toma de la cache del
+       proceso si se indica model_id.
+    3. Ejecuta predict con parameters['inputs']; el dataset solo se lee
+       si el adaptador lo usa. Guarda el resultado en la cache de
+       predicciones (con `model_sha256` no se re-hashea el archivo).
+    4. Devuelve métricas crudas (con el desglose de tiempos por etapa) y
+       ruta de salida.
+    """
+    # 1. Selecciona adaptador
+    adapter = get_adapter(framework)
+    timer = StageTimer()
+
+    # 2. Prepara la data de forma perezosa: solo se lee si alguien la pide
+    dataset = LazyDataset(dataset_path)
+
+    # 3. Carga el modelo desde la cache del proceso o desde filesystem (file-like)
+    model_obj = load_model(adapter, framework, model_path, model_id, timer=timer)
 
     # 4. Verifica y obtiene inputs
     inputs = parameters.get('inputs')  # [[...]]
@@ -59,47 +154,183 @@ def execute(model_path, framework, dataset_path, parameters, analysis_id):
         # Error 4: Inputs faltantes
         raise ValueError('Faltan inputs vectorizados en parameters.inputs')
 
-    # 5. Ejecuta inferencia
-    try:
-        predictions = adapter.predict(model_obj, inputs)
-    except Exception as e:
-        # Error 5: Fallo durante la predicción
-        raise RuntimeError(f"Error durante la ejecucion del modelo '{model_path}': {e}")
+    # 5. Ejecuta inferencia; solo los adaptadores que lo declaran reciben el dataset
+    predict_kwargs = {}
+    if adapter.uses_dataset:
+        with timer.stage('dataset_load'):
+            predict_kwargs['dataset'] = dataset.load()
+    with timer.stage('predict'):
+        predictions = run_predict(adapter, model_obj, inputs, model_path, **predict_kwargs)
+    if model_id is not None and not adapter.uses_dataset:
+        prediction_cache.store(model_id, model_path, inputs, predictions, digest=model_sha256)
+
+    # 6. Guarda resultados
+    with timer.stage('result_write'):
+        out_path = write_results(predictions, model_path, analysis_id)
 
-    # 6. (Opcional) calcula métricas sencillas
+    # 7. (Opcional) calcula métricas sencillas
     metrics = {
         'samples': len(predictions),
+        'dataset_loaded': dataset.loaded,
+        'model_cache_hit': timer.model_cache_hit,
+        'timings': timer.as_dict(),
         # puedes añadir accuracy, RMSE, etc., si cuentas con ground-truth
     }
 
-    # 7. Guarda resultados
+    # 8. Retorno exitoso
+    return metrics, out_path
+
+def select_features(chunk, feature_columns=None):
+    """
+    Devuelve la matriz de features de un chunk con las columnas esperadas
+    (key_hint de los hiperparámetros) en ese orden. Si falta alguna lanza
+    ValueError: puntuar otras columnas daría predicciones sin sentido. Sin
+    columnas configuradas se usan todas tal como vienen.
+    """
+    if feature_columns:
+        missing = [c for c in feature_columns if c not in chunk.columns]
+        if missing:
+            # Error 4.1: El CSV no tiene las columnas del modelo
+            raise ValueError(f"El dataset no tiene las columnas que espera el modelo: {', '.join(map(str, missing))}")
+        chunk = chunk[list(feature_columns)]
+    return chunk.to_numpy()
+
+def score_csv(adapter, model_obj, source, out_base, model_path, feature_columns=None,
+              chunksize=None, progress=None, rows_total=0, timer=None):
+    """
+    Lee `source` (ruta o file-like con cabecera) por chunks, llama
+    adapter.predict por chunk y agrega las predicciones a `out_base`.
+    Devuelve (filas puntuadas, número de chunks, ruta final). Con `timer`
+    se acumulan dataset_load, predict y result_write de todos los chunks.
+    """
+    chunksize = chunksize or getattr(settings, 'ANALYSIS_DATASET_CHUNK_ROWS', 10000)
+    timer = timer or StageTimer()
+    chunks = 0
     try:
-        # 1) Directorio de salida
-        out_dir = os.path.join(settings.MEDIA_ROOT, 'data/results')
-        os.makedirs(out_dir, exist_ok=True)
-        
-        # 2) Sanear el nombre del modelo
-        base_name  = os.path.splitext(os.path.basename(model_path))[0]
-        model_slug = slugify(base_name)  # "my-model-v2"
-
-        # 3) Construir el filename según el id del análisis si viene
-        if analysis_id:
-            filename = f"out_{model_slug}_{analysis_id}.json"
-        else:
-            filename = f"out_{model_slug}.json"
-
-        out_path = os.path.join(out_dir, filename)
-        
-        # 4) Escribir el archivo
-        with open(out_path, 'w') as fp:
-            json.dump(predictions, fp)
-            
+        with pd.read_csv(source, chunksize=chunksize) as reader, PredictionWriter(out_base) as writer:
+            reader_iter = iter(reader)
+            while True:
+                with timer.stage('dataset_load'):
+                    chunk = next(reader_iter, None)
+                if chunk is None:
+                    break
+                with timer.stage('predict'):
+                    predictions = run_predict(adapter, model_obj, select_features(chunk, feature_columns), model_path)
+                with timer.stage('result_write'):
+                    writer.append(predictions)
+                chunks += 1
+                if progress:
+                    progress(writer.count, max(rows_total, writer.count))
+    except FileNotFoundError:
+        # Error 2.1: Dataset no encontrado
+        raise FileNotFoundError(f"El dataset seleccionado no se encuentra en el sistema. Por favor, carguelo nuevamente.")
+    except (pd.errors.ParserError, pd.errors.EmptyDataError, UnicodeDecodeError):
+        # Error 2.2: CSV corrupto
+        raise RuntimeError(f"Error al cargar el dataset. Intentelo de nuevo.")
     except OSError as e:
         # Error 6.1: Problemas con la creación de directorios o permisos de escritura
         raise OSError(f"Error de sistema al crear el directorio de salida o escribir el resultado. Por favor, reporte este insidente.")
-    except Exception as e:
-        # Error 6.2: Otro error al guardar
-        raise RuntimeError(f"Error inesperado al guardar los resultados. Por favor, reporte este insidente e intentelo nuevamente.")
+    return writer.count, chunks, writer.out_path
 
-    # 8. Retorno exitoso
+def execute_dataset(model_path, framework, dataset_path, analysis_id, model_id=None,
+                    feature_columns=None, chunksize=None, progress=None):
+    """
+    Puntúa todas las filas del dataset con el modelo.
+
+    1. Lee el CSV por chunks (memoria acotada sin importar el tamaño).
+    2. Llama adapter.predict por chunk.
+    3. Agrega las predicciones al archivo de salida de forma incremental.
+    4. Reporta progreso con progress(rows_scored, rows_total) tras cada chunk.
+    """
+    adapter = get_adapter(framework)
+    timer = StageTimer()
+    model_obj = load_model(adapter, framework, model_path, model_id, timer=timer)
+
+    try:
+        with timer.stage('dataset_load'):
+            rows_total = count_rows(dataset_path)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"El dataset seleccionado no se encuentra en el sistema. Por favor, carguelo nuevamente.")
+
+    rows, chunks, out_path = score_csv(
+        adapter, model_obj, dataset_path, results_base(model_path, analysis_id), model_path,
+        feature_columns=feature_columns, chunksize=chunksize,
+        progress=progress, rows_total=rows_total, timer=timer,
+    )
+
+    metrics = {
+        'samples': rows,
+        'dataset_loaded': True,
+        'mode': 'dataset',
+        'chunks': chunks,
+        'progress': {'rows_scored': rows, 'rows_total': rows},
+        'model_cache_hit': timer.model_cache_hit,
+        'timings': timer.as_dict(),
+    }
     return metrics, out_path
+
+def execute_shard(model_path, framework, dataset_path, analysis_id, shard_index,
+                  start_byte, end_byte, model_id=None, feature_columns=None, chunksize=None):
+    """
+    Puntúa solo las filas del rango [start_byte, end_byte) del CSV y escribe
+    un archivo parcial. Devuelve (filas puntuadas, ruta parcial, timings):
+    lectura, predict y escritura de todos los chunks del shard, más
+    model_cache_hit.
+    """
+    adapter = get_adapter(framework)
+    timer = StageTimer()
+    model_obj = load_model(adapter, framework, model_path, model_id, timer=timer)
+    out_base = results_base(model_path, f"{analysis_id}.part{shard_index}")
+    try:
+        source = open_shard(dataset_path, start_byte, end_byte)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"El dataset seleccionado no se encuentra en el sistema. Por favor, carguelo nuevamente.")
+    with source:
+        rows, _, out_path = score_csv(
+            adapter, model_obj, source, out_base, model_path,
+            feature_columns=feature_columns, chunksize=chunksize, timer=timer,
+        )
+    return rows, out_path, {**timer.as_dict(), 'model_cache_hit': timer.model_cache_hit}
+
+def execute_batch(model_path, framework, items, model_id=None, model_sha256=None):
+    """
+    Ejecuta un único predict vectorizado para varios análisis del mismo modelo.
+
+    items: lista de (analysis_id, inputs) donde inputs es el vector_2d de cada uno.
+    Concatena todas las filas, llama una sola vez a adapter.predict y reparte
+    las predicciones en el mismo orden. Devuelve {analysis_id: (metrics, out_path)}.
+    """
+    adapter = get_adapter(framework)
+    if adapter.uses_dataset:
+        raise ValueError(f"El adaptador '{framework}' usa el dataset y no admite micro-batching")
+
+    timer = StageTimer()
+    model_obj = load_model(adapter, framework, model_path, model_id, timer=timer)
+
+    rows, spans = [], []
+    for analysis_id, inputs in items:
+        spans.append((analysis_id, len(rows), len(rows) + len(inputs)))
+        rows.extend(inputs)
+
+    with timer.stage('predict'):
+        predictions = run_predict(adapter, model_obj, rows, model_path)
+
+    # model_load y predict son compartidos por todo el batch; result_write es de cada análisis
+    shared = timer.as_dict()
+    results = {}
+    for analysis_id, begin, end in spans:
+        chunk = predictions[begin:end]
+        if model_id is not None:
+            prediction_cache.store(model_id, model_path, rows[begin:end], chunk, digest=model_sha256)
+        write_timer = StageTimer()
+        with write_timer.stage('result_write'):
+            out_path = write_results(chunk, model_path, analysis_id)
+        metrics = {
+            'samples': len(chunk),
+            'dataset_loaded': False,
+            'batch_size': len(items),
+            'model_cache_hit': timer.model_cache_hit,
+            'timings': {**shared, **write_timer.as_dict()},
+        }
+        results[analysis_id] = (metrics, out_path)
+    return results
@@ -0,0 +1,163 @@
+# analysis/model_cache.py
+"""
+Cache LRU por proceso de modelos ya deserializados.
+
+Cada worker de Celery (y cada proceso web) mantiene su propia instancia.
+La clave combina el id del MLModel con el mtime y el tamaño del archivo,
+de modo que si un admin sube un archivo nuevo la clave cambia sola y la
+entrada vieja se descarta.
+
+Uso:
+    from analysis.model_cache import model_cache
+    model_obj, hit = model_cache.get_or_load(model_id, model_path, adapter)
+    model_cache.stats()  # hits, misses, evictions, entries, bytes
+"""
+
+import os
+import logging
+import threading
+from collections import OrderedDict
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ModelCache:
+    def __init__(self, max_entries: int = None, max_bytes: int = None):
+        """
+        max_entries: número máximo de modelos residentes en el proceso.
+        max_bytes: memoria máxima estimada (suma de tamaños de archivo).
+        Si no se indican se leen de settings en cada acceso.
+        """
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._entries = OrderedDict()   # key -> (model_obj, size_bytes)
+        self._keys_by_model = {}        # model_id -> key vigente
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def max_entries(self) -> int:
+        if self._max_entries is not None:
+            return self._max_entries
+        return int(getattr(settings, 'ANALYSIS_MODEL_CACHE_MAX_ENTRIES', 8))
+
+    @property
+    def max_bytes(self) -> int:
+        if self._max_bytes is not None:
+            return self._max_bytes
+        return int(getattr(settings, 'ANALYSIS_MODEL_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+
+    @staticmethod
+    def make_key(model_id, model_path):
+        """Clave (model_id, mtime_ns, size); lanza FileNotFoundError si no existe."""
+        st = os.stat(model_path)
+        return (model_id, st.st_mtime_ns, st.st_size)
+
+    def _estimate_size(self, key) -> int:
+        # El tamaño en disco es una aproximación razonable de la memoria
+        # residente para joblib/pt/onnx; los adaptadores no exponen nada mejor.
+        return int(key[2])
+
+    def get(self, key):
+        """Devuelve el modelo cacheado para `key` o None, actualizando el orden LRU."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def peek(self, model_id, model_path) -> bool:
+        """Indica si el modelo está residente, sin alterar contadores ni el orden LRU."""
+        try:
+            key = self.make_key(model_id, model_path)
+        except OSError:
+            return False
+        with self._lock:
+            return key in self._entries
+
+    def put(self, key, model_obj) -> None:
+        size = self._estimate_size(key)
+        with self._lock:
+            # Un archivo nuevo para el mismo MLModel reemplaza la entrada anterior
+            old_key = self._keys_by_model.get(key[0])
+            if old_key is not None and old_key != key:
+                self._drop(old_key)
+            self._entries[key] = (model_obj, size)
+            self._entries.move_to_end(key)
+            self._keys_by_model[key[0]] = key
+            self._evict()
+
+    def get_or_load(self, model_id, model_path, adapter):
+        """
+        Devuelve (model_obj, hit). En caso de miss abre el archivo y llama
+        adapter.load(f); las excepciones de apertura/carga se propagan tal cual.
+        """
+        key = self.make_key(model_id, model_path)
+        model_obj = self.get(key)
+        if model_obj is not None:
+            with self._lock:
+                self.hits += 1
+            return model_obj, True
+
+        # La carga se hace fuera del lock para no bloquear otros hilos
+        with open(model_path, 'rb') as f:
+            model_obj = adapter.load(f)
+        with self._lock:
+            self.misses += 1
+        self.put(key, model_obj)
+        logger.info("Model cache miss para MLModel %s; stats=%s", model_id, self.stats())
+        return model_obj, False
+
+    def _drop(self, key) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None and self._keys_by_model.get(key[0]) == key:
+            del self._keys_by_model[key[0]]
+
+    def _current_bytes(self) -> int:
+        return sum(size for _, size in self._entries.values())
+
+    def _evict(self) -> None:
+        """Expulsa las entradas menos usadas hasta respetar ambos límites."""
+        max_entries, max_bytes = self.max_entries, self.max_bytes
+        # Siempre se conserva al menos la entrada recién insertada
+        while len(self._entries) > 1 and (
+            len(self._entries) > max_entries or self._current_bytes() > max_bytes
+        ):
+            key, _ = next(iter(self._entries.items()))
+            self._drop(key)
+            self.evictions += 1
+            logger.info("Model cache evict MLModel %s (key=%s)", key[0], key)
+
+    def invalidate(self, model_id) -> None:
+        """Descarta cualquier entrada del MLModel indicado."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == model_id]:
+                self._drop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_model.clear()
+
+    def stats(self) -> dict:
+        """Contadores para dimensionar la cache (útil en logs y monitoring)."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else None,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._current_bytes(),
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+            }
+
+
+# Instancia única por proceso
+model_cache = ModelCache()
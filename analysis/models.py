@@ -21,6 +21,11 @@ class MLModel(models.Model):
         name (str): Nombre descriptivo del modelo.
         created_at (datetime): Fecha y hora de creación del registro.
         updated_at (datetime): Fecha y hora de última actualización.
+        batch_window_ms (int): Ventana de espera para el micro-batching.
+        max_batch_size (int): Tamaño máximo de cada micro-batch.
+        auto_optimize (bool): Genera variantes ONNX/int8 al subir el archivo.
+        serving_variant (ModelVariant): Variante validada con la que se infiere.
+        file_sha256 (str): sha256 del archivo, calculado al subirlo.
     """
     name  = models.CharField(max_length=100)
     version = models.CharField(max_length=50)
@@ -40,6 +45,47 @@ class MLModel(models.Model):
     # Solo el superuser (owner) podrá crear/editar estos registros
     owner        = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     created_at   = models.DateTimeField(auto_now_add=True)
+    # Micro-batching: agrupa análisis pendientes del mismo modelo en un solo predict
+    batch_window_ms = models.PositiveIntegerField(
+        default=0,
+        help_text='Milisegundos que se esperan para juntar análisis pendientes (0 = sin espera)'
+    )
+    max_batch_size  = models.PositiveIntegerField(
+        default=1,
+        help_text='Máximo de análisis por predict vectorizado (1 = sin micro-batching)'
+    )
+    # Variantes ONNX (fp32 / int8) generadas en segundo plano; ver analysis/variants.py
+    auto_optimize   = models.BooleanField(
+        default=False,
+        help_text='Exporta el modelo a ONNX (y a int8) al subirlo y usa la variante validada más rápida'
+    )
+    serving_variant = models.ForeignKey(
+        'ModelVariant', null=True, blank=True, on_delete=models.SET_NULL, related_name='+',
+        help_text='Variante con la que se ejecuta la inferencia (vacío = archivo original)'
+    )
+    # Lo calcula la señal pre_save al subir el archivo; la cache de predicciones lo usa como clave
+    file_sha256     = models.CharField(max_length=64, blank=True, editable=False)
+
+    @property
+    def runtime_framework(self):
+        """Framework con el que se ejecuta: el de la variante activa o el original."""
+        if self.serving_variant_id:
+            return self.serving_variant.framework
+        return self.framework
+
+    @property
+    def runtime_path(self):
+        """Archivo con el que se ejecuta: el de la variante activa o el original."""
+        if self.serving_variant_id:
+            return self.serving_variant.file.path
+        return self.file.path
+
+    @property
+    def runtime_sha256(self):
+        """sha256 de runtime_path guardado en la BD ('' si no se conoce)."""
+        if self.serving_variant_id:
+            return self.serving_variant.sha256
+        return self.file_sha256
 
     def __str__(self):
         """
@@ -91,6 +137,8 @@ class AnalysisResult(models.Model):
         error_message (str): Mensaje de error en caso de fallo.
         created_at (datetime): Fecha de creación del registro.
         updated_at (datetime): Fecha de última actualización.
+        owner (ForeignKey): Dueño del dataset, copiado al crear para
+            consultar por usuario en orden de updated_at.
     """
     STATUS_CHOICES = [
         ("PENDING", "Pendiente"),
@@ -101,6 +149,8 @@ class AnalysisResult(models.Model):
 
     dataset       = models.ForeignKey("datasets.metadata", on_delete=models.CASCADE)
     model         = models.ForeignKey(MLModel, on_delete=models.CASCADE)
+    owner         = models.ForeignKey(User, on_delete=models.CASCADE, null=True, editable=False,
+                                      related_name='analysis_results')
     parameters    = models.JSONField()  # aquí van los hiperparámetros enviados por el usuario
     status        = models.CharField(max_length=10, choices=STATUS_CHOICES, default="PENDING")
     metrics       = models.JSONField(null=True, blank=True)
@@ -110,6 +160,121 @@ class AnalysisResult(models.Model):
     updated_at    = models.DateTimeField(auto_now=True)
     completed_at  = models.DateTimeField(null=True, blank=True)  
 
+    class Meta:
+        indexes = [
+            # Estados en bloque con ?updated_since=/?cursor=: keyset por usuario en (updated_at, id)
+            models.Index(fields=['owner', 'updated_at', 'id'], name='analysis_owner_updated_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.owner_id is None and self.dataset_id is not None:
+            self.owner_id = self.dataset.owner_id
+        super().save(*args, **kwargs)
+
+class AnalysisOutbox(models.Model):
+    """
+    launch_analysis_task pendiente de publicar en el broker. Se escribe en
+    la misma transacción que el AnalysisResult y la publica
+    analysis/outbox.py en lotes, repartidos por usuario y carril (ver
+    analysis/fair_scheduler.py). Una vez publicada (dispatched_at) la fila
+    cuenta como análisis en vuelo hasta que este termina y se borra.
+    """
+    LANE_CHOICES = [
+        ("interactive", "Interactivo"),
+        ("bulk", "Masivo"),
+    ]
+
+    analysis      = models.OneToOneField(AnalysisResult, on_delete=models.CASCADE, related_name='outbox')
+    owner         = models.ForeignKey(User, on_delete=models.CASCADE, null=True, related_name='analysis_outbox')
+    lane          = models.CharField(max_length=16, choices=LANE_CHOICES, default="interactive")
+    created_at    = models.DateTimeField(auto_now_add=True)
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+    # Cola de afinidad a la que se publicó ('' = cola por defecto)
+    queue         = models.CharField(max_length=200, blank=True)
+    attempts      = models.PositiveIntegerField(default=0)
+    last_error    = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            # Colas virtuales por (carril, usuario): solo filas sin publicar
+            models.Index(fields=['lane', 'owner', 'id'], name='analysis_outbox_pending_idx',
+                         condition=models.Q(dispatched_at__isnull=True)),
+            models.Index(fields=['dispatched_at'], name='analysis_outbox_inflight_idx'),
+        ]
+
+    def __str__(self):
+        return f'Outbox #{self.pk} -> AnalysisResult {self.analysis_id}'
+
+class AnalysisShard(models.Model):
+    """
+    Rango de filas de un dataset grande puntuado por una tarea Celery
+    independiente. Un AnalysisResult en modo dataset puede dividirse en
+    varios shards (rangos de bytes alineados a líneas del CSV) que se
+    puntúan en paralelo y luego se fusionan en un único archivo.
+    """
+    STATUS_CHOICES = AnalysisResult.STATUS_CHOICES
+
+    analysis      = models.ForeignKey(AnalysisResult, on_delete=models.CASCADE, related_name='shards')
+    index         = models.PositiveIntegerField()
+    start_byte    = models.BigIntegerField()
+    end_byte      = models.BigIntegerField()
+    status        = models.CharField(max_length=10, choices=STATUS_CHOICES, default="PENDING")
+    rows          = models.PositiveIntegerField(default=0)
+    output_path   = models.CharField(max_length=255, blank=True)
+    error_message = models.TextField(blank=True)
+    # Milisegundos por etapa del shard (StageTimer.as_dict())
+    timings       = models.JSONField(default=dict, blank=True)
+    started_at    = models.DateTimeField(null=True, blank=True)
+    finished_at   = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = (('analysis', 'index'),)
+        ordering = ['index']
+
+    def __str__(self):
+        return f"Análisis {self.analysis_id} | shard #{self.index} [{self.status}]"
+
+class ModelVariant(models.Model):
+    """
+    Versión convertida de un MLModel (ONNX fp32 o ONNX int8) guardada junto
+    al original. El job de conversión mide su latencia y su diferencia con
+    las predicciones del original sobre entradas generadas; solo las
+    variantes VALID pueden quedar como serving_variant del modelo.
+    """
+    KIND_CHOICES = [
+        ('onnx', 'ONNX fp32'),
+        ('onnx-int8', 'ONNX int8 (cuantización dinámica)'),
+    ]
+    STATUS_CHOICES = [
+        ("PENDING", "Pendiente"),
+        ("VALID", "Validada"),
+        ("INVALID", "Sin paridad"),
+        ("FAILED", "Falló"),
+    ]
+
+    model               = models.ForeignKey(MLModel, on_delete=models.CASCADE, related_name='variants')
+    kind                = models.CharField(max_length=20, choices=KIND_CHOICES)
+    framework           = models.CharField(max_length=20, default='onnx')
+    file                = models.FileField(upload_to='models/variants/', blank=True)
+    source_sha256       = models.CharField(max_length=64, help_text='Hash del archivo original convertido')
+    sha256              = models.CharField(max_length=64, blank=True, help_text='Hash del archivo de la variante')
+    status              = models.CharField(max_length=10, choices=STATUS_CHOICES, default="PENDING")
+    latency_ms          = models.FloatField(null=True, blank=True, help_text='Mediana por predict del lote de prueba')
+    baseline_latency_ms = models.FloatField(null=True, blank=True, help_text='Lo mismo para el archivo original')
+    accuracy_delta      = models.FloatField(
+        null=True, blank=True,
+        help_text='Máx. diferencia absoluta (salidas continuas) o fracción de etiquetas distintas'
+    )
+    error_message       = models.TextField(blank=True)
+    created_at          = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = (('model', 'kind'),)
+        ordering = ['model', 'kind']
+
+    def __str__(self):
+        return f"{self.model} | {self.kind} [{self.status}]"
+
 class MapeoResultado(models.Model):
     """
     Mapea el valor numérico de una predicción a una etiqueta de texto legible.
@@ -0,0 +1,149 @@
+# analysis/notifications.py
+"""
+Publica las transiciones de estado de análisis y PreprocessingJob en el
+grupo `user_<id>` del dueño, que escucha NotificacionConsumer
+(ws/analysis/). Así el cliente no necesita hacer polling del detalle.
+
+Mensajes (el consumer los envía como {"message": ...}):
+
+    {"type": "analysis.status", "analysis_id": 12, "status": "RUNNING"}
+    {"type": "analysis.status", "analysis_id": 12, "status": "RUNNING",
+     "progress": {"rows_scored": 20000, "rows_total": 80000}}
+    {"type": "analysis.status", "analysis_id": 12, "status": "SUCCESS",
+     "summary": {"samples": 1, "cache_hit": false, "total_ms": 41.2, "url": "/api/v1/analysis/12/"}}
+    {"type": "preprocessing.status", "job_id": 3, "status": "FAILED", "error": "..."}
+
+Cada mensaje queda además como último estado del objeto para los clientes
+sin WebSocket (long-poll/SSE, ver analysis/status_watch.py): en la cache
+ANALYSIS_STATUS_CACHE y en el grupo status_<tipo>_<pk>.
+
+Una notificación nunca hace fallar la tarea: si channels no está
+instalado o el channel layer no responde, se registra y se sigue.
+"""
+
+import logging
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+try:
+    from asgiref.sync import async_to_sync
+    from channels.layers import get_channel_layer
+except ImportError:  # channels es opcional en workers sin WebSocket
+    get_channel_layer = None
+
+logger = logging.getLogger(__name__)
+
+
+def user_group(user_id) -> str:
+    """Nombre del grupo de NotificacionConsumer para el usuario."""
+    return f"user_{user_id}"
+
+
+def status_group(kind, pk) -> str:
+    """Grupo de los clientes que esperan cambios de un objeto (long-poll/SSE)."""
+    return f"status_{kind}_{pk}"
+
+
+def status_key(kind, pk) -> str:
+    return f"status:{kind}:{pk}"
+
+
+def status_cache():
+    return caches[getattr(settings, "ANALYSIS_STATUS_CACHE", "shared")]
+
+
+def _group_send(group, event) -> bool:
+    if get_channel_layer is None:
+        return False
+    try:
+        layer = get_channel_layer()
+        if layer is None:
+            return False
+        async_to_sync(layer.group_send)(group, event)
+        return True
+    except Exception as exc:
+        logger.warning("No se pudo publicar la notificación en %s: %s", group, exc)
+        return False
+
+
+def publish(user_id, message: dict) -> bool:
+    """Envía `message` al grupo del usuario. Devuelve False si no se pudo."""
+    if user_id is None:
+        return False
+    return _group_send(user_group(user_id), {"type": "send_notification", "message": message})
+
+
+def record_status(kind, pk, message: dict, owner_id=None) -> None:
+    """
+    Deja `message` como último estado del objeto y despierta a quienes
+    esperan. La entrada guarda el dueño para que el endpoint de estados en
+    bloque pueda responder desde la cache sin ir a la BD.
+    """
+    entry = {"owner_id": owner_id, "message": message}
+    try:
+        status_cache().set(status_key(kind, pk), entry, timeout=getattr(settings, "ANALYSIS_STATUS_TTL", 3600))
+    except Exception as exc:
+        logger.warning("No se pudo guardar el estado de %s %s: %s", kind, pk, exc)
+    _group_send(status_group(kind, pk), {"type": "status.changed", "message": message})
+
+
+def analysis_summary(analysis) -> dict:
+    """Resumen del resultado: lo suficiente para pintar la fila sin pedir el detalle."""
+    metrics = analysis.metrics or {}
+    return {
+        "samples": metrics.get("samples"),
+        "cache_hit": bool(metrics.get("cache_hit")),
+        "total_ms": (metrics.get("timings") or {}).get("total_ms"),
+        "url": f"/api/v1/analysis/{analysis.pk}/",
+    }
+
+
+def analysis_message(analysis, status, progress=None, error=None) -> dict:
+    message = {
+        "type": "analysis.status",
+        "analysis_id": analysis.pk,
+        "model_id": analysis.model_id,
+        "status": status,
+        "updated_at": timezone.now().isoformat(),
+    }
+    if progress is not None:
+        message["progress"] = progress
+    if status == "SUCCESS":
+        message["summary"] = analysis_summary(analysis)
+    if error:
+        message["error"] = error
+    return message
+
+
+def notify_analyses(analyses, status, progress=None, error=None) -> None:
+    """Publica el mismo estado para varios análisis (un mensaje por análisis)."""
+    for a in analyses:
+        message = analysis_message(a, status, progress=progress, error=error)
+        publish(a.dataset.owner_id, message)
+        record_status("analysis", a.pk, message, owner_id=a.dataset.owner_id)
+
+
+def notify_analysis(analysis, status, progress=None, error=None) -> None:
+    notify_analyses([analysis], status, progress=progress, error=error)
+
+
+def preprocessing_message(job) -> dict:
+    message = {
+        "type": "preprocessing.status",
+        "job_id": job.pk,
+        "dataset_id": job.dataset_id,
+        "status": job.status,
+        "updated_at": timezone.now().isoformat(),
+    }
+    if job.status == "SUCCESS" and job.result_file:
+        message["summary"] = {"result_file": job.result_file.name}
+    if job.error_message:
+        message["error"] = job.error_message
+    return message
+
+
+def notify_preprocessing(job) -> None:
+    message = preprocessing_message(job)
+    publish(job.owner_id, message)
+    record_status("preprocessing", job.pk, message, owner_id=job.owner_id)
@@ -0,0 +1,160 @@
+# analysis/onnx_session.py
+"""
+Sesiones de onnxruntime optimizadas para el ONNXAdapter.
+
+- El grafo se optimiza una sola vez hasta ORT_ENABLE_EXTENDED (fusiones
+  portables) y se guarda en ANALYSIS_ONNX_CACHE_DIR (clave = sha256 del
+  archivo + versión de onnxruntime + arquitectura). Las optimizaciones de
+  layout de ORT_ENABLE_ALL dependen de las instrucciones de la CPU
+  (NCHWc/AVX512...), así que no se persisten: se aplican al crear cada
+  sesión, también sobre el archivo cacheado.
+- Los hilos salen del presupuesto del proceso (thread_budget).
+- La sesión vive en la cache de modelos del proceso, así que se reutiliza
+  entre tareas; run() es thread-safe y cada hilo tiene su propio IO binding.
+- Los inputs se convierten a un arreglo contiguo del dtype y rango que
+  declara el modelo (float32 normalmente) y se enlazan sin copia; la salida
+  se escribe en un buffer preasignado por tamaño de batch.
+"""
+
+import os
+import hashlib
+import logging
+import platform
+import threading
+import numpy as np
+from django.conf import settings
+from . import thread_budget
+
+logger = logging.getLogger(__name__)
+
+ORT_DTYPES = {
+    'tensor(float)': np.float32,
+    'tensor(double)': np.float64,
+    'tensor(float16)': np.float16,
+    'tensor(int64)': np.int64,
+    'tensor(int32)': np.int32,
+    'tensor(int8)': np.int8,
+    'tensor(uint8)': np.uint8,
+    'tensor(bool)': np.bool_,
+}
+
+# Buffers de salida preasignados por hilo (uno por tamaño de batch)
+MAX_OUTPUT_BUFFERS = 8
+
+
+def cache_dir() -> str:
+    return getattr(settings, 'ANALYSIS_ONNX_CACHE_DIR', None) or os.path.join(settings.MEDIA_ROOT, 'cache', 'onnx')
+
+
+def optimized_path(ort, model_bytes) -> str:
+    """Ruta del modelo optimizado; depende del contenido, de ORT y de la arquitectura."""
+    digest = hashlib.sha256(model_bytes).hexdigest()[:32]
+    return os.path.join(cache_dir(), f"{digest}-ort{ort.__version__}-{platform.machine()}-ext.onnx")
+
+
+def build_session(ort, model_bytes):
+    """
+    Crea la InferenceSession. La primera vez guarda en disco el grafo
+    optimizado hasta EXTENDED; después carga ese archivo. La sesión que se
+    usa siempre se crea con ORT_ENABLE_ALL para la CPU en la que corre.
+    """
+    options = thread_budget.onnx_session_options(ort)
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    cached = optimized_path(ort, model_bytes)
+    if os.path.exists(cached):
+        try:
+            return ort.InferenceSession(cached, sess_options=options, providers=['CPUExecutionProvider'])
+        except Exception as exc:
+            # Archivo truncado o de otra versión: se regenera
+            logger.warning("Modelo ONNX optimizado inválido en %s (%s); se regenera", cached, exc)
+            os.remove(cached)
+            options = thread_budget.onnx_session_options(ort)
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+    try:
+        _save_optimized(ort, model_bytes, cached)
+    except OSError as exc:
+        logger.warning("No se pudo guardar el modelo ONNX optimizado en %s: %s", cached, exc)
+    else:
+        if os.path.exists(cached):
+            return ort.InferenceSession(cached, sess_options=options, providers=['CPUExecutionProvider'])
+    return ort.InferenceSession(model_bytes, sess_options=options, providers=['CPUExecutionProvider'])
+
+
+def _save_optimized(ort, model_bytes, cached):
+    """Optimiza hasta EXTENDED (portable) y guarda el grafo en `cached`."""
+    options = thread_budget.onnx_session_options(ort)
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED
+    os.makedirs(os.path.dirname(cached), exist_ok=True)
+    # Se escribe a un temporal para que otro proceso nunca lea un archivo a medias
+    tmp_path = f"{cached}.{os.getpid()}.tmp"
+    options.optimized_model_filepath = tmp_path
+    ort.InferenceSession(model_bytes, sess_options=options, providers=['CPUExecutionProvider'])
+    if os.path.exists(tmp_path):
+        os.replace(tmp_path, cached)
+
+
+class OnnxSession:
+    """Envuelve una InferenceSession con conversión de inputs e IO binding."""
+
+    def __init__(self, session):
+        self.session = session
+        model_input = session.get_inputs()[0]
+        model_output = session.get_outputs()[0]
+        self.input_name = model_input.name
+        self.input_rank = len(model_input.shape)
+        self.input_dtype = ORT_DTYPES.get(model_input.type, np.float32)
+        self.output_name = model_output.name
+        self.output_dtype = ORT_DTYPES.get(model_output.type)
+        tail = model_output.shape[1:]
+        # Solo se preasigna la salida si todo salvo el batch es estático
+        self.output_tail = tuple(tail) if all(isinstance(d, int) for d in tail) else None
+        self._local = threading.local()
+
+    def prepare(self, data) -> np.ndarray:
+        """Arreglo contiguo del dtype del modelo, con el rango que espera."""
+        X = np.ascontiguousarray(data, dtype=self.input_dtype)
+        if X.ndim < self.input_rank:
+            X = X.reshape((1,) * (self.input_rank - X.ndim) + X.shape)
+        return X
+
+    def _binding(self):
+        local = self._local
+        if not hasattr(local, 'binding'):
+            local.binding = self.session.io_binding()
+            local.buffers = {}
+        return local
+
+    def _output_buffer(self, local, batch):
+        buf = local.buffers.get(batch)
+        if buf is None:
+            if len(local.buffers) >= MAX_OUTPUT_BUFFERS:
+                local.buffers.pop(next(iter(local.buffers)))
+            buf = np.empty((batch,) + self.output_tail, dtype=self.output_dtype)
+            local.buffers[batch] = buf
+        return buf
+
+    def run(self, data) -> np.ndarray:
+        """
+        Ejecuta el modelo. Si la salida se escribió en un buffer preasignado,
+        el arreglo devuelto es válido hasta la próxima llamada del mismo hilo.
+        """
+        X = self.prepare(data)
+        if self.output_dtype is None:
+            # Salidas no tensoriales (secuencias/mapas): camino sin binding
+            return np.asarray(self.session.run([self.output_name], {self.input_name: X})[0])
+
+        local = self._binding()
+        binding = local.binding
+        binding.bind_cpu_input(self.input_name, X)
+        if self.output_tail is not None:
+            out = self._output_buffer(local, X.shape[0])
+            binding.bind_output(self.output_name, 'cpu', 0, self.output_dtype, out.shape, out.ctypes.data)
+            self.session.run_with_iobinding(binding)
+            return out
+        binding.bind_output(self.output_name, 'cpu')
+        self.session.run_with_iobinding(binding)
+        return binding.copy_outputs_to_cpu()[0]
+
+    def get_inputs(self):
+        return self.session.get_inputs()
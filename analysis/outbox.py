@@ -0,0 +1,233 @@
+# analysis/outbox.py
+"""
+Outbox transaccional para launch_analysis_task.
+
+La vista ya no publica en el broker: enqueue() inserta una fila
+AnalysisOutbox en la misma transacción que el AnalysisResult (y su
+UserAnalysis), así que la petición no espera al broker y ningún worker
+recibe un análisis sin commit.
+
+dispatch_pending() elige hasta ANALYSIS_OUTBOX_BATCH_SIZE filas (y no más
+de lo que deja libre ANALYSIS_FAIR_MAX_IN_FLIGHT) repartidas entre usuarios
+y carriles (analysis/fair_scheduler.py), las bloquea con SELECT ... FOR
+UPDATE SKIP LOCKED (varios dispatchers no se pisan), las publica por una
+sola conexión del pool de Celery y las marca dispatched_at en la misma
+transacción. Con tope de vuelo, el cupo se calcula y se consume bajo un
+advisory lock de la transacción, así el comando y el beat no lo superan
+entre los dos. Si el commit falla después de publicar, la tarea se publica de
+nuevo: es inofensivo porque launch_analysis_task solo reclama análisis
+PENDING. Las filas se borran cuando su análisis termina; si pasado
+ANALYSIS_FAIR_DISPATCH_TTL desde la publicación el análisis sigue PENDING
+(mensaje perdido o cola muy larga) vuelven a publicarse. requeue_stale() devuelve
+al outbox los análisis que quedaron RUNNING por un worker caído y
+requeue_stranded() los que se publicaron en la cola de afinidad de un nodo
+que ya no está vivo (nadie más consume esa cola).
+
+Lo corre `manage.py dispatch_outbox` (bucle con espera corta cuando no hay
+filas) y, como red de seguridad, dispatch_outbox_task desde Celery beat.
+"""
+
+import logging
+from datetime import timedelta
+from celery import current_app
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+from . import fair_scheduler, routing
+from .batching import stale_cutoff
+from .models import AnalysisOutbox, AnalysisResult
+from .notifications import notify_analyses
+
+logger = logging.getLogger(__name__)
+
+# Clave del advisory lock que serializa el cálculo del cupo en vuelo
+DISPATCH_LOCK_ID = 0x6f7574626f78  # 'outbox'
+
+
+def enqueue(analysis) -> AnalysisOutbox:
+    """Registra el análisis para publicarlo. Llamar dentro de la transacción que lo crea."""
+    return AnalysisOutbox.objects.create(
+        analysis=analysis,
+        owner_id=analysis.dataset.owner_id,
+        lane=fair_scheduler.lane_for(analysis),
+    )
+
+
+def release_finished(now=None) -> int:
+    """
+    Borra las filas de análisis terminados (las de análisis borrados se van
+    por CASCADE) y marca sin publicar las que vencieron con el análisis aún
+    PENDING, para que el dispatcher las publique de nuevo sin perderlas.
+    Devuelve cuántos cupos en vuelo se liberaron.
+    """
+    now = now or timezone.now()
+    ttl = timedelta(seconds=getattr(settings, 'ANALYSIS_FAIR_DISPATCH_TTL', 900))
+    deleted, _ = AnalysisOutbox.objects.filter(analysis__status__in=("SUCCESS", "FAILURE")).delete()
+    expired = AnalysisOutbox.objects.filter(
+        dispatched_at__lt=now - ttl, analysis__status="PENDING",
+    ).update(dispatched_at=None, queue='')
+    if expired:
+        logger.warning("Outbox: %s análisis siguen PENDING pasado el TTL y se vuelven a publicar", expired)
+    return deleted + expired
+
+
+def requeue_stale() -> int:
+    """
+    Análisis RUNNING sin cambios desde antes de stale_cutoff() (su worker
+    murió: p. ej. los seguidores de un micro-batch cuyo líder cayó): vuelven
+    a PENDING y se encolan de nuevo, liberando su cupo en vuelo. Los
+    fragmentados en shards los cierra su chord y no se tocan.
+    """
+    with transaction.atomic():
+        stale = list(
+            AnalysisResult.objects.select_for_update(skip_locked=True, of=("self",))
+            .filter(status="RUNNING", updated_at__lt=stale_cutoff(), shards__isnull=True)
+            .select_related("dataset")
+        )
+        if not stale:
+            return 0
+        now = timezone.now()
+        AnalysisResult.objects.filter(pk__in=[a.pk for a in stale]).update(status="PENDING", updated_at=now)
+        AnalysisOutbox.objects.filter(analysis__in=stale).delete()
+        for analysis in stale:
+            analysis.status = "PENDING"
+            analysis.updated_at = now
+            enqueue(analysis)
+    logger.warning("Outbox: %s análisis RUNNING colgados vuelven a PENDING: %s", len(stale), [a.pk for a in stale])
+    notify_analyses(stale, "PENDING")
+    return len(stale)
+
+
+def requeue_stranded() -> int:
+    """
+    Filas publicadas a una cola de afinidad que ya no tiene consumidor y
+    cuyo análisis sigue PENDING: se marcan sin publicar para que el
+    dispatcher las mande a una cola viva. Si el nodo vuelve, su copia del
+    mensaje no hace nada (claim_batch solo reclama PENDING).
+    """
+    live = set(routing.live_queues())
+    if not live:
+        # Sin respuesta de inspect no se puede distinguir un nodo muerto
+        return 0
+    rows = (
+        AnalysisOutbox.objects.filter(dispatched_at__isnull=False, analysis__status="PENDING")
+        .exclude(queue='')
+        .values_list('pk', 'queue')
+    )
+    stranded = [pk for pk, queue in rows if queue not in live]
+    if stranded:
+        AnalysisOutbox.objects.filter(pk__in=stranded).update(dispatched_at=None, queue='')
+        logger.warning("Outbox: %s análisis en colas de nodos caídos se vuelven a publicar", len(stranded))
+    return len(stranded)
+
+
+def lock_dispatch() -> None:
+    """
+    Toma el advisory lock de los dispatchers hasta el fin de la transacción.
+    Solo PostgreSQL lo necesita: SQLite ya serializa las transacciones de
+    escritura y es solo para desarrollo.
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", [DISPATCH_LOCK_ID])
+
+
+def free_slots(batch_size) -> int:
+    """Cupos que deja ANALYSIS_FAIR_MAX_IN_FLIGHT (0 = sin tope), hasta `batch_size`."""
+    max_in_flight = getattr(settings, 'ANALYSIS_FAIR_MAX_IN_FLIGHT', 0)
+    if not max_in_flight:
+        return batch_size
+    in_flight = AnalysisOutbox.objects.filter(dispatched_at__isnull=False).count()
+    return max(0, min(batch_size, max_in_flight - in_flight))
+
+
+def pending_demand() -> dict:
+    """{carril: {owner_id: pendientes}}, usuarios ordenados por su fila más antigua."""
+    rows = (
+        AnalysisOutbox.objects.filter(dispatched_at__isnull=True)
+        .values('lane', 'owner_id')
+        .annotate(n=Count('id'), head=Min('id'))
+        .order_by('head')
+    )
+    demand = {}
+    for row in rows:
+        demand.setdefault(row['lane'], {})[row['owner_id']] = row['n']
+    return demand
+
+
+def _claim(share) -> list:
+    """Bloquea las filas asignadas; devuelve la lista intercalada por usuario."""
+    groups = []
+    for (lane, owner_id), n in share.items():
+        groups.append(list(
+            AnalysisOutbox.objects.select_for_update(skip_locked=True, of=('self',))
+            .filter(dispatched_at__isnull=True, lane=lane, owner_id=owner_id)
+            .select_related('analysis__model__serving_variant')
+            .order_by('id')[:n]
+        ))
+    return fair_scheduler.interleave(groups)
+
+
+def dispatch_pending(batch_size=None) -> int:
+    """Publica un lote de filas pendientes. Devuelve cuántas se publicaron."""
+    from .tasks import launch_analysis_task
+
+    batch_size = batch_size or getattr(settings, 'ANALYSIS_OUTBOX_BATCH_SIZE', 100)
+    now = timezone.now()
+    release_finished(now)
+
+    with transaction.atomic():
+        if getattr(settings, 'ANALYSIS_FAIR_MAX_IN_FLIGHT', 0):
+            # El conteo en vuelo y el marcado de las filas, bajo el mismo lock
+            lock_dispatch()
+        budget = free_slots(batch_size)
+        if not budget:
+            return 0
+        demand = pending_demand()
+        if not demand:
+            return 0
+        owners = {owner for users in demand.values() for owner in users}
+        share = fair_scheduler.plan(demand, budget, fair_scheduler.user_weights(owners))
+        rows = _claim(share)
+        if not rows:
+            return 0
+
+        sent = {}
+        with current_app.producer_or_acquire() as producer:
+            for row in rows:
+                # model_id/framework en los kwargs: el router de afinidad no consulta la BD
+                mlmodel = row.analysis.model
+                routing_kwargs = {'model_id': mlmodel.pk, 'framework': mlmodel.runtime_framework}
+                queue = routing.route_for(mlmodel.pk, mlmodel.runtime_framework, row.analysis_id)
+                options = {'queue': queue} if queue else {}
+                try:
+                    launch_analysis_task.apply_async(
+                        (row.analysis_id,), routing_kwargs, producer=producer,
+                        priority=fair_scheduler.lane_priority(row.lane), **options,
+                    )
+                except Exception as exc:
+                    # Broker caído: se corta el lote y se reintenta en la próxima pasada
+                    logger.warning("No se pudo publicar AnalysisResult %s: %s", row.analysis_id, exc)
+                    row.attempts += 1
+                    row.last_error = str(exc)[:1000]
+                    row.save(update_fields=['attempts', 'last_error'])
+                    break
+                sent.setdefault(queue or '', []).append(row.pk)
+
+        for queue, pks in sent.items():
+            AnalysisOutbox.objects.filter(pk__in=pks).update(dispatched_at=now, queue=queue)
+    return sum(len(pks) for pks in sent.values())
+
+
+def drain(max_batches=None) -> int:
+    """Publica lotes hasta vaciar el outbox, agotar los cupos o llegar a `max_batches`."""
+    batch_size = getattr(settings, 'ANALYSIS_OUTBOX_BATCH_SIZE', 100)
+    total, batches = 0, 0
+    while max_batches is None or batches < max_batches:
+        sent = dispatch_pending(batch_size)
+        total += sent
+        batches += 1
+        if sent < batch_size:
+            break
+    return total
@@ -0,0 +1,162 @@
+# analysis/prediction_cache.py
+"""
+Cache de predicciones direccionada por contenido.
+
+La clave combina el id del MLModel, el sha256 del archivo del modelo
+(MLModel.runtime_sha256, guardado al subirlo; si falta se calcula y se
+memoiza) y un hash canónico del vector_2d. Si dos usuarios envían el mismo vector al
+mismo modelo, el segundo recibe el resultado sin pasar por el broker ni
+ejecutar predict. Cuando el archivo del modelo cambia, su hash cambia y las
+entradas viejas dejan de alcanzarse (expiran solas por TTL).
+
+El backend es el alias 'predictions' de CACHES (TTL y MAX_ENTRIES se
+configuran ahí); si no existe se usa la cache 'default'. Debe ser
+compartido: la vista busca en ella lo que guardaron los workers.
+
+Uso:
+    from analysis.prediction_cache import prediction_cache
+    predictions = prediction_cache.lookup(model_id, model_path, vector_2d, digest=mlmodel.runtime_sha256)
+    prediction_cache.store(model_id, model_path, vector_2d, predictions, digest=mlmodel.runtime_sha256)
+"""
+
+import os
+import json
+import hashlib
+import logging
+import threading
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+CACHE_ALIAS = 'predictions'
+
+
+def vector_hash(vector) -> str:
+    """
+    Hash canónico del vector_2d: los vectores numéricos se normalizan a
+    float64 (1 y 1.0 dan la misma clave); el resto se serializa como JSON.
+    """
+    try:
+        arr = np.asarray(vector, dtype='float64')
+        payload = repr(arr.shape).encode() + np.ascontiguousarray(arr).tobytes()
+    except (TypeError, ValueError):
+        payload = json.dumps(vector, sort_keys=True, separators=(',', ':')).encode()
+    return hashlib.sha256(payload).hexdigest()
+
+
+def file_sha256(path, block_size=1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def content_sha256(django_file) -> str:
+    """sha256 de un File/FieldFile de Django (p. ej. un upload aún sin guardar)."""
+    digest = hashlib.sha256()
+    for block in django_file.chunks():
+        digest.update(block)
+    return digest.hexdigest()
+
+
+class PredictionCache:
+    def __init__(self, alias: str = CACHE_ALIAS):
+        self.alias = alias
+        # (model_id, path, mtime_ns, size) -> sha256; evita re-hashear el archivo
+        self._file_hashes = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def backend(self):
+        alias = self.alias if self.alias in settings.CACHES else 'default'
+        return caches[alias]
+
+    @property
+    def enabled(self) -> bool:
+        return getattr(settings, 'ANALYSIS_PREDICTION_CACHE_ENABLED', True)
+
+    @property
+    def max_rows(self) -> int:
+        return int(getattr(settings, 'ANALYSIS_PREDICTION_CACHE_MAX_ROWS', 1000))
+
+    def model_hash(self, model_id, model_path) -> str:
+        """
+        sha256 del archivo del modelo. Se memoiza por (mtime, tamaño) en el
+        proceso y se comparte por la cache para que solo un proceso lo calcule.
+        """
+        st = os.stat(model_path)
+        stat_key = (model_id, model_path, st.st_mtime_ns, st.st_size)
+        digest = self._file_hashes.get(stat_key)
+        if digest is not None:
+            return digest
+
+        shared_key = f"pred:filehash:{model_id}:{st.st_mtime_ns}:{st.st_size}"
+        digest = self.backend.get(shared_key)
+        if digest is None:
+            digest = file_sha256(model_path)
+            self.backend.set(shared_key, digest, timeout=None)
+        with self._lock:
+            # Solo se conserva el hash vigente de cada modelo
+            for key in [k for k in self._file_hashes if k[0] == model_id]:
+                del self._file_hashes[key]
+            self._file_hashes[stat_key] = digest
+        return digest
+
+    def make_key(self, model_id, model_path, vector, digest=None) -> str:
+        """`digest`: sha256 ya conocido del archivo (evita leerlo)."""
+        digest = digest or self.model_hash(model_id, model_path)
+        return f"pred:{model_id}:{digest}:{vector_hash(vector)}"
+
+    def lookup(self, model_id, model_path, vector, digest=None):
+        """Devuelve la lista de predicciones cacheada o None."""
+        if not self.enabled or not isinstance(vector, list) or len(vector) > self.max_rows:
+            return None
+        try:
+            predictions = self.backend.get(self.make_key(model_id, model_path, vector, digest))
+        except OSError:
+            return None
+        except Exception:
+            # Un backend caído no debe impedir la inferencia normal
+            logger.exception("Error leyendo la cache de predicciones de MLModel %s", model_id)
+            return None
+        with self._lock:
+            if predictions is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return predictions
+
+    def store(self, model_id, model_path, vector, predictions, digest=None) -> None:
+        """Guarda las predicciones si el resultado es pequeño (<= max_rows)."""
+        if not self.enabled or not isinstance(vector, list) or len(predictions) > self.max_rows:
+            return
+        if isinstance(predictions, np.ndarray):
+            predictions = predictions.tolist()
+        try:
+            self.backend.set(self.make_key(model_id, model_path, vector, digest), list(predictions))
+        except Exception:
+            logger.exception("Error guardando en la cache de predicciones de MLModel %s", model_id)
+
+    def invalidate(self, model_id) -> None:
+        """Olvida el hash de archivo memoizado; las entradas viejas expiran por TTL."""
+        with self._lock:
+            for key in [k for k in self._file_hashes if k[0] == model_id]:
+                del self._file_hashes[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else None,
+            }
+
+
+# Instancia única por proceso
+prediction_cache = PredictionCache()
@@ -13,6 +13,7 @@ from reportlab.lib.styles import getSampleStyleSheet
 from django.db.models import Count, Avg, F, ExpressionWrapper, DurationField, Q
 from django.db.models import Count, Avg, Min, Max, F, DurationField, ExpressionWrapper
 from .models import AnalysisResult
+from .timing import STAGES
 
 class SimpleReportGenerator:
     def __init__(self, queryset=None):
@@ -58,6 +59,28 @@ class SimpleReportGenerator:
             stats.append(row)
         return stats
 
+    def _stage_stats(self):
+        """
+        Promedio en ms de cada etapa (metrics['timings']) por modelo-versión,
+        para ver si la latencia se va en la cola, la carga o el predict.
+        Retorna lista de dicts: {'label', 'count', '<etapa>_ms'...}
+        """
+        acc = {}
+        rows = self.qs.filter(status='SUCCESS').values_list('model__name', 'model__version', 'metrics')
+        for name, version, metrics in rows:
+            timings = (metrics or {}).get('timings') if isinstance(metrics, dict) else None
+            if not timings:
+                continue  # análisis anteriores al desglose
+            entry = acc.setdefault(f"{name} v{version}", {'count': 0, **{s: 0.0 for s in STAGES}})
+            entry['count'] += 1
+            for stage in STAGES:
+                entry[stage] += timings.get(f"{stage}_ms", 0.0)
+        return [
+            {'label': label, 'count': e['count'],
+             **{f"{s}_ms": round(e[s] / e['count'], 1) for s in STAGES}}
+            for label, e in sorted(acc.items(), key=lambda kv: -kv[1]['count'])
+        ]
+
     def _user_stats(self):
         qs = self.qs.values('dataset__owner__username').annotate(
             count=Count('id')
@@ -349,10 +372,17 @@ class SimpleReportGenerator:
         elems.append(Image(self._build_model_user_pie(mu_stats), width=300, height=300))
         elems.append(Spacer(1,24))
 
-        # Sección 3: Heatmap Horario
-        elems.append(Paragraph("4. Heatmap Horario de Ejecución", styles['Heading2']))
+        # 6. Heatmap Horario
+        elems.append(Paragraph("6. Heatmap Horario de Ejecución", styles['Heading2']))
         elems.append(Image(self._hourly_heatmap(), width=500, height=300))
 
+        # 7. Desglose de latencia por etapa
+        elems.append(Paragraph("7. Latencia promedio por etapa (ms)", styles['Heading2']))
+        table_data = [['Modelo-Version', 'Análisis', 'Cola', 'Dataset', 'Modelo', 'Predict', 'Escritura']]
+        for r in self._stage_stats():
+            table_data.append([r['label'], r['count']] + [r[f"{s}_ms"] for s in STAGES])
+        elems.append(Table(table_data, hAlign='LEFT'))
+
         doc.build(elems)
         return buffer.getvalue()
 
@@ -0,0 +1,266 @@
+# analysis/result_store.py
+"""
+Lectura y escritura de archivos de predicciones.
+
+Formato por defecto (ANALYSIS_RESULT_FORMAT = 'npy'): arreglo NumPy .npy,
+que los lectores abren con mmap y cortan sin parsear todo el archivo. Las
+predicciones no numéricas (etiquetas de texto) y ANALYSIS_RESULT_FORMAT =
+'json' usan un arreglo JSON, igual que antes. JSON sigue disponible como
+formato de exportación en el endpoint de descarga (ver iter_json_chunks).
+
+Las rutas se manejan sin extensión ("base"); el writer añade .npy o .json
+según el formato elegido y expone la ruta final en `out_path`.
+"""
+
+import os
+import json
+import shutil
+import numpy as np
+from django.conf import settings
+
+NUMERIC_KINDS = 'biuf'
+
+
+def result_format() -> str:
+    return getattr(settings, 'ANALYSIS_RESULT_FORMAT', 'npy')
+
+
+class JsonArrayWriter:
+    """
+    Escribe un arreglo JSON de forma incremental: cada append() agrega los
+    elementos de una lista sin mantener todo el resultado en memoria.
+    """
+
+    def __init__(self, out_path):
+        self.out_path = out_path
+        self.count = 0
+        self._fp = None
+
+    def __enter__(self):
+        self._fp = open(self.out_path, 'w')
+        self._fp.write('[')
+        return self
+
+    def append(self, items):
+        if len(items) == 0:
+            return
+        if isinstance(items, np.ndarray):
+            items = items.tolist()
+        if self.count:
+            self._fp.write(',')
+        self._fp.write(json.dumps(list(items))[1:-1])
+        self.count += len(items)
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self._fp.write(']')
+        self._fp.close()
+        return False
+
+
+class NpyWriter:
+    """
+    Escribe un .npy de forma incremental. Los chunks se vuelcan crudos a un
+    archivo temporal y al cerrar se antepone la cabecera con la forma final
+    (el número total de filas no se conoce hasta el último chunk).
+    """
+
+    def __init__(self, base_path):
+        self.out_path = base_path + '.npy'
+        self._tmp_path = base_path + '.npy.tmp'
+        self.count = 0
+        self.dtype = None
+        self.tail_shape = None
+        self._fp = None
+
+    def __enter__(self):
+        self._fp = open(self._tmp_path, 'wb')
+        return self
+
+    def append(self, items):
+        arr = np.asarray(items)
+        if len(arr) == 0:
+            return
+        if self.dtype is None:
+            self.dtype, self.tail_shape = arr.dtype, arr.shape[1:]
+        elif arr.shape[1:] != self.tail_shape or not np.can_cast(arr.dtype, self.dtype, 'same_kind'):
+            raise ValueError(
+                f"Chunk de predicciones incompatible: {arr.dtype}{arr.shape[1:]} vs {self.dtype}{self.tail_shape}"
+            )
+        self._fp.write(np.ascontiguousarray(arr, dtype=self.dtype).tobytes())
+        self.count += len(arr)
+
+    def __exit__(self, exc_type, exc, tb):
+        self._fp.close()
+        try:
+            if exc_type is None:
+                self._finalize()
+        finally:
+            if os.path.exists(self._tmp_path):
+                os.remove(self._tmp_path)
+        return False
+
+    def _finalize(self):
+        dtype = self.dtype if self.dtype is not None else np.dtype('float64')
+        header = {
+            'descr': np.lib.format.dtype_to_descr(dtype),
+            'fortran_order': False,
+            'shape': (self.count,) + tuple(self.tail_shape or ()),
+        }
+        with open(self.out_path, 'wb') as out, open(self._tmp_path, 'rb') as raw:
+            np.lib.format.write_array_header_1_0(out, header)
+            shutil.copyfileobj(raw, out, 1024 * 1024)
+
+
+class PredictionWriter:
+    """
+    Writer incremental que decide el formato con el primer chunk:
+    .npy si el formato configurado es 'npy' y las predicciones son numéricas,
+    .json en cualquier otro caso.
+    """
+
+    def __init__(self, base_path, fmt=None):
+        self.base_path = base_path
+        self.fmt = fmt or result_format()
+        self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def _open(self, sample):
+        numeric = np.asarray(sample).dtype.kind in NUMERIC_KINDS
+        if self.fmt == 'npy' and numeric:
+            self._writer = NpyWriter(self.base_path)
+        else:
+            self._writer = JsonArrayWriter(self.base_path + '.json')
+        self._writer.__enter__()
+
+    def append(self, items):
+        if len(items) == 0:
+            return
+        if self._writer is None:
+            self._open(items)
+        self._writer.append(items)
+
+    @property
+    def count(self) -> int:
+        return self._writer.count if self._writer else 0
+
+    @property
+    def out_path(self) -> str:
+        return self._writer.out_path
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._writer is None:
+            if exc_type is not None:
+                return False
+            # Sin filas: se deja un resultado vacío en el formato configurado
+            self._open(np.empty(0, dtype='float64'))
+        return self._writer.__exit__(exc_type, exc, tb)
+
+
+def write_predictions(predictions, base_path, fmt=None) -> str:
+    """Escribe todas las predicciones de una vez y devuelve la ruta final."""
+    with PredictionWriter(base_path, fmt) as writer:
+        writer.append(predictions)
+    return writer.out_path
+
+
+def _open_npy(path):
+    return np.load(path, mmap_mode='r', allow_pickle=False)
+
+
+def count_predictions(path) -> int:
+    if path.endswith('.npy'):
+        return int(_open_npy(path).shape[0])
+    with open(path) as f:
+        return len(json.load(f))
+
+
+def read_predictions(path, start=0, stop=None) -> list:
+    """
+    Devuelve las predicciones [start:stop] como lista de Python. Para .npy
+    solo se leen del disco las filas pedidas.
+    """
+    if path.endswith('.npy'):
+        return _open_npy(path)[start:stop].tolist()
+    with open(path) as f:
+        return json.load(f)[start:stop]
+
+
+def read_page(path, start=0, stop=None) -> tuple:
+    """
+    (predicciones [start:stop], total de filas) abriendo el archivo una sola
+    vez: el .npy por mmap, el JSON con un único parseo.
+    """
+    if path.endswith('.npy'):
+        arr = _open_npy(path)
+        return arr[start:stop].tolist(), int(arr.shape[0])
+    with open(path) as f:
+        data = json.load(f)
+    return data[start:stop], len(data)
+
+
+def iter_json_chunks(path, chunk_rows=50000):
+    """Genera el resultado como texto JSON por partes (para StreamingHttpResponse)."""
+    if not path.endswith('.npy'):
+        with open(path) as f:
+            for block in iter(lambda: f.read(1024 * 1024), ''):
+                yield block
+        return
+    arr = _open_npy(path)
+    yield '['
+    for start in range(0, len(arr), chunk_rows):
+        body = json.dumps(arr[start:start + chunk_rows].tolist())[1:-1]
+        yield (',' if start else '') + body
+    yield ']'
+
+
+def _npy_data_offset(fp):
+    """Posiciona fp al inicio de los datos y devuelve (dtype, shape)."""
+    version = np.lib.format.read_magic(fp)
+    if version == (1, 0):
+        shape, _, dtype = np.lib.format.read_array_header_1_0(fp)
+    else:
+        shape, _, dtype = np.lib.format.read_array_header_2_0(fp)
+    return dtype, shape
+
+
+def merge_parts(part_paths, base_path) -> str:
+    """
+    Concatena resultados parciales (en orden) en un único archivo y borra
+    los parciales. Si todos son .npy compatibles se copian los bytes crudos;
+    si no, se reescriben como JSON un parcial a la vez.
+    """
+    headers = []
+    if part_paths and all(p.endswith('.npy') for p in part_paths):
+        for path in part_paths:
+            with open(path, 'rb') as fp:
+                headers.append(_npy_data_offset(fp))
+
+    # Los parciales vacíos no cuentan para decidir el dtype común
+    nonempty = [h for h in headers if h[1][0]] or headers
+    if headers and len({(h[0], h[1][1:]) for h in nonempty}) == 1:
+        dtype, shape = nonempty[0]
+        total = sum(h[1][0] for h in headers)
+        out_path = base_path + '.npy'
+        header = {
+            'descr': np.lib.format.dtype_to_descr(dtype),
+            'fortran_order': False,
+            'shape': (total,) + tuple(shape[1:]),
+        }
+        with open(out_path, 'wb') as out:
+            np.lib.format.write_array_header_1_0(out, header)
+            for path in part_paths:
+                with open(path, 'rb') as fp:
+                    _npy_data_offset(fp)
+                    shutil.copyfileobj(fp, out, 1024 * 1024)
+    else:
+        with PredictionWriter(base_path, fmt='json') as writer:
+            for path in part_paths:
+                writer.append(read_predictions(path))
+        out_path = writer.out_path
+
+    for path in part_paths:
+        os.remove(path)
+    return out_path
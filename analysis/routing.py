@@ -0,0 +1,145 @@
+# analysis/routing.py
+"""
+Ruteo por afinidad de modelo para launch_analysis_task.
+
+Cada nodo worker consume, además de la cola por defecto, una cola propia
+`<ANALYSIS_AFFINITY_QUEUE_PREFIX><hostname>` que se declara sola al arrancar
+(celeryd_after_setup). Al encolar un análisis, AffinityRouter elige la cola
+con rendezvous hashing (highest random weight) entre las colas vivas: un
+mismo MLModel (o framework) cae siempre en el mismo nodo, que lo mantiene
+caliente en su cache, y cada nodo solo carga su parte de los modelos.
+
+Cuando un nodo entra o sale solo se remapean los modelos que le tocaban a
+ese nodo. La lista de colas vivas se obtiene con `inspect().active_queues()`
+y se guarda ANALYSIS_AFFINITY_REFRESH_SECONDS en la cache compartida
+ANALYSIS_AFFINITY_CACHE, así hay un solo broadcast por intervalo para todos
+los procesos. Sin colas vivas (o con la afinidad desactivada) la tarea va a
+la cola por defecto.
+
+La clave es el MLModel o el framework con el que se ejecuta
+(runtime_framework: el de la variante activa). El dispatcher del outbox
+elige la cola con route_for() y pasa model_id/framework en los kwargs de la
+tarea, así AffinityRouter (reintentos) decide sin consultar la BD. Los
+mensajes que quedaron en la cola de un nodo que murió los vuelve a publicar
+outbox.requeue_stranded().
+
+    CELERY_TASK_ROUTES = ['analysis.routing.AffinityRouter']
+"""
+
+import hashlib
+import logging
+from celery import current_app
+from celery.signals import celeryd_after_setup
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+ROUTED_TASK = 'analysis.tasks.launch_analysis_task'
+LIVE_QUEUES_KEY = 'routing:affinity_queues'
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def affinity_cache():
+    alias = _setting('ANALYSIS_AFFINITY_CACHE', 'shared')
+    return caches[alias if alias in settings.CACHES else 'default']
+
+
+def queue_prefix() -> str:
+    return _setting('ANALYSIS_AFFINITY_QUEUE_PREFIX', 'analysis.')
+
+
+def worker_queue(hostname) -> str:
+    return f"{queue_prefix()}{hostname}"
+
+
+def _weight(key, queue) -> int:
+    digest = hashlib.blake2b(f"{key}|{queue}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+def rank_queues(key, queues) -> list:
+    """Colas ordenadas por peso rendezvous para `key` (la primera es la preferida)."""
+    return sorted(queues, key=lambda q: _weight(key, q), reverse=True)
+
+
+def live_queues(refresh=False) -> list:
+    """Colas de afinidad consumidas por algún worker vivo (cacheadas)."""
+    cache = affinity_cache()
+    queues = None if refresh else cache.get(LIVE_QUEUES_KEY)
+    if queues is not None:
+        return queues
+    prefix = queue_prefix()
+    try:
+        replies = current_app.control.inspect(
+            timeout=_setting('ANALYSIS_AFFINITY_INSPECT_TIMEOUT', 0.5)
+        ).active_queues() or {}
+        queues = sorted({
+            q['name'] for worker_queues in replies.values() for q in worker_queues
+            if q.get('name', '').startswith(prefix)
+        })
+    except Exception as exc:
+        logger.warning("No se pudieron listar las colas de afinidad: %s", exc)
+        queues = []
+    previous = cache.get(LIVE_QUEUES_KEY + ':last')
+    if previous is not None and previous != queues:
+        logger.info("Colas de afinidad cambiaron: %s -> %s", previous, queues)
+    cache.set(LIVE_QUEUES_KEY, queues, timeout=_setting('ANALYSIS_AFFINITY_REFRESH_SECONDS', 30))
+    cache.set(LIVE_QUEUES_KEY + ':last', queues, timeout=None)
+    return queues
+
+
+def affinity_key(model_id, framework) -> str:
+    if _setting('ANALYSIS_AFFINITY_KEY', 'model') == 'framework':
+        return f"framework:{framework}"
+    return f"model:{model_id}"
+
+
+def pick_queue(model_id, framework, spread=0, queues=None):
+    """
+    Cola para el modelo: una de las ANALYSIS_AFFINITY_REPLICAS mejor
+    rankeadas, elegida por `spread` (p. ej. el id del análisis).
+    """
+    queues = live_queues() if queues is None else queues
+    if not queues:
+        return None
+    replicas = max(1, _setting('ANALYSIS_AFFINITY_REPLICAS', 1))
+    ranked = rank_queues(affinity_key(model_id, framework), queues)[:replicas]
+    return ranked[spread % len(ranked)]
+
+
+def route_for(model_id, framework, analysis_id):
+    """Cola de afinidad del análisis, o None (afinidad desactivada o sin colas vivas)."""
+    if not _setting('ANALYSIS_AFFINITY_ENABLED', False):
+        return None
+    return pick_queue(model_id, framework, spread=int(analysis_id))
+
+
+class AffinityRouter:
+    """
+    Router de Celery: solo decide para launch_analysis_task y solo con los
+    kwargs model_id/framework que pone el dispatcher (no consulta la BD).
+    """
+
+    def __call__(self, name, args, kwargs, options, task=None, **kw):
+        if name != ROUTED_TASK:
+            return None
+        kwargs = kwargs or {}
+        analysis_id = args[0] if args else kwargs.get('analysis_id')
+        if analysis_id is None or kwargs.get('model_id') is None:
+            return None
+        queue = route_for(kwargs['model_id'], kwargs.get('framework'), analysis_id)
+        return {'queue': queue} if queue else None
+
+
+@celeryd_after_setup.connect
+def declare_worker_queue(sender, instance, **kwargs):
+    """Cada nodo worker consume su propia cola de afinidad."""
+    if not _setting('ANALYSIS_AFFINITY_ENABLED', False):
+        return
+    queue = worker_queue(sender)
+    instance.app.amqp.queues.select_add(queue)
+    logger.info("Worker %s consume la cola de afinidad %s", sender, queue)
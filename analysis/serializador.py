@@ -37,11 +37,17 @@ class LaunchAnalysisSerializer(serializers.ModelSerializer):
     model = serializers.PrimaryKeyRelatedField(
         queryset=MLModel.objects.all()
     )
+    # 'vector': puntúa la fila escrita a mano; 'dataset': puntúa todo el CSV
+    mode = serializers.ChoiceField(
+        choices=[('vector', 'Vector único'), ('dataset', 'Dataset completo')],
+        default='vector',
+        write_only=True,
+    )
 
     class Meta:
         model  = AnalysisResult
         # Sólo los campos del modelo; los param_i se inyectan dinámicamente
-        fields = ('dataset', 'model')
+        fields = ('dataset', 'model', 'mode')
 
     def get_fields(self):
         """
@@ -67,10 +73,12 @@ class LaunchAnalysisSerializer(serializers.ModelSerializer):
             except MLModel.DoesNotExist:
                 mlm = None
 
+            # En modo dataset las features salen del CSV, no de los param_i
+            dataset_mode = getattr(self, 'initial_data', {}).get('mode') == 'dataset'
             if mlm:
                 for hp in mlm.hyperparams.all().order_by('position'):
                     fields[f'param_{hp.position}'] = serializers.CharField(
-                        required=hp.required,
+                        required=hp.required and not dataset_mode,
                         help_text=hp.help_text or hp.key_hint,
                         label=f"{hp.position}. {hp.key_hint}"
                     )
@@ -83,16 +91,25 @@ class LaunchAnalysisSerializer(serializers.ModelSerializer):
         """
         return super().to_internal_value(data)
 
-    def create(self, validated_data):
+    def _parse_params(self, validated_data):
         """
         1. Saca de validated_data todos los param_i.
         2. Parsealos según su dtype.
-        3. Construye parameters={'raw':..., 'vector_2d':[...]}
-        4. Crea el AnalysisResult sin los param_i.
+        3. Devuelve parameters={'vector_2d':[...]}, o
+           {'mode': 'dataset', 'feature_columns': [...]} en modo dataset.
         """
         mlm = validated_data['model']
         defs = list(mlm.hyperparams.all().order_by('position'))
 
+        if validated_data.pop('mode', 'vector') == 'dataset':
+            # Se descartan los param_i; el orden de columnas sale de los key_hint
+            for hp in defs:
+                validated_data.pop(f'param_{hp.position}', None)
+            return {
+                "mode": "dataset",
+                "feature_columns": [hp.key_hint for hp in defs],
+            }
+
         raw_inputs = {}
         parsed_row = []
 
@@ -126,12 +143,33 @@ class LaunchAnalysisSerializer(serializers.ModelSerializer):
             parsed_row.append(val)
 
         # 2) Montar el campo 'parameters'
-        parameters = {
+        return {
             "vector_2d": [parsed_row],
         }
 
-        # 3) Quitar status si lo definiste en serializer.save()
-        status = validated_data.pop('status', 'PENDING')
+    def parsed_parameters(self):
+        """
+        Devuelve los parameters que create() guardaría, sin crear nada.
+        Requiere haber llamado is_valid().
+        """
+        return self._parse_params(dict(self.validated_data))
+
+    def create(self, validated_data):
+        """
+        1. Construye parameters a partir de los param_i.
+        2. Crea el AnalysisResult sin los param_i (status, metrics, output_path
+           y completed_at se respetan si vienen en serializer.save()).
+        3. Crea el vínculo UserAnalysis en la misma transacción.
+        """
+        parameters = self._parse_params(validated_data)
+
+        # 3) Campos de estado opcionales definidos en serializer.save()
+        extra = {
+            field: validated_data.pop(field)
+            for field in ('status', 'metrics', 'output_path', 'completed_at')
+            if field in validated_data
+        }
+        extra.setdefault('status', 'PENDING')
 
         # 4) Crear el registro sin param_i
         user = self.context['request'].user
@@ -142,7 +180,7 @@ class LaunchAnalysisSerializer(serializers.ModelSerializer):
                 dataset=validated_data['dataset'],
                 model=validated_data['model'],
                 parameters=parameters,
-                status='PENDING'
+                **extra
             )
             
             # Here's the key addition: creating the UserAnalysis link
@@ -0,0 +1,57 @@
+# analysis/sharding.py
+"""
+Puntuación paralela de datasets grandes por shards.
+
+El CSV se divide en rangos de bytes alineados a saltos de línea (sin
+parsearlo). Cada rango se puntúa en una tarea Celery distinta y al final
+un callback de chord concatena los archivos parciales en el orden de los
+shards, de modo que el resultado es idéntico al de una sola tarea.
+"""
+
+import io
+import os
+from django.conf import settings
+
+
+def should_shard(dataset_path) -> bool:
+    """True si el archivo supera ANALYSIS_SHARD_MIN_BYTES."""
+    return os.path.getsize(dataset_path) >= getattr(settings, 'ANALYSIS_SHARD_MIN_BYTES', 64 * 1024 ** 2)
+
+
+def plan_shards(dataset_path, shard_bytes=None):
+    """
+    Devuelve [(start_byte, end_byte), ...] cubriendo todas las filas de
+    datos. El primer shard empieza después de la cabecera y cada corte se
+    mueve hasta el siguiente salto de línea.
+    """
+    shard_bytes = shard_bytes or getattr(settings, 'ANALYSIS_SHARD_BYTES', 32 * 1024 ** 2)
+    size = os.path.getsize(dataset_path)
+    ranges = []
+    with open(dataset_path, 'rb') as f:
+        f.readline()  # cabecera
+        start = f.tell()
+        while start < size:
+            f.seek(min(start + shard_bytes, size))
+            if f.tell() < size:
+                f.readline()  # avanzar hasta fin de línea
+            end = f.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def read_header(dataset_path) -> bytes:
+    with open(dataset_path, 'rb') as f:
+        return f.readline()
+
+
+def open_shard(dataset_path, start_byte, end_byte):
+    """
+    File-like con la cabecera del CSV seguida de las filas del rango.
+    Solo se mantiene en memoria el rango del shard, no el archivo completo.
+    """
+    with open(dataset_path, 'rb') as f:
+        header = f.readline()
+        f.seek(start_byte)
+        body = f.read(end_byte - start_byte)
+    return io.BytesIO(header + body)
@@ -0,0 +1,71 @@
+# analysis/signals.py
+"""
+Señales del servicio de análisis.
+
+Cuando un admin sube un archivo nuevo para un MLModel (o lo borra) se
+descarta el modelo residente en la cache de este proceso. Los demás
+procesos lo detectan solos porque la clave de la cache incluye mtime y
+tamaño del archivo. La cache de predicciones se indexa por el sha256 del
+archivo, así que un archivo nuevo nunca reutiliza predicciones viejas; el
+hash se calcula aquí, una vez al subirlo, y queda en MLModel.file_sha256.
+
+Un archivo nuevo también desactiva la variante ONNX en uso (se generó a
+partir del archivo anterior) y, si el modelo tiene auto_optimize, encola
+la conversión en segundo plano.
+"""
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .models import MLModel
+from .model_cache import model_cache
+from .prediction_cache import prediction_cache, content_sha256
+
+
+@receiver(pre_save, sender=MLModel)
+def detect_new_model_file(sender, instance, **kwargs):
+    previous = None
+    if instance.pk is not None:
+        previous = MLModel.objects.filter(pk=instance.pk).values('file', 'auto_optimize').first()
+    # En pre_save el FieldFile todavía tiene el nombre del upload si cambió
+    instance._file_changed = previous is None or previous['file'] != instance.file.name
+    instance._optimize_enabled = previous is not None and not previous['auto_optimize'] and instance.auto_optimize
+    if instance._file_changed:
+        instance.serving_variant = None
+        instance.file_sha256 = _file_hash(instance.file)
+
+
+def _file_hash(field_file) -> str:
+    """sha256 del archivo nuevo; '' si no se puede leer (se calculará al usarlo)."""
+    if not field_file:
+        return ''
+    # Un archivo ya guardado se abre para leerlo y se vuelve a cerrar; un upload queda abierto
+    was_closed = field_file.closed
+    try:
+        return content_sha256(field_file)
+    except (OSError, ValueError):
+        return ''
+    finally:
+        if was_closed:
+            field_file.close()
+
+
+@receiver(post_save, sender=MLModel)
+def invalidate_model_on_save(sender, instance, **kwargs):
+    model_cache.invalidate(instance.pk)
+    prediction_cache.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=MLModel)
+def schedule_model_conversion(sender, instance, **kwargs):
+    from .variants import CONVERTIBLE_FRAMEWORKS
+    if not instance.auto_optimize or instance.framework not in CONVERTIBLE_FRAMEWORKS:
+        return
+    if getattr(instance, '_file_changed', False) or getattr(instance, '_optimize_enabled', False):
+        from .tasks import convert_model_task
+        transaction.on_commit(lambda: convert_model_task.delay(instance.pk))
+
+
+@receiver(post_delete, sender=MLModel)
+def invalidate_model_on_delete(sender, instance, **kwargs):
+    model_cache.invalidate(instance.pk)
+    prediction_cache.invalidate(instance.pk)
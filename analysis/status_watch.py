@@ -0,0 +1,196 @@
+# analysis/status_watch.py
+"""
+Long-poll y Server-Sent Events sobre el estado de AnalysisResult y
+PreprocessingJob, para clientes que no pueden mantener un WebSocket.
+
+    GET /api/v1/analysis/<pk>/status/?since=RUNNING&timeout=25
+        -> {"changed": true, "message": {...}}
+           (changed=false con el estado actual si vence el timeout)
+    GET /api/v1/preprocessing-jobs/<pk>/status/  (mismos parámetros)
+    Con 'Accept: text/event-stream' la respuesta es SSE: un evento con el
+    estado actual y uno por transición (incluido el progreso) hasta
+    SUCCESS/FAILURE o ANALYSIS_STATUS_STREAM_SECONDS.
+
+Sin `since` se responde de inmediato con el estado actual. Los mensajes son
+los mismos que recibe el WebSocket (ver analysis/notifications.py).
+
+La BD se consulta una sola vez por petición (dueño y estado, por pk). La
+espera es sobre el grupo status_<tipo>_<pk> del channel layer, en el que
+record_status() publica cada transición: un cliente esperando es una
+coroutine dormida, no una consulta. Nos suscribimos antes de leer la BD, así
+que una transición entre la lectura y la espera no se pierde. Sin channel
+layer la señal es la clave status:<tipo>:<pk> de ANALYSIS_STATUS_CACHE, que
+se revisa cada ANALYSIS_STATUS_POLL_SECONDS.
+
+Son vistas async: bajo ASGI no ocupan un hilo mientras esperan.
+"""
+
+import json
+import asyncio
+import logging
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .notifications import get_channel_layer, status_cache, status_group, status_key
+
+logger = logging.getLogger(__name__)
+
+TERMINAL = {"SUCCESS", "FAILURE", "FAILED"}
+
+# Comentario SSE para que proxies y balanceadores no corten la conexión
+KEEPALIVE_SECONDS = 15
+
+
+class StatusWaiter:
+    """Suscripción a las transiciones de un objeto mientras dura la petición."""
+
+    def __init__(self, kind, pk):
+        self.kind = kind
+        self.pk = pk
+        self.layer = None
+        self.channel = None
+        self._seen = None
+
+    async def subscribe(self) -> None:
+        try:
+            self.layer = get_channel_layer() if get_channel_layer else None
+            if self.layer is not None:
+                self.channel = await self.layer.new_channel()
+                await self.layer.group_add(status_group(self.kind, self.pk), self.channel)
+                return
+        except Exception as exc:
+            logger.warning("Channel layer no disponible, se usa la cache: %s", exc)
+            self.channel = None
+        self._seen = await self._latest()
+
+    async def close(self) -> None:
+        if self.channel is None:
+            return
+        try:
+            await self.layer.group_discard(status_group(self.kind, self.pk), self.channel)
+        except Exception:
+            pass
+        self.channel = None
+
+    async def _latest(self):
+        entry = await status_cache().aget(status_key(self.kind, self.pk))
+        return entry["message"] if entry else None
+
+    async def next(self, timeout):
+        """Siguiente mensaje publicado, o None si vence `timeout`."""
+        if self.channel is not None:
+            try:
+                event = await asyncio.wait_for(self.layer.receive(self.channel), timeout)
+            except asyncio.TimeoutError:
+                return None
+            return event.get("message")
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        poll = getattr(settings, "ANALYSIS_STATUS_POLL_SECONDS", 1.0)
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return None
+            await asyncio.sleep(min(poll, remaining))
+            latest = await self._latest()
+            if latest is not None and latest != self._seen:
+                self._seen = latest
+                return latest
+
+
+async def request_user(request):
+    """Usuario de la sesión o del header 'Authorization: Bearer <JWT>'; None si no hay."""
+    jwt = JWTAuthentication()
+    if jwt.get_header(request) is not None:
+        try:
+            result = await sync_to_async(jwt.authenticate)(request)
+        except AuthenticationFailed:
+            return None
+        return result[0] if result else None
+    user = await request.auser()
+    return user if user.is_authenticated else None
+
+
+def _timeout(request) -> float:
+    limit = getattr(settings, "ANALYSIS_STATUS_MAX_TIMEOUT", 60)
+    try:
+        value = float(request.GET.get("timeout", getattr(settings, "ANALYSIS_STATUS_TIMEOUT", 25)))
+    except ValueError:
+        value = getattr(settings, "ANALYSIS_STATUS_TIMEOUT", 25)
+    return min(max(value, 0.0), limit)
+
+
+async def long_poll(waiter, current, since, timeout):
+    """Espera hasta que el estado deje de ser `since`. Devuelve (changed, mensaje)."""
+    if since is None or current["status"] != since:
+        return True, current
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while (remaining := deadline - loop.time()) > 0:
+        message = await waiter.next(remaining)
+        if message is None:
+            break
+        current = message
+        if message["status"] != since:
+            return True, message
+    return False, current
+
+
+def _sse(message) -> str:
+    return f"data: {json.dumps(message, default=str)}\n\n"
+
+
+async def event_stream(waiter, current, duration):
+    try:
+        yield _sse(current)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + duration
+        while current["status"] not in TERMINAL:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            message = await waiter.next(min(KEEPALIVE_SECONDS, remaining))
+            if message is None:
+                yield ": keepalive\n\n"
+                continue
+            current = message
+            yield _sse(message)
+    finally:
+        await waiter.close()
+
+
+async def status_response(request, kind, pk, snapshot):
+    """
+    Atiende la petición de long-poll/SSE. `snapshot(user, pk)` es síncrona:
+    devuelve el mensaje con el estado actual, o None si el objeto no existe
+    o no es del usuario.
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+    user = await request_user(request)
+    if user is None:
+        return JsonResponse({"detail": "Las credenciales de autenticación no se proveyeron."}, status=401)
+
+    waiter = StatusWaiter(kind, pk)
+    await waiter.subscribe()
+    current = await sync_to_async(snapshot)(user, pk)
+    if current is None:
+        await waiter.close()
+        return JsonResponse({"detail": "No encontrado."}, status=404)
+
+    if "text/event-stream" in request.headers.get("Accept", ""):
+        duration = getattr(settings, "ANALYSIS_STATUS_STREAM_SECONDS", 300)
+        response = StreamingHttpResponse(event_stream(waiter, current, duration), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    try:
+        changed, message = await long_poll(waiter, current, request.GET.get("since"), _timeout(request))
+    finally:
+        await waiter.close()
+    return JsonResponse({"changed": changed, "message": message})
@@ -0,0 +1,174 @@
+# analysis/sync_inference.py
+"""
+Inferencia síncrona de baja latencia para payloads pequeños.
+
+AnalysisViewSet.create la usa cuando el cliente la pide (?sync=1). Solo
+corre si el modelo ya está residente en la cache de este proceso y el
+predict termina dentro de ANALYSIS_SYNC_BUDGET_MS; en cualquier otro caso
+devuelve None y la vista cae al camino normal por Celery. Un modelo frío se
+carga en segundo plano para que la siguiente petición sí sea síncrona.
+
+Un predict que excede el presupuesto sigue corriendo en su hilo hasta
+terminar. Por eso los predict tienen ANALYSIS_SYNC_THREADS cupos
+(semáforo no bloqueante): sin cupo libre la petición va a Celery al
+instante en vez de esperar el presupuesto entero. Los warm-loads usan su
+propio pool y no compiten con ellos.
+"""
+
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .adapters import ADAPTERS
+from .model_cache import model_cache
+from .prediction_cache import prediction_cache
+from .ml_inference import load_model, run_predict, write_results
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'ANALYSIS_SYNC_THREADS', 4),
+    thread_name_prefix='sync-inference',
+)
+# Hilos de _executor libres; se devuelve cuando el predict termina, no al vencer el presupuesto
+_predict_slots = threading.BoundedSemaphore(getattr(settings, 'ANALYSIS_SYNC_THREADS', 4))
+_warm_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'ANALYSIS_SYNC_WARM_THREADS', 1),
+    thread_name_prefix='sync-warm',
+)
+_warming = set()
+_warming_lock = threading.Lock()
+
+
+def is_eligible(mlmodel, inputs) -> bool:
+    """Payload pequeño, adaptador que no necesita el dataset y modo habilitado."""
+    if not getattr(settings, 'ANALYSIS_SYNC_ENABLED', True):
+        return False
+    if not isinstance(inputs, list) or len(inputs) > getattr(settings, 'ANALYSIS_SYNC_MAX_ROWS', 16):
+        return False
+    adapter = ADAPTERS.get(mlmodel.runtime_framework)
+    return adapter is not None and not adapter.uses_dataset
+
+
+def _warm(mlmodel):
+    try:
+        load_model(ADAPTERS[mlmodel.runtime_framework], mlmodel.runtime_framework, mlmodel.runtime_path, mlmodel.pk)
+    except Exception:
+        logger.exception("No se pudo precargar MLModel %s para inferencia síncrona", mlmodel.pk)
+    finally:
+        with _warming_lock:
+            _warming.discard(mlmodel.pk)
+
+
+def _schedule_warm(mlmodel) -> None:
+    with _warming_lock:
+        if mlmodel.pk in _warming:
+            return
+        _warming.add(mlmodel.pk)
+    _warm_executor.submit(_warm, mlmodel)
+
+
+def _predict(mlmodel, inputs):
+    adapter = ADAPTERS[mlmodel.runtime_framework]
+    model_obj = load_model(adapter, mlmodel.runtime_framework, mlmodel.runtime_path, mlmodel.pk)
+    predictions = run_predict(adapter, model_obj, inputs, mlmodel.runtime_path)
+    prediction_cache.store(mlmodel.pk, mlmodel.runtime_path, inputs, predictions, digest=mlmodel.runtime_sha256)
+    return predictions
+
+
+def _predict_in_slot(mlmodel, inputs):
+    try:
+        return _predict(mlmodel, inputs)
+    finally:
+        _predict_slots.release()
+
+
+def try_cached_inference(mlmodel, inputs):
+    """
+    Busca el vector en la cache de predicciones. Devuelve
+    (metrics, predictions) o None si no hay entrada.
+    """
+    adapter = ADAPTERS.get(mlmodel.runtime_framework)
+    if adapter is None or adapter.uses_dataset:
+        return None
+    predictions = prediction_cache.lookup(mlmodel.pk, mlmodel.runtime_path, inputs, digest=mlmodel.runtime_sha256)
+    if predictions is None:
+        return None
+    metrics = {
+        'samples': len(predictions),
+        'dataset_loaded': False,
+        'cache_hit': True,
+    }
+    return metrics, predictions
+
+
+def try_sync_inference(mlmodel, inputs):
+    """
+    Intenta la inferencia en proceso. Devuelve (metrics, predictions) o None
+    si hay que usar Celery (modelo frío, presupuesto excedido o error).
+    """
+    if not is_eligible(mlmodel, inputs):
+        return None
+
+    model_path = mlmodel.runtime_path
+    if not model_cache.peek(mlmodel.pk, model_path):
+        _schedule_warm(mlmodel)
+        return None
+
+    if not _predict_slots.acquire(blocking=False):
+        # Todos los hilos ocupados (quizá con predicts ya vencidos): no vale la pena esperar
+        logger.info("Inferencia síncrona de MLModel %s sin hilos libres; se usa Celery", mlmodel.pk)
+        return None
+
+    budget_ms = getattr(settings, 'ANALYSIS_SYNC_BUDGET_MS', 200)
+    start = time.perf_counter()
+    try:
+        future = _executor.submit(_predict_in_slot, mlmodel, inputs)
+    except Exception:
+        _predict_slots.release()
+        raise
+    try:
+        predictions = future.result(timeout=budget_ms / 1000.0)
+    except FutureTimeout:
+        # El hilo termina por su cuenta; su resultado se descarta
+        logger.warning("Inferencia síncrona de MLModel %s excedió %sms; se usa Celery", mlmodel.pk, budget_ms)
+        return None
+    except Exception:
+        logger.exception("Inferencia síncrona de MLModel %s falló; se usa Celery", mlmodel.pk)
+        return None
+    latency_ms = round((time.perf_counter() - start) * 1000, 3)
+
+    metrics = {
+        'samples': len(predictions),
+        'dataset_loaded': False,
+        'sync': True,
+        'latency_ms': latency_ms,
+    }
+    return metrics, predictions
+
+
+def save_result(serializer, mlmodel, metrics, predictions):
+    """
+    Crea el AnalysisResult en SUCCESS y, con su id ya asignado, escribe el
+    archivo de resultados igual que write_results en la tarea. Si la
+    transacción falla el archivo se borra: no quedan archivos huérfanos.
+    """
+    output_path = None
+    try:
+        with transaction.atomic():
+            analysis = serializer.save(status="SUCCESS", metrics=metrics, completed_at=timezone.now())
+            output_path = write_results(predictions, mlmodel.runtime_path, analysis.id)
+            analysis.output_path = output_path
+            analysis.save(update_fields=["output_path", "updated_at"])
+    except Exception:
+        if output_path:
+            try:
+                os.remove(output_path)
+            except OSError:
+                logger.warning("No se pudo borrar el resultado huérfano %s", output_path)
+        raise
+    return analysis
@@ -1,50 +1,168 @@
 # analysis/tasks.py
-import json
-from celery import shared_task
-from .circuit_breaker import RedisCircuitBreaker, CircuitOpen
+import time
+import random
+from functools import partial
+from celery import shared_task, chord, group
+from celery.exceptions import SoftTimeLimitExceeded
+from django.conf import settings
+from .circuit_breaker import CircuitOpen, model_breaker, model_limiter
 from django.utils import timezone
-from django.core.cache import cache
-from .models import AnalysisResult
-from .ml_inference import execute
+from django.utils.dateparse import parse_datetime
+from django.db.models import Sum
+from .models import AnalysisResult, AnalysisShard, MLModel
+from .ml_inference import execute, execute_batch, execute_dataset, execute_shard, results_base, write_results
+from .prediction_cache import prediction_cache
+from .sharding import should_shard, plan_shards
+from .result_store import merge_parts
+from .batching import claim_batch, complete_batch, fail_batch, is_dataset_mode
+from .timing import StageTimer, with_runtime
+from .metrics_exporter import collector, collect_gauges, metrics_cache, GAUGES_KEY
+from .notifications import notify_analysis
+from .outbox import drain, requeue_stale, requeue_stranded
+from . import warmup  # noqa: F401  (registra el warm-up en worker_process_init)
+from . import routing  # noqa: F401  (registra la cola de afinidad en celeryd_after_setup)
 import logging
 logger = logging.getLogger(__name__)
 
-execute_breaker = RedisCircuitBreaker(name="execute", max_failures=5, reset_timeout=60)
+def _validated_vector(analysis):
+    """Garantiza que parameters sea un dict y devuelve su vector_2d."""
+    params = analysis.parameters
+
+    if not isinstance(params, dict):
+        raise ValueError(f"parameters debe ser un dict, no {type(params).__name__}")
+
+    vector = params.get("vector_2d")
+    if not isinstance(vector, list):
+        raise ValueError(f"vector_2d faltante o inválido: {vector!r}")
+    return vector
+
+def _complete_from_cache(analysis, vector, finish):
+    """
+    Si la cache de predicciones tiene el vector, reclama el análisis y lo
+    cierra sin cargar el modelo. Devuelve True si el análisis quedó resuelto
+    (por este worker o porque otro ya lo había tomado).
+    """
+    mlmodel = analysis.model
+    predictions = prediction_cache.lookup(mlmodel.pk, mlmodel.runtime_path, vector, digest=mlmodel.runtime_sha256)
+    if predictions is None:
+        return False
+
+    now = timezone.now()
+    claimed = AnalysisResult.objects.filter(pk=analysis.pk, status="PENDING").update(status="RUNNING", updated_at=now)
+    if not claimed:
+        logger.info("AnalysisResult %s ya fue reclamado por otro worker; se omite", analysis.pk)
+        return True
+
+    timer = StageTimer()
+    with timer.stage("result_write"):
+        analysis.output_path = write_results(predictions, mlmodel.runtime_path, analysis.id)
+    analysis.metrics      = finish(
+        {"samples": len(predictions), "dataset_loaded": False, "cache_hit": True, "timings": timer.as_dict()},
+        analysis.created_at,
+    )
+    analysis.status       = "SUCCESS"
+    analysis.completed_at = timezone.now()
+    analysis.save(update_fields=["metrics", "output_path", "status", "completed_at", "updated_at"])
+    notify_analysis(analysis, "SUCCESS")
+    return True
 
 @shared_task(bind=True)
-def launch_analysis_task(self, analysis_id):
+def launch_analysis_task(self, analysis_id, model_id=None, framework=None):
     """
+    model_id/framework los pone el dispatcher del outbox para el router de
+    afinidad (analysis/routing.py); la tarea no los usa.
+
     Tarea Celery que:
       1. Carga el AnalysisResult.
       2. Garantiza que parameters siempre esté ligado a un dict.
-      3. Valida vector_2d.
-      4. Ejecuta inferencia y captura métricas y ruta.
-      5. Persiste métricas, output_path y estado.
+      3. Valida vector_2d (o delega a _run_dataset en modo dataset).
+      4. Si el vector ya está en la cache de predicciones, cierra el análisis
+         sin ejecutar predict.
+      5. Pide un slot al limiter adaptativo del modelo; si está saturado,
+         difiere la tarea (retry) o la descarta.
+      6. Reclama el análisis (y otros pendientes del mismo modelo si el
+         MLModel tiene micro-batching) marcándolos RUNNING.
+      7. Ejecuta inferencia y captura métricas y ruta.
+      8. Persiste métricas (con el desglose de tiempos por etapa y el
+         worker/pid que lo ejecutó), output_path y estado.
     """
-    metrics = {}
-    output_path = ""
-    status = "FAILURE"
-    analysis = AnalysisResult.objects.get(pk=analysis_id)
+    started_at, started_perf = timezone.now(), time.perf_counter()
+    analysis = AnalysisResult.objects.select_related("model__serving_variant", "dataset").get(pk=analysis_id)
+    # Métricas de runtime: espera en cola, duración total e identidad del worker
+    finish = partial(
+        _finish, framework=analysis.model.runtime_framework,
+        started_at=started_at, started_perf=started_perf, hostname=self.request.hostname,
+    )
 
-    params = analysis.parameters
+    dataset_mode = is_dataset_mode(analysis)
+    vector = None if dataset_mode else _validated_vector(analysis)
 
-    if not isinstance(params, dict):
-        raise ValueError(f"parameters debe ser un dict, no {type(params).__name__}")
+    if not dataset_mode and _complete_from_cache(analysis, vector, finish):
+        return
 
-    vector = params.get("vector_2d")
-    if not isinstance(vector, list):
-        raise ValueError(f"vector_2d faltante o inválido: {vector!r}")
+    # Los datasets se acotan con shards; el limiter protege la latencia de los vectores
+    limiter = None if dataset_mode else model_limiter(analysis.model_id, analysis.model.runtime_framework)
+    slot = limiter.acquire() if limiter else None
+    if limiter and slot is None:
+        return _defer_or_shed(self, analysis)
+    try:
+        return _run_claimed(analysis, vector, dataset_mode, finish, slot)
+    except SoftTimeLimitExceeded:
+        if slot:
+            slot.overloaded = True
+        raise
+    finally:
+        if slot:
+            slot.release()
+
+def _finish(metrics, created_at, framework, status="SUCCESS", **runtime):
+    """with_runtime() y registro de las etapas en el collector de /metrics."""
+    metrics = with_runtime(metrics, created_at, **runtime)
+    collector.observe_analysis(metrics, framework, status)
+    return metrics
+
+def _defer_or_shed(task, analysis):
+    """
+    El modelo está saturado: reencola la tarea con un retardo (con jitter)
+    mientras queden reintentos; después marca el análisis FAILURE.
+    """
+    max_deferrals = getattr(settings, "ANALYSIS_LIMITER_MAX_DEFERRALS", 5)
+    if task.request.retries < max_deferrals:
+        countdown = getattr(settings, "ANALYSIS_LIMITER_DEFER_SECONDS", 2.0) * (1 + random.random())
+        logger.info("AnalysisResult %s diferido %.1fs: modelo saturado", analysis.pk, countdown)
+        raise task.retry(countdown=countdown, max_retries=max_deferrals)
+    logger.warning("AnalysisResult %s descartado: modelo saturado tras %s reintentos", analysis.pk, max_deferrals)
+    fail_batch([analysis], "Servicio saturado: hay demasiados análisis en curso para este modelo. Intentelo nuevamente.")
+
+def _run_claimed(analysis, vector, dataset_mode, finish, slot):
+    """Reclama el análisis (o un micro-batch) y ejecuta la inferencia."""
+    metrics = {}
+    output_path = ""
+    status = "FAILURE"
+    analysis_id = analysis.pk
 
+    batch = claim_batch(analysis)
+    if not batch:
+        logger.info("AnalysisResult %s ya fue reclamado por otro worker; se omite", analysis_id)
+        return
+    if len(batch) > 1:
+        return _run_batch(batch, finish, slot)
+    if dataset_mode:
+        return _run_dataset(analysis, finish)
 
     try:
-        wrapped_execute = execute_breaker(execute)
+        wrapped_execute = model_breaker(analysis.model_id, analysis.model.runtime_framework)(execute)
         metrics, output_path = wrapped_execute(
-            model_path=analysis.model.file.path,
-            framework=analysis.model.framework,
+            model_path=analysis.model.runtime_path,
+            framework=analysis.model.runtime_framework,
             dataset_path=analysis.dataset.file.path,
             parameters={"inputs": vector},
-            analysis_id=analysis.id
+            analysis_id=analysis.id,
+            model_id=analysis.model_id,
+            model_sha256=analysis.model.runtime_sha256,
         )
+        if slot:
+            slot.observe(metrics)
         status = "SUCCESS"
         analysis.completed_at = timezone.now()
     except CircuitOpen:
@@ -58,13 +176,253 @@ def launch_analysis_task(self, analysis_id):
         # Guarda también el mensaje en BD si lo deseas
         analysis.error_message = str(exc)
         analysis.status = "FAILURE"
-        analysis.save(update_fields=['error_message', 'status'])
+        analysis.save(update_fields=['error_message', 'status', 'updated_at'])
+        notify_analysis(analysis, "FAILURE", error=analysis.error_message)
         # O relanza el error para que Celery lo marque como FAILURE:
         raise
 
-    analysis.metrics     = metrics
+    analysis.metrics     = finish(metrics, analysis.created_at, status=status)
     analysis.output_path = output_path
     analysis.status      = status
-    analysis.save(update_fields=["metrics", "output_path", "status", "completed_at", "error_message"])
+    analysis.save(update_fields=["metrics", "output_path", "status", "completed_at", "error_message", "updated_at"])
+    notify_analysis(analysis, status, error=analysis.error_message if status == "FAILURE" else None)
+
+def _run_batch(batch, finish, slot=None):
+    """
+    Ejecuta un micro-batch: los análisis con vector inválido fallan por
+    separado y el resto comparte un único predict vectorizado.
+    """
+    items, valid = [], []
+    for a in batch:
+        try:
+            items.append((a.pk, _validated_vector(a)))
+            valid.append(a)
+        except ValueError as exc:
+            fail_batch([a], str(exc))
+
+    leader = valid[0]
+    try:
+        wrapped_execute = model_breaker(leader.model_id, leader.model.runtime_framework)(execute_batch)
+        results = wrapped_execute(
+            model_path=leader.model.runtime_path,
+            framework=leader.model.runtime_framework,
+            items=items,
+            model_id=leader.model_id,
+            model_sha256=leader.model.runtime_sha256,
+        )
+    except CircuitOpen:
+        fail_batch(valid, "Servicio temporalmente no disponible (Circuit abierto).")
+        return
+    except Exception as exc:
+        logger.exception("Error al ejecutar execute_batch() para AnalysisResult %s", [a.pk for a in valid])
+        fail_batch(valid, str(exc))
+        raise
+
+    if slot:
+        # predict_ms es compartido por todo el batch: se normaliza por todas sus filas
+        slot.observe(next(iter(results.values()))[0], rows=sum(m["samples"] for m, _ in results.values()))
+    # Cada análisis conserva su propia espera en cola
+    for a in valid:
+        metrics, output_path = results[a.pk]
+        results[a.pk] = (finish(metrics, a.created_at), output_path)
+    complete_batch(valid, results)
+
+def _run_dataset(analysis, finish):
+    """
+    Puntúa todas las filas del dataset por chunks y va guardando el
+    progreso (filas puntuadas / total) en analysis.metrics. Si el archivo
+    es grande se reparte en shards paralelos (ver _launch_shards).
+    """
+    if should_shard(analysis.dataset.file.path):
+        return _launch_shards(analysis, finish.keywords["started_at"])
+
+    def progress(rows_scored, rows_total):
+        current = {"rows_scored": rows_scored, "rows_total": rows_total}
+        AnalysisResult.objects.filter(pk=analysis.pk).update(
+            metrics={"mode": "dataset", "progress": current},
+            updated_at=timezone.now(),
+        )
+        notify_analysis(analysis, "RUNNING", progress=current)
+
+    try:
+        wrapped_execute = model_breaker(analysis.model_id, analysis.model.runtime_framework)(execute_dataset)
+        metrics, output_path = wrapped_execute(
+            model_path=analysis.model.runtime_path,
+            framework=analysis.model.runtime_framework,
+            dataset_path=analysis.dataset.file.path,
+            analysis_id=analysis.id,
+            model_id=analysis.model_id,
+            feature_columns=analysis.parameters.get("feature_columns"),
+            progress=progress,
+        )
+    except CircuitOpen:
+        fail_batch([analysis], "Servicio temporalmente no disponible (Circuit abierto).")
+        return
+    except Exception as exc:
+        logger.exception("Error al ejecutar execute_dataset() para AnalysisResult %s", analysis.pk)
+        fail_batch([analysis], str(exc))
+        raise
+
+    analysis.metrics      = finish(metrics, analysis.created_at)
+    analysis.output_path  = output_path
+    analysis.status       = "SUCCESS"
+    analysis.completed_at = timezone.now()
+    analysis.save(update_fields=["metrics", "output_path", "status", "completed_at", "updated_at"])
+    notify_analysis(analysis, "SUCCESS")
+
+def _launch_shards(analysis, started_at):
+    """
+    Divide el CSV en rangos de bytes, crea un AnalysisShard por rango y
+    lanza un chord: los shards se puntúan en paralelo y merge_shards_task
+    los fusiona al terminar todos. started_at (inicio de launch_analysis_task)
+    viaja en el chord para medir la espera en cola y el total.
+    """
+    ranges = plan_shards(analysis.dataset.file.path)
+    AnalysisShard.objects.filter(analysis=analysis).delete()
+    AnalysisShard.objects.bulk_create([
+        AnalysisShard(analysis=analysis, index=i, start_byte=start, end_byte=end)
+        for i, (start, end) in enumerate(ranges)
+    ])
+    AnalysisResult.objects.filter(pk=analysis.pk).update(
+        metrics={"mode": "dataset", "shards": len(ranges), "progress": {"rows_scored": 0, "rows_total": None}},
+        updated_at=timezone.now(),
+    )
+    logger.info("AnalysisResult %s dividido en %s shards", analysis.pk, len(ranges))
+    chord(
+        group(score_shard_task.s(analysis.pk, i) for i in range(len(ranges)))
+    )(merge_shards_task.si(analysis.pk, started_at.isoformat()))
+
+@shared_task(bind=True)
+def score_shard_task(self, analysis_id, shard_index):
+    """Puntúa un shard y registra su estado y filas en AnalysisShard."""
+    shard = AnalysisShard.objects.select_related("analysis__model__serving_variant", "analysis__dataset").get(
+        analysis_id=analysis_id, index=shard_index
+    )
+    analysis = shard.analysis
+    shard.status = "RUNNING"
+    shard.started_at = timezone.now()
+    shard.save(update_fields=["status", "started_at"])
+
+    try:
+        wrapped_execute = model_breaker(analysis.model_id, analysis.model.runtime_framework)(execute_shard)
+        rows, output_path, timings = wrapped_execute(
+            model_path=analysis.model.runtime_path,
+            framework=analysis.model.runtime_framework,
+            dataset_path=analysis.dataset.file.path,
+            analysis_id=analysis.id,
+            shard_index=shard.index,
+            start_byte=shard.start_byte,
+            end_byte=shard.end_byte,
+            model_id=analysis.model_id,
+            feature_columns=analysis.parameters.get("feature_columns"),
+        )
+    except Exception as exc:
+        message = "Servicio temporalmente no disponible (Circuit abierto)." if isinstance(exc, CircuitOpen) else str(exc)
+        logger.exception("Error en shard %s de AnalysisResult %s", shard_index, analysis_id)
+        AnalysisShard.objects.filter(pk=shard.pk).update(
+            status="FAILURE", error_message=message, finished_at=timezone.now()
+        )
+        # El chord no llamará al merge: el análisis se marca FAILURE aquí
+        fail_batch([analysis], f"Shard {shard_index}: {message}")
+        raise
+
+    AnalysisShard.objects.filter(pk=shard.pk).update(
+        status="SUCCESS", rows=rows, output_path=output_path, timings=timings, finished_at=timezone.now()
+    )
+    done = AnalysisShard.objects.filter(analysis_id=analysis_id, status="SUCCESS").aggregate(rows=Sum("rows"))["rows"] or 0
+    current = {"rows_scored": done, "rows_total": None}
+    updated = AnalysisResult.objects.filter(pk=analysis_id, status="RUNNING").update(
+        metrics={"mode": "dataset", "shards": analysis.shards.count(), "progress": current},
+        updated_at=timezone.now(),
+    )
+    if updated:
+        notify_analysis(analysis, "RUNNING", progress=current)
+
+@shared_task(bind=True)
+def merge_shards_task(self, analysis_id, started_at=None):
+    """
+    Fusiona los archivos parciales en orden y cierra el AnalysisResult. Las
+    etapas de los shards se suman (tiempo de trabajo total, no de pared) y la
+    fusión cuenta como escritura del resultado. La espera en cola y el total
+    se miden desde started_at (ISO 8601, inicio de launch_analysis_task).
+    """
+    analysis = AnalysisResult.objects.select_related("model__serving_variant", "dataset").get(pk=analysis_id)
+    started_at = parse_datetime(started_at) if started_at else timezone.now()
+    # Total de pared desde el inicio del análisis, expresado en perf_counter
+    started_perf = time.perf_counter() - (timezone.now() - started_at).total_seconds()
+    shards = list(analysis.shards.all())
+    timer = StageTimer()
+    for shard in shards:
+        for name, ms in (shard.timings or {}).items():
+            if name.endswith("_ms"):
+                timer.add(name[:-3], ms)
+    try:
+        with timer.stage("result_write"):
+            output_path = merge_parts(
+                [s.output_path for s in shards],
+                results_base(analysis.model.runtime_path, analysis.id),
+            )
+    except Exception as exc:
+        logger.exception("Error al fusionar shards de AnalysisResult %s", analysis_id)
+        fail_batch([analysis], str(exc))
+        raise
 
+    rows = sum(s.rows for s in shards)
+    analysis.metrics = _finish(
+        {
+            "samples": rows,
+            "dataset_loaded": True,
+            "mode": "dataset",
+            "shards": len(shards),
+            "progress": {"rows_scored": rows, "rows_total": rows},
+            "model_cache_hit": all((s.timings or {}).get("model_cache_hit") for s in shards),
+            "timings": timer.as_dict(),
+        },
+        analysis.created_at,
+        framework=analysis.model.runtime_framework,
+        started_at=started_at, started_perf=started_perf, hostname=self.request.hostname,
+    )
+    analysis.output_path  = output_path
+    analysis.status       = "SUCCESS"
+    analysis.completed_at = timezone.now()
+    analysis.save(update_fields=["metrics", "output_path", "status", "completed_at", "updated_at"])
+    notify_analysis(analysis, "SUCCESS")
 
+@shared_task(bind=True)
+def convert_model_task(self, model_id):
+    """
+    Exporta el MLModel a ONNX (fp32 e int8), valida paridad y latencia de
+    cada variante y activa la más rápida (ver analysis/variants.py).
+    """
+    from .variants import build_variants
+    mlmodel = MLModel.objects.prefetch_related("hyperparams").get(pk=model_id)
+    try:
+        variants = build_variants(mlmodel)
+    except Exception:
+        logger.exception("Error al generar variantes ONNX de MLModel %s", model_id)
+        raise
+    return {v.kind: v.status for v in variants}
+
+@shared_task(ignore_result=True)
+def collect_metrics_task():
+    """
+    Calcula los gauges de /metrics que requieren BD o cache compartida
+    (AnalysisResult por estado, breakers, limiters) y los deja en la cache,
+    así el scrape nunca consulta la BD. Lo programa CELERY_BEAT_SCHEDULE.
+    """
+    timeout = max(getattr(settings, "ANALYSIS_METRICS_COLLECT_SECONDS", 15) * 4, 60)
+    metrics_cache().set(GAUGES_KEY, collect_gauges(), timeout=timeout)
+
+@shared_task(ignore_result=True)
+def dispatch_outbox_task():
+    """
+    Red de seguridad del outbox: reencola los análisis RUNNING de workers
+    caídos y los publicados a la cola de un nodo muerto, y publica lo
+    pendiente si `manage.py dispatch_outbox` no está corriendo. Lo programa
+    CELERY_BEAT_SCHEDULE.
+    """
+    requeue_stale()
+    requeue_stranded()
+    sent = drain(max_batches=getattr(settings, "ANALYSIS_OUTBOX_SWEEP_BATCHES", 10))
+    if sent:
+        logger.info("Outbox: %s análisis publicados desde beat", sent)
@@ -0,0 +1,54 @@
+import io
+import os
+import sys
+import subprocess
+from unittest import mock
+from django.core.management import call_command
+from django.test import SimpleTestCase
+
+from analysis import adapters
+
+HEAVY = ('torch', 'tensorflow', 'onnxruntime')
+
+
+class LazyFrameworkImportTests(SimpleTestCase):
+    """
+    Pruebas del registro perezoso de adaptadores:
+      - Importar views y tasks no carga torch, tensorflow ni onnxruntime
+      - import_framework mide el import una sola vez y lo reporta
+      - frameworks_report lista el estado de cada adaptador
+    """
+
+    def test_views_and_tasks_do_not_import_frameworks(self):
+        # En un proceso nuevo: el de la suite ya puede tener torch cargado
+        code = (
+            "import sys, django; django.setup(); "
+            "import analysis.views, analysis.tasks; "
+            f"print('loaded=' + ','.join(m for m in {HEAVY!r} if m in sys.modules))"
+        )
+        result = subprocess.run(
+            [sys.executable, '-c', code], capture_output=True, text=True, env=os.environ.copy(), timeout=120,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertIn('loaded=\n', result.stdout)
+
+    def test_import_framework_records_time_once(self):
+        with mock.patch.dict(adapters._LOADED_FRAMEWORKS, clear=True), \
+                mock.patch('analysis.adapters.importlib.import_module', wraps=adapters.importlib.import_module) as imp:
+            module = adapters.import_framework('colorsys')
+            self.assertIs(adapters.import_framework('colorsys'), module)
+
+            self.assertEqual(list(adapters.loaded_frameworks()), ['colorsys'])
+            self.assertGreaterEqual(adapters.loaded_frameworks()['colorsys'], 0.0)
+            imp.assert_called_once_with('colorsys')
+
+    def test_frameworks_report_lists_every_adapter(self):
+        out = io.StringIO()
+        with mock.patch.dict(adapters._LOADED_FRAMEWORKS, {'joblib': 0.25}, clear=True):
+            call_command('frameworks_report', stdout=out)
+
+        report = out.getvalue()
+        for name, adapter in adapters.ADAPTERS.items():
+            self.assertIn(name, report)
+            self.assertIn(adapter.framework_module, report)
+        self.assertIn('(0.250s)', report)
@@ -0,0 +1,131 @@
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from analysis import admission, circuit_breaker
+from analysis.models import MLModel, HyperparameterDefinition
+from datasets.models import MetaData
+
+User = get_user_model()
+
+
+class TokenBucketTests(SimpleTestCase):
+    """Reposición continua, espera calculada, devolución y script Lua con Redis."""
+
+    def setUp(self):
+        admission.admission_cache().clear()
+
+    def test_burst_then_wait_then_refill(self):
+        bucket = admission.TokenBucket('t', rate=1.0, burst=2)
+        with mock.patch('analysis.admission.time.time', return_value=100.0):
+            self.assertEqual(bucket.take('u'), (True, 0.0))
+            self.assertEqual(bucket.take('u'), (True, 0.0))
+            allowed, wait = bucket.take('u')
+            self.assertFalse(allowed)
+            self.assertAlmostEqual(wait, 1.0)
+            # Otra identidad tiene su propio bucket
+            self.assertTrue(bucket.take('v')[0])
+        with mock.patch('analysis.admission.time.time', return_value=101.0):
+            self.assertTrue(bucket.take('u')[0])
+
+    def test_parse_rate(self):
+        self.assertEqual(admission.parse_rate('60/min'), 1.0)
+        self.assertEqual(admission.parse_rate('10/s'), 10.0)
+        self.assertIsNone(admission.parse_rate(''))
+
+    def test_redis_uses_one_script_call(self):
+        client = mock.Mock()
+        client.register_script.return_value.return_value = [0, b'2.5']
+        with mock.patch('analysis.admission._redis_client', return_value=client):
+            allowed, wait = admission.TokenBucket('t', rate=1.0, burst=2).take('u')
+
+        self.assertEqual((allowed, wait), (False, 2.5))
+        client.register_script.assert_called_once_with(admission.TOKEN_BUCKET_LUA)
+        self.assertEqual(client.register_script.return_value.call_count, 1)
+        # El reloj es el TIME de Redis, no el del proceso
+        self.assertEqual(client.register_script.return_value.call_args.kwargs['args'], [1.0, 2.0, 1.0])
+        self.assertIn("redis.call('TIME')", admission.TOKEN_BUCKET_LUA)
+
+    def test_refund_returns_a_token_up_to_burst(self):
+        bucket = admission.TokenBucket('t', rate=1.0, burst=1)
+        with mock.patch('analysis.admission.time.time', return_value=100.0):
+            self.assertTrue(bucket.take('u')[0])
+            bucket.refund('u')
+            bucket.refund('u')
+            self.assertTrue(bucket.take('u')[0])
+            self.assertFalse(bucket.take('u')[0])
+
+    @override_settings(ANALYSIS_ADMISSION_CACHE='default', ANALYSIS_ADMISSION_RATES={'analysis': '1/min'},
+                       ANALYSIS_ADMISSION_CONCURRENCY={'analysis': 1})
+    def test_process_local_cache_is_not_enforced(self):
+        circuit_breaker._local_warned.clear()
+        throttle = admission.TokenBucketThrottle('analysis')
+
+        with self.assertLogs('analysis.circuit_breaker', 'WARNING'):
+            self.assertTrue(all(throttle.allow_request(mock.Mock(), None) for _ in range(3)))
+        self.assertIsNone(admission.concurrency_limiter('analysis'))
+
+
+@override_settings(ANALYSIS_ADMISSION_CACHE='default')
+class AdmissionApiTests(APITestCase):
+    """
+    POST /api/v1/analysis/ con control de admisión:
+      - Agotado el bucket responde 429 con Retry-After; otros usuarios siguen
+      - Con el tope global lleno responde 429 y el slot se libera al terminar
+      - Las lecturas no consumen tokens
+      - Un rechazo por concurrencia devuelve el token pagado
+    """
+
+    def setUp(self):
+        caches['default'].clear()
+        # LocMem hace de cache compartida en las pruebas
+        mock.patch('analysis.admission.shared_cache', return_value=True).start()
+        self.addCleanup(mock.patch.stopall)
+        self.user = User.objects.create_user(username='admision', email='a@example.com', password='pass1234')
+        self.other = User.objects.create_user(username='otra', email='b@example.com', password='pass1234')
+        self.mlmodel = MLModel.objects.create(name='m', version='1', framework='sklearn', owner=self.user, file='m.joblib')
+        HyperparameterDefinition.objects.create(model=self.mlmodel, position=1, key_hint='x', dtype='float')
+        self.url = reverse('analysis-list')
+
+    def post(self, user):
+        dataset = MetaData.objects.create(owner=user, name='ds', file='ds.csv')
+        self.client.force_authenticate(user=user)
+        return self.client.post(self.url, {'model': self.mlmodel.pk, 'dataset': dataset.pk, 'param_1': '1.0'},
+                                format='json')
+
+    @override_settings(ANALYSIS_ADMISSION_RATES={'analysis': '1/min'}, ANALYSIS_ADMISSION_BURSTS={'analysis': 2})
+    def test_bucket_exhausted_returns_429_with_retry_after(self):
+        self.assertEqual(self.post(self.user).status_code, 202)
+        self.assertEqual(self.post(self.user).status_code, 202)
+
+        response = self.post(self.user)
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(0 < int(response['Retry-After']) <= 60)
+
+        self.assertEqual(self.post(self.other).status_code, 202)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    @override_settings(ANALYSIS_ADMISSION_CONCURRENCY={'analysis': 1}, ANALYSIS_ADMISSION_RETRY_SECONDS=3)
+    def test_concurrency_cap_rejects_and_releases(self):
+        held = admission.concurrency_limiter('analysis').acquire()
+
+        response = self.post(self.user)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '3')
+
+        held.release()
+        self.assertEqual(self.post(self.user).status_code, 202)
+        self.assertEqual(admission.concurrency_limiter('analysis').stats()['in_flight'], 0)
+
+    @override_settings(ANALYSIS_ADMISSION_RATES={'analysis': '1/min'}, ANALYSIS_ADMISSION_BURSTS={'analysis': 1},
+                       ANALYSIS_ADMISSION_CONCURRENCY={'analysis': 1})
+    def test_concurrency_rejection_refunds_the_token(self):
+        held = admission.concurrency_limiter('analysis').acquire()
+        self.assertEqual(self.post(self.user).status_code, 429)
+
+        held.release()
+        self.assertEqual(self.post(self.user).status_code, 202)
+        self.assertEqual(self.post(self.user).status_code, 429)
@@ -0,0 +1,117 @@
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from analysis.models import MLModel, AnalysisResult
+from analysis.batching import claim_batch, complete_batch
+from analysis.ml_inference import execute_batch
+from datasets.models import MetaData
+
+User = get_user_model()
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+class SumAdapter:
+    """Adaptador de prueba: predice la suma de cada fila y cuenta los predict."""
+    uses_dataset = False
+
+    def __init__(self):
+        self.calls = 0
+
+    def load(self, file_obj):
+        return object()
+
+    def predict(self, model, data, **params):
+        self.calls += 1
+        return [sum(row) for row in data]
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class MicroBatchingTests(TestCase):
+    """
+    Pruebas del micro-batching:
+      - El líder reclama otros PENDING del mismo modelo hasta max_batch_size
+      - Un análisis ya reclamado no se vuelve a reclamar
+      - Los RUNNING colgados del modelo (líder caído) se reclaman de nuevo
+      - La espera de la ventana se acota con ANALYSIS_BATCH_MAX_WINDOW_MS
+      - execute_batch hace un solo predict y reparte las filas
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='batch', email='b@example.com', password='pass1234')
+        self.dataset = MetaData.objects.create(
+            owner=self.user, name='ds',
+            file=SimpleUploadedFile('ds.csv', b'a,b\n1,2\n', content_type='text/csv'),
+        )
+        self.mlmodel = MLModel.objects.create(
+            name='m', version='1', framework='sklearn', owner=self.user,
+            file=SimpleUploadedFile('m.joblib', b'model'), max_batch_size=3,
+        )
+
+    def _analysis(self, row):
+        return AnalysisResult.objects.create(
+            dataset=self.dataset, model=self.mlmodel, parameters={"vector_2d": [row]},
+        )
+
+    def test_claims_up_to_max_batch_size(self):
+        analyses = [self._analysis([i, i]) for i in range(5)]
+
+        batch = claim_batch(analyses[2])
+
+        self.assertEqual(len(batch), 3)
+        self.assertEqual(batch[0].pk, analyses[2].pk)
+        self.assertEqual(AnalysisResult.objects.filter(status="RUNNING").count(), 3)
+
+    def test_claimed_analysis_is_skipped(self):
+        first, second = self._analysis([1, 1]), self._analysis([2, 2])
+        claim_batch(first)
+
+        second.refresh_from_db()
+        self.assertEqual(claim_batch(second), [])
+
+    def test_stale_followers_are_reclaimed(self):
+        analyses = [self._analysis([i, i]) for i in range(3)]
+        claim_batch(analyses[0])
+        # El worker del líder murió: el batch queda RUNNING sin cambios
+        AnalysisResult.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+        newcomer = self._analysis([9, 9])
+
+        batch = claim_batch(newcomer)
+
+        self.assertEqual(batch[0].pk, newcomer.pk)
+        self.assertEqual({a.pk for a in batch[1:]}, {analyses[0].pk, analyses[1].pk})
+
+    @override_settings(ANALYSIS_BATCH_MAX_WINDOW_MS=5)
+    def test_window_is_capped(self):
+        self.mlmodel.batch_window_ms = 10000
+        self.mlmodel.save(update_fields=['batch_window_ms'])
+        analysis = self._analysis([1, 1])
+
+        with mock.patch('analysis.batching.time.sleep') as sleep:
+            claim_batch(analysis)
+
+        sleep.assert_called_once_with(0.005)
+
+    def test_execute_batch_runs_single_predict(self):
+        analyses = [self._analysis([i, 1]) for i in range(3)]
+        batch = claim_batch(analyses[0])
+        adapter = SumAdapter()
+
+        with mock.patch.dict('analysis.ml_inference.ADAPTERS', {'sklearn': adapter}):
+            results = execute_batch(
+                model_path=self.mlmodel.file.path, framework='sklearn',
+                items=[(a.pk, a.parameters["vector_2d"]) for a in batch],
+            )
+        complete_batch(batch, results)
+
+        self.assertEqual(adapter.calls, 1)
+        for a in analyses:
+            a.refresh_from_db()
+            self.assertEqual(a.status, "SUCCESS")
+            self.assertEqual(a.metrics["batch_size"], 3)
+            self.assertTrue(os.path.exists(a.output_path))
@@ -0,0 +1,153 @@
+import tempfile
+from datetime import timedelta
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from analysis import notifications
+from analysis.models import MLModel, AnalysisResult
+from analysis.tasks import launch_analysis_task
+from datasets.models import MetaData
+
+User = get_user_model()
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+class DoubleAdapter:
+    """Adaptador de prueba: duplica la primera columna."""
+    uses_dataset = False
+
+    def load(self, file_obj):
+        return object()
+
+    def predict(self, model, data, **params):
+        return [row[0] * 2 for row in data]
+
+
+class BulkStatusTests(APITestCase):
+    """
+    Pruebas de GET /api/v1/analysis/status/:
+      - Con ids: una consulta para los que no están en la cache de estados
+      - La cache solo responde por análisis del mismo usuario
+      - Con updated_since devuelve los cambios y el cursor siguiente
+      - El cursor (updated_at, id) no salta filas con el mismo updated_at
+    """
+
+    url = '/api/v1/analysis/status/'
+
+    def setUp(self):
+        notifications.status_cache().clear()
+        self.user = User.objects.create_user(username='bulk', email='b@example.com', password='pass1234')
+        self.other = User.objects.create_user(username='otro', email='o@example.com', password='pass1234')
+        self.mlmodel = MLModel.objects.create(name='m', version='1', framework='sklearn', owner=self.user, file='m.joblib')
+        mine = MetaData.objects.create(owner=self.user, name='ds', file='ds.csv')
+        theirs = MetaData.objects.create(owner=self.other, name='ds2', file='ds2.csv')
+        self.analyses = [
+            AnalysisResult.objects.create(dataset=mine, model=self.mlmodel, parameters={}, status=s)
+            for s in ('PENDING', 'RUNNING', 'FAILURE')
+        ]
+        self.foreign = AnalysisResult.objects.create(dataset=theirs, model=self.mlmodel, parameters={})
+        self.client.force_authenticate(self.user)
+
+    def get(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_ids_in_one_query_scoped_to_user(self):
+        ids = [a.pk for a in self.analyses] + [self.foreign.pk]
+        with self.assertNumQueries(1):
+            rows = self.get(ids=','.join(map(str, ids)))['results']
+
+        self.assertEqual([r['id'] for r in rows], ids[:3])
+        self.assertEqual([r['status'] for r in rows], ['PENDING', 'RUNNING', 'FAILURE'])
+
+    def test_cached_statuses_skip_the_database(self):
+        running = self.analyses[1]
+        notifications.record_status(
+            'analysis', running.pk,
+            notifications.analysis_message(running, 'RUNNING', progress={'rows_scored': 5, 'rows_total': 10}),
+            owner_id=self.user.pk,
+        )
+        with self.assertNumQueries(0):
+            rows = self.get(ids=str(running.pk))['results']
+        self.assertEqual(rows[0]['progress'], {'rows_scored': 5, 'rows_total': 10})
+
+        # La entrada de otro dueño no se usa: se consulta la BD y se omite
+        notifications.record_status('analysis', self.foreign.pk, {'analysis_id': self.foreign.pk, 'status': 'RUNNING'},
+                                    owner_id=self.other.pk)
+        self.assertEqual(self.get(ids=str(self.foreign.pk))['results'], [])
+
+    def test_updated_since_returns_changes_and_cursor(self):
+        since = timezone.now() - timedelta(minutes=1)
+        AnalysisResult.objects.filter(pk=self.analyses[0].pk).update(updated_at=since - timedelta(minutes=1))
+
+        body = self.get(updated_since=since.isoformat())
+
+        self.assertEqual({r['id'] for r in body['results']}, {a.pk for a in self.analyses[1:]})
+        self.assertFalse(body['more'])
+        self.assertEqual(self.get(cursor=body['cursor'])['results'], [])
+
+    def test_cursor_pages_through_equal_timestamps(self):
+        stamp = timezone.now() - timedelta(minutes=1)
+        AnalysisResult.objects.update(updated_at=stamp)
+        since = (stamp - timedelta(seconds=1)).isoformat()
+
+        with self.settings(ANALYSIS_BULK_STATUS_MAX=2):
+            first = self.get(updated_since=since)
+            second = self.get(cursor=first['cursor'])
+
+        self.assertTrue(first['more'])
+        self.assertEqual([r['id'] for r in first['results'] + second['results']], [a.pk for a in self.analyses])
+        self.assertEqual(self.client.get(self.url, {'cursor': 'x,1'}).status_code, 400)
+
+    def test_rejects_missing_or_invalid_parameters(self):
+        self.assertEqual(self.client.get(self.url).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'ids': 'a,b'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'updated_since': 'ayer'}).status_code, 400)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class BulkStatusTransitionTests(APITestCase):
+    """
+    Un cliente que ya vio el análisis RUNNING recibe el paso a SUCCESS de un
+    análisis de un solo vector con su cursor (el save escribe updated_at).
+    """
+
+    url = '/api/v1/analysis/status/'
+
+    def setUp(self):
+        caches['predictions'].clear()
+        self.user = User.objects.create_user(username='trans', email='tr@example.com', password='pass1234')
+        dataset = MetaData.objects.create(
+            owner=self.user, name='ds',
+            file=SimpleUploadedFile('ds.csv', b'a\n1\n', content_type='text/csv'),
+        )
+        mlmodel = MLModel.objects.create(
+            name='m', version='1', framework='sklearn', owner=self.user,
+            file=SimpleUploadedFile('m.joblib', b'model'),
+        )
+        self.analysis = AnalysisResult.objects.create(dataset=dataset, model=mlmodel, parameters={'vector_2d': [[1.0]]})
+        self.client.force_authenticate(self.user)
+
+    def test_single_vector_success_is_seen_after_running(self):
+        since = (timezone.now() - timedelta(minutes=1)).isoformat()
+        seen = {}
+        adapter = DoubleAdapter()
+
+        def predict_while_polling(model, data, **params):
+            # Durante predict el cliente sondea y guarda el cursor del estado RUNNING
+            seen.update(self.client.get(self.url, {'updated_since': since}).json())
+            return DoubleAdapter.predict(adapter, model, data, **params)
+
+        adapter.predict = predict_while_polling
+        with mock.patch.dict('analysis.ml_inference.ADAPTERS', {'sklearn': adapter}):
+            launch_analysis_task(self.analysis.pk)
+
+        self.assertEqual([r['status'] for r in seen['results']], ['RUNNING'])
+        rows = self.client.get(self.url, {'cursor': seen['cursor']}).json()['results']
+        self.assertEqual([(r['id'], r['status']) for r in rows], [(self.analysis.pk, 'SUCCESS')])
@@ -0,0 +1,190 @@
+from unittest import mock
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+from analysis import circuit_breaker, tasks
+from analysis.circuit_breaker import RedisCircuitBreaker, CircuitOpen, AdaptiveLimiter, model_breaker
+
+
+def boom():
+    raise RuntimeError("falla")
+
+
+@override_settings(ANALYSIS_BREAKER_MAX_FAILURES=2, ANALYSIS_BREAKER_FRAMEWORK_MAX_FAILURES=3,
+                   ANALYSIS_BREAKER_RESET_TIMEOUT=60, ANALYSIS_BREAKER_STATE_TTL=0)
+class CircuitBreakerTests(SimpleTestCase):
+    """
+    Pruebas de los breakers:
+      - Un modelo roto abre solo su circuito, no el de otros modelos
+      - open -> half-open deja pasar una sola prueba
+      - Si el modelo rechaza la prueba del framework, la prueba se devuelve
+      - El estado local evita consultar la cache con el circuito cerrado
+      - Con Redis cada operación es una llamada al script Lua, con el reloj del servidor
+    """
+
+    def setUp(self):
+        caches['shared'].clear()
+        circuit_breaker._breakers.clear()
+
+    def fail(self, wrap, times):
+        for _ in range(times):
+            with self.assertRaises(RuntimeError):
+                wrap(boom)()
+
+    def test_broken_model_does_not_open_other_models(self):
+        self.fail(model_breaker(1, 'sklearn'), 2)
+
+        with self.assertRaises(CircuitOpen):
+            model_breaker(1, 'sklearn')(lambda: 'ok')()
+        self.assertEqual(model_breaker(2, 'sklearn')(lambda: 'ok')(), 'ok')
+        # Los rechazos del modelo no cuentan como fallos del framework
+        self.assertEqual(circuit_breaker.get_breaker('framework:sklearn').stats()['fails'], 0)
+
+    def test_half_open_allows_a_single_probe(self):
+        breaker = RedisCircuitBreaker('probe', max_failures=1, reset_timeout=10, state_ttl=0)
+        with mock.patch.object(breaker, '_now', return_value=1000):
+            self.fail(breaker, 1)
+        with mock.patch.object(breaker, '_now', return_value=1011):
+            self.assertEqual(breaker.get_state(), 'half-open')
+            self.assertEqual(breaker.get_state(), 'open')
+            breaker.half_open_success()
+            self.assertEqual(breaker.get_state(), 'closed')
+
+    def test_framework_probe_is_returned_when_model_is_open(self):
+        model = circuit_breaker.get_breaker('model:1', max_failures=1, reset_timeout=60)
+        framework = circuit_breaker.get_breaker('framework:sklearn', max_failures=1, reset_timeout=10)
+        with mock.patch.object(RedisCircuitBreaker, '_now', return_value=1000):
+            self.fail(model_breaker(1, 'sklearn'), 1)
+            framework.increment_failure()
+
+        with mock.patch.object(RedisCircuitBreaker, '_now', return_value=1011):
+            # La prueba del framework la toma una llamada cuyo modelo está abierto
+            with self.assertRaises(CircuitOpen):
+                model_breaker(1, 'sklearn')(lambda: 'ok')()
+            self.assertEqual(framework.stats()['state'], 'open')
+            # Otro modelo recibe la prueba y cierra el framework
+            self.assertEqual(model_breaker(2, 'sklearn')(lambda: 'ok')(), 'ok')
+            self.assertEqual(framework.stats()['state'], 'closed')
+        self.assertEqual(model.stats()['state'], 'open')
+
+    def test_local_state_skips_the_cache_while_closed(self):
+        breaker = RedisCircuitBreaker('local', state_ttl=30)
+        breaker(lambda: 'ok')()
+
+        with mock.patch.object(breaker, '_apply') as apply:
+            self.assertEqual(breaker(lambda: 'ok')(), 'ok')
+        apply.assert_not_called()
+
+    def test_redis_backend_runs_one_script_call_per_operation(self):
+        script = mock.Mock(return_value=[b'closed', b'closed', 0, 0, 1000])
+        client = mock.Mock(register_script=mock.Mock(return_value=script))
+        breaker = RedisCircuitBreaker('redis', max_failures=1, reset_timeout=10, state_ttl=30)
+
+        with mock.patch.object(circuit_breaker, '_redis_client', return_value=client), \
+                mock.patch.object(breaker, '_now', side_effect=AssertionError('reloj local')):
+            self.assertEqual(breaker.get_state(), 'closed')
+            script.return_value = [b'open', b'open', 1, 995, 1000]
+            breaker.increment_failure()
+            # Abierto hace 5 s según el servidor: sigue abierto sin otra llamada
+            self.assertEqual(breaker.get_state(), 'open')
+
+        client.register_script.assert_called_once_with(circuit_breaker.TRANSITION_LUA)
+        self.assertIn("redis.call('TIME')", circuit_breaker.TRANSITION_LUA)
+        self.assertEqual([c.kwargs['args'] for c in script.call_args_list], [['check', 1, 10, 3600], ['failure', 1, 10, 3600]])
+
+
+@override_settings(ANALYSIS_LIMITER_INITIAL=2, ANALYSIS_LIMITER_MIN=1, ANALYSIS_LIMITER_MAX=4,
+                   ANALYSIS_LIMITER_TARGET_MS=0, ANALYSIS_LIMITER_TOLERANCE=2.0, ANALYSIS_LIMITER_BACKOFF=0.5)
+class AdaptiveLimiterTests(SimpleTestCase):
+    """
+    Pruebas del limiter AIMD:
+      - No concede más slots que floor(limit)
+      - Latencia bajo el objetivo sube el límite; sobre el objetivo lo baja
+      - Los slots de workers caídos expiran con el lease
+      - La latencia se compara por fila
+      - Sin Redis model_limiter() no limita y avisa
+    """
+
+    def setUp(self):
+        self.limiter = AdaptiveLimiter('test')
+        self.limiter.cache.clear()
+
+    def test_grants_at_most_limit_slots(self):
+        first, second = self.limiter.acquire(), self.limiter.acquire()
+
+        self.assertIsNotNone(first)
+        self.assertIsNotNone(second)
+        self.assertIsNone(self.limiter.acquire())
+        first.release()
+        self.assertIsNotNone(self.limiter.acquire())
+
+    def test_latency_drives_the_limit(self):
+        for _ in range(6):
+            slot = self.limiter.acquire()
+            slot.latency_ms = 10.0
+            slot.release()
+        grown = self.limiter.stats()['limit']
+        self.assertGreater(grown, 3)
+
+        slot = self.limiter.acquire()
+        slot.latency_ms = 100.0  # > 2x la mínima observada
+        slot.release()
+        self.assertAlmostEqual(self.limiter.stats()['limit'], round(grown * 0.5, 2), places=1)
+
+    def test_expired_slots_are_reclaimed(self):
+        limiter = AdaptiveLimiter('lease', lease=0.0)
+        limiter.acquire()
+        limiter.acquire()
+
+        self.assertIsNotNone(limiter.acquire())
+
+    def test_latency_is_normalised_per_row(self):
+        slot = self.limiter.acquire()
+        slot.observe({'samples': 1, 'timings': {'predict_ms': 10.0}})
+        slot.release()
+        limit = self.limiter.stats()['limit']
+
+        # 100 filas en 50ms es más rápido por fila que 1 fila en 10ms: no es sobrecarga
+        slot = self.limiter.acquire()
+        slot.observe({'samples': 100, 'timings': {'predict_ms': 50.0}})
+        slot.release()
+
+        self.assertGreater(self.limiter.stats()['limit'], limit)
+        self.assertEqual(self.limiter.stats()['min_latency_ms'], 0.5)
+
+    def test_model_limiter_requires_a_shared_cache(self):
+        circuit_breaker._local_warned.clear()
+        with self.assertLogs('analysis.circuit_breaker', 'WARNING') as logs:
+            self.assertIsNone(circuit_breaker.model_limiter(1, 'sklearn'))
+            self.assertIsNone(circuit_breaker.model_limiter(2, 'sklearn'))
+        self.assertEqual(len(logs.output), 1)
+
+        with mock.patch.object(circuit_breaker, '_redis_client', return_value=mock.Mock()):
+            self.assertIsInstance(circuit_breaker.model_limiter(1, 'sklearn'), AdaptiveLimiter)
+
+
+class DeferOrShedTests(SimpleTestCase):
+    """Con el modelo saturado la tarea se reintenta y, agotados los reintentos, se descarta."""
+
+    def setUp(self):
+        self.task = mock.Mock()
+        self.task.retry.side_effect = RuntimeError("retry")
+        self.analysis = mock.Mock(pk=7)
+
+    @override_settings(ANALYSIS_LIMITER_MAX_DEFERRALS=2, ANALYSIS_LIMITER_DEFER_SECONDS=1.0)
+    def test_defers_while_retries_remain(self):
+        self.task.request.retries = 1
+        with self.assertRaisesMessage(RuntimeError, "retry"):
+            tasks._defer_or_shed(self.task, self.analysis)
+
+        countdown = self.task.retry.call_args.kwargs['countdown']
+        self.assertTrue(1.0 <= countdown <= 2.0)
+
+    @override_settings(ANALYSIS_LIMITER_MAX_DEFERRALS=2)
+    def test_sheds_after_the_last_retry(self):
+        self.task.request.retries = 2
+        with mock.patch.object(tasks, 'fail_batch') as fail:
+            tasks._defer_or_shed(self.task, self.analysis)
+
+        self.task.retry.assert_not_called()
+        self.assertIn("saturado", fail.call_args.args[1])
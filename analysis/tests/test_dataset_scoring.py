@@ -0,0 +1,76 @@
+import os
+import tempfile
+from unittest import mock
+from django.test import SimpleTestCase, override_settings
+
+from analysis.ml_inference import execute_dataset, count_rows
+from analysis.result_store import read_predictions
+
+
+class FirstColumnAdapter:
+    """Adaptador de prueba: devuelve la primera columna de cada fila."""
+    uses_dataset = False
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def load(self, file_obj):
+        return object()
+
+    def predict(self, model, data, **params):
+        self.batch_sizes.append(len(data))
+        return [int(row[0]) for row in data]
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class DatasetScoringTests(SimpleTestCase):
+    """
+    Pruebas de la puntuación de dataset completo:
+      - Lee el CSV por chunks y llama predict una vez por chunk
+      - El archivo de salida contiene una predicción por fila
+      - Reporta progreso tras cada chunk
+      - Falla nombrando las columnas esperadas que no están en el CSV
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.csv_path = os.path.join(self.tmpdir.name, 'data.csv')
+        with open(self.csv_path, 'w') as f:
+            f.write('b,a\n')
+            f.writelines(f'{i * 10},{i}\n' for i in range(25))
+        self.model_path = os.path.join(self.tmpdir.name, 'model.joblib')
+        with open(self.model_path, 'wb') as f:
+            f.write(b'model')
+
+    def test_count_rows_ignores_header(self):
+        self.assertEqual(count_rows(self.csv_path), 25)
+
+    def test_scores_every_row_in_chunks(self):
+        adapter = FirstColumnAdapter()
+        progress = []
+
+        with mock.patch.dict('analysis.ml_inference.ADAPTERS', {'sklearn': adapter}):
+            metrics, out_path = execute_dataset(
+                model_path=self.model_path, framework='sklearn',
+                dataset_path=self.csv_path, analysis_id=7,
+                feature_columns=['a', 'b'], chunksize=10,
+                progress=lambda done, total: progress.append((done, total)),
+            )
+
+        self.assertEqual(adapter.batch_sizes, [10, 10, 5])
+        self.assertEqual(read_predictions(out_path), list(range(25)))
+        self.assertEqual(metrics['samples'], 25)
+        self.assertEqual(progress, [(10, 25), (20, 25), (25, 25)])
+
+    def test_missing_feature_columns_fail(self):
+        adapter = FirstColumnAdapter()
+
+        with mock.patch.dict('analysis.ml_inference.ADAPTERS', {'sklearn': adapter}):
+            with self.assertRaisesMessage(ValueError, 'c, d'):
+                execute_dataset(
+                    model_path=self.model_path, framework='sklearn',
+                    dataset_path=self.csv_path, analysis_id=8,
+                    feature_columns=['a', 'c', 'd'], chunksize=10,
+                )
+        self.assertEqual(adapter.batch_sizes, [])
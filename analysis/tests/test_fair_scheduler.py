@@ -0,0 +1,98 @@
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from analysis import outbox
+from analysis.fair_scheduler import BULK, INTERACTIVE, lane_for, plan, weighted_round_robin
+from analysis.models import MLModel, AnalysisResult, AnalysisOutbox
+from datasets.models import MetaData
+
+User = get_user_model()
+
+
+class WeightedRoundRobinTests(SimpleTestCase):
+    def test_heavy_backlog_does_not_take_every_slot(self):
+        self.assertEqual(weighted_round_robin({'heavy': 10000, 'light': 2}, 4), {'heavy': 2, 'light': 2})
+
+    def test_weights_and_unused_share(self):
+        share = weighted_round_robin({'a': 100, 'b': 1, 'c': 100}, 9, weights={'a': 3})
+        self.assertEqual(share, {'a': 6, 'b': 1, 'c': 2})
+
+    def test_interactive_lane_goes_first(self):
+        demand = {BULK: {1: 500}, INTERACTIVE: {2: 3}}
+        self.assertEqual(plan(demand, 1), {(INTERACTIVE, 2): 1})
+        self.assertEqual(plan(demand, 5), {(INTERACTIVE, 2): 3, (BULK, 1): 2})
+
+
+@override_settings(ANALYSIS_FAIR_MAX_IN_FLIGHT=4, ANALYSIS_FAIR_USER_WEIGHTS=[])
+class FairDispatchTests(TestCase):
+    """
+    Pruebas del dispatcher con reparto justo:
+      - Un usuario liviano entra en el primer lote aunque otro tenga un backlog enorme
+      - No se publica más de ANALYSIS_FAIR_MAX_IN_FLIGHT; los terminados liberan cupo
+      - El cupo se calcula dentro de la transacción, con el lock de los dispatchers tomado
+      - El carril fija la prioridad del mensaje
+    """
+
+    def setUp(self):
+        self.mlmodel = MLModel.objects.create(name='m', version='1', framework='sklearn', file='m.joblib',
+                                              owner=User.objects.create_user(username='admin', password='x'))
+        self.heavy = self.make_user('heavy')
+        self.light = self.make_user('light')
+        self.heavy_rows = [self.submit(self.heavy) for _ in range(30)]
+        self.light_row = self.submit(self.light)
+        mock.patch('analysis.outbox.current_app').start()
+        self.apply_async = mock.patch('analysis.tasks.launch_analysis_task.apply_async').start()
+        self.addCleanup(mock.patch.stopall)
+
+    def make_user(self, name):
+        user = User.objects.create_user(username=name, password='x')
+        user.dataset = MetaData.objects.create(owner=user, name=name, file=f'{name}.csv')
+        return user
+
+    def submit(self, user, parameters=None):
+        analysis = AnalysisResult.objects.create(
+            dataset=user.dataset, model=self.mlmodel, parameters=parameters or {'vector_2d': [[1.0]]},
+        )
+        return outbox.enqueue(analysis)
+
+    def published(self):
+        return [c.args[0][0] for c in self.apply_async.call_args_list]
+
+    def test_light_user_is_not_starved(self):
+        self.assertEqual(outbox.dispatch_pending(), 4)
+
+        self.assertIn(self.light_row.analysis_id, self.published())
+        self.assertEqual(self.published()[:2], [self.heavy_rows[0].analysis_id, self.light_row.analysis_id])
+
+    def test_in_flight_cap_and_release(self):
+        outbox.dispatch_pending()
+        self.assertEqual(outbox.dispatch_pending(), 0)
+
+        AnalysisResult.objects.filter(pk__in=self.published()[:2]).update(status='SUCCESS')
+        self.assertEqual(outbox.dispatch_pending(), 2)
+        self.assertEqual(AnalysisOutbox.objects.filter(dispatched_at__isnull=False).count(), 4)
+
+    def test_budget_is_computed_under_the_dispatch_lock(self):
+        from django.db import transaction
+        calls = []
+        def free_slots(batch_size):
+            calls.append(('slots', transaction.get_connection().in_atomic_block))
+            return 4
+
+        with mock.patch.object(outbox, 'lock_dispatch', side_effect=lambda: calls.append('lock')), \
+                mock.patch.object(outbox, 'free_slots', side_effect=free_slots):
+            outbox.dispatch_pending()
+
+        self.assertEqual(calls, ['lock', ('slots', True)])
+
+    @override_settings(ANALYSIS_FAIR_MAX_IN_FLIGHT=10)
+    def test_bulk_lane_gets_lower_priority(self):
+        dataset_row = self.submit(self.light, {'mode': 'dataset', 'feature_columns': ['a']})
+        self.assertEqual(dataset_row.lane, BULK)
+        self.assertEqual(lane_for(self.light_row.analysis), INTERACTIVE)
+
+        outbox.dispatch_pending()
+        priorities = {c.args[0][0]: c.kwargs['priority'] for c in self.apply_async.call_args_list}
+        self.assertEqual(priorities[self.light_row.analysis_id], 0)
+        self.assertEqual(priorities[dataset_row.analysis_id], 6)
@@ -0,0 +1,80 @@
+import os
+import tempfile
+from unittest import mock
+from django.test import SimpleTestCase, override_settings
+
+from analysis import ml_inference
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+class VectorAdapter:
+    """Adaptador de prueba que solo usa los inputs."""
+    uses_dataset = False
+
+    def load(self, file_obj):
+        return object()
+
+    def predict(self, model, data, **params):
+        self.params = params
+        return [row[0] for row in data]
+
+
+class DatasetAdapter(VectorAdapter):
+    """Adaptador de prueba que declara usar el dataset."""
+    uses_dataset = True
+
+    def predict(self, model, data, dataset=None, **params):
+        return [len(dataset)] * len(data)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class LazyDatasetTests(SimpleTestCase):
+    """
+    Pruebas de la carga perezosa del dataset en execute():
+      - Un análisis de vector no abre el CSV y lo deja registrado en metrics
+      - Un adaptador con uses_dataset recibe el DataFrame y se mide dataset_load
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.model_path = os.path.join(self.tmpdir.name, 'm.joblib')
+        with open(self.model_path, 'wb') as f:
+            f.write(b'model')
+        self.dataset_path = os.path.join(self.tmpdir.name, 'ds.csv')
+        with open(self.dataset_path, 'w') as f:
+            f.write('a,b\n1,2\n3,4\n5,6\n')
+
+    def run_execute(self, adapter):
+        with mock.patch.dict('analysis.ml_inference.ADAPTERS', {'sklearn': adapter}):
+            return ml_inference.execute(
+                self.model_path, 'sklearn', self.dataset_path, {'inputs': [[7.0]]}, analysis_id=1,
+            )
+
+    def test_vector_analysis_does_not_read_the_dataset(self):
+        adapter = VectorAdapter()
+        with mock.patch('analysis.ml_inference.load_dataset') as load_dataset:
+            metrics, _ = self.run_execute(adapter)
+
+        load_dataset.assert_not_called()
+        self.assertFalse(metrics['dataset_loaded'])
+        self.assertNotIn('dataset_load_ms', metrics['timings'])
+        self.assertEqual(adapter.params, {})
+
+    def test_adapter_using_dataset_receives_it(self):
+        metrics, out_path = self.run_execute(DatasetAdapter())
+
+        self.assertTrue(metrics['dataset_loaded'])
+        self.assertIn('dataset_load_ms', metrics['timings'])
+        self.assertEqual(metrics['samples'], 1)
+        self.assertTrue(os.path.exists(out_path))
+
+    def test_missing_dataset_only_fails_when_used(self):
+        os.remove(self.dataset_path)
+
+        metrics, _ = self.run_execute(VectorAdapter())
+        self.assertFalse(metrics['dataset_loaded'])
+
+        with self.assertRaises(FileNotFoundError):
+            self.run_execute(DatasetAdapter())
@@ -0,0 +1,108 @@
+import tempfile
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from analysis import circuit_breaker
+from analysis.metrics_exporter import Collector, collector, metrics_cache, render
+from analysis.model_cache import model_cache
+from analysis.models import MLModel, AnalysisResult
+from analysis.tasks import launch_analysis_task, collect_metrics_task
+from datasets.models import MetaData
+
+User = get_user_model()
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+class EchoAdapter:
+    uses_dataset = False
+
+    def load(self, file_obj):
+        return object()
+
+    def predict(self, model, data, **params):
+        return [row[0] for row in data]
+
+
+class RenderTests(SimpleTestCase):
+    def test_histograms_are_cumulative_and_summed_across_processes(self):
+        first, second = Collector(), Collector()
+        first.observe_analysis({'timings': {'predict_ms': 3.0}}, 'sklearn')
+        second.observe_analysis({'timings': {'predict_ms': 700.0}}, 'sklearn')
+
+        text = render([first.snapshot(), second.snapshot()])
+
+        self.assertIn('# TYPE analysis_stage_seconds histogram', text)
+        self.assertIn('analysis_stage_seconds_bucket{framework="sklearn",stage="predict",le="0.005"} 1', text)
+        self.assertIn('analysis_stage_seconds_bucket{framework="sklearn",stage="predict",le="+Inf"} 2', text)
+        self.assertIn('analysis_stage_seconds_count{framework="sklearn",stage="predict"} 2', text)
+        self.assertIn('metrics_processes 2', text)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, ANALYSIS_METRICS_FLUSH_SECONDS=0, ANALYSIS_METRICS_TOKEN='',
+                   ANALYSIS_METRICS_PUBLIC=True, ANALYSIS_BREAKER_MAX_FAILURES=2)
+class MetricsEndpointTests(TestCase):
+    """
+    Pruebas de /metrics:
+      - Expone etapas de los análisis, gauges de estado y breakers
+      - El scrape no consulta la BD
+      - Con ANALYSIS_METRICS_TOKEN exige el bearer token; sin token ni PUBLIC, 401
+      - Leer los breakers no registra breakers con la configuración por defecto
+    """
+
+    def setUp(self):
+        caches['default'].clear()
+        metrics_cache().clear()
+        caches['predictions'].clear()
+        collector.reset()
+        model_cache.clear()
+        self.user = User.objects.create_user(username='metrics', email='m@example.com', password='pass1234')
+        dataset = MetaData.objects.create(
+            owner=self.user, name='ds',
+            file=SimpleUploadedFile('ds.csv', b'a\n1\n', content_type='text/csv'),
+        )
+        self.mlmodel = MLModel.objects.create(
+            name='m', version='1', framework='sklearn', owner=self.user,
+            file=SimpleUploadedFile('m.joblib', b'model'),
+        )
+        mock.patch.dict('analysis.ml_inference.ADAPTERS', {'sklearn': EchoAdapter()}).start()
+        self.addCleanup(mock.patch.stopall)
+        analysis = AnalysisResult.objects.create(dataset=dataset, model=self.mlmodel, parameters={'vector_2d': [[1.0]]})
+        launch_analysis_task(analysis.pk)
+        AnalysisResult.objects.create(dataset=dataset, model=self.mlmodel, parameters={'vector_2d': [[2.0]]})
+
+    def test_scrape_exposes_collected_metrics_without_queries(self):
+        collect_metrics_task()
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('metrics'))
+
+        self.assertEqual(response.status_code, 200)
+        text = response.content.decode()
+        self.assertIn('analysis_results{status="SUCCESS"} 1', text)
+        self.assertIn('analysis_results{status="PENDING"} 1', text)
+        self.assertIn(f'circuit_breaker_state{{breaker="model:{self.mlmodel.pk}"}} 0', text)
+        self.assertIn('analysis_completed_total{cache_hit="False",framework="sklearn",status="SUCCESS"} 1.0', text)
+        self.assertIn('analysis_stage_seconds_count{framework="sklearn",stage="predict"} 1', text)
+        # Contador acumulado del proceso: no se reinicia entre pruebas
+        self.assertIn(f"model_cache_misses_total {float(model_cache.stats()['misses'])}", text)
+
+    @override_settings(ANALYSIS_METRICS_TOKEN='secreto')
+    def test_token_is_required_when_configured(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secreto')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(ANALYSIS_METRICS_PUBLIC=False)
+    def test_unconfigured_token_closes_the_endpoint(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+
+    def test_settings_configure_collected_breakers(self):
+        circuit_breaker._breakers.clear()
+
+        collect_metrics_task()
+
+        self.assertEqual(circuit_breaker.breaker_for_model(self.mlmodel.pk).max_failures, 2)
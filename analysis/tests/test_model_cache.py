@@ -0,0 +1,97 @@
+import os
+import tempfile
+from django.test import SimpleTestCase
+
+from analysis.model_cache import ModelCache
+
+
+class FakeAdapter:
+    """Adaptador mínimo que cuenta cuántas veces se deserializa el modelo."""
+
+    def __init__(self):
+        self.loads = 0
+
+    def load(self, file_obj):
+        self.loads += 1
+        return {"payload": file_obj.read()}
+
+
+class ModelCacheTests(SimpleTestCase):
+    """
+    Pruebas de la cache LRU de modelos:
+      - Hit/miss y contadores
+      - Expulsión por número de entradas y por memoria estimada
+      - Invalidación al cambiar el archivo del modelo
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.adapter = FakeAdapter()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _make_model_file(self, name, size=10):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, 'wb') as f:
+            f.write(b'x' * size)
+        return path
+
+    def test_second_call_is_a_hit(self):
+        """La segunda carga del mismo archivo no vuelve a llamar adapter.load()."""
+        cache = ModelCache(max_entries=4, max_bytes=1024)
+        path = self._make_model_file('m1.joblib')
+
+        _, hit1 = cache.get_or_load(1, path, self.adapter)
+        _, hit2 = cache.get_or_load(1, path, self.adapter)
+
+        self.assertFalse(hit1)
+        self.assertTrue(hit2)
+        self.assertEqual(self.adapter.loads, 1)
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_evicts_by_entry_count(self):
+        """Con max_entries=2 el modelo menos usado sale al cargar un tercero."""
+        cache = ModelCache(max_entries=2, max_bytes=1024)
+        paths = [self._make_model_file(f'm{i}.joblib') for i in range(3)]
+
+        for i, path in enumerate(paths):
+            cache.get_or_load(i, path, self.adapter)
+
+        self.assertFalse(cache.peek(0, paths[0]))
+        self.assertTrue(cache.peek(2, paths[2]))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_evicts_by_estimated_bytes(self):
+        """La suma de tamaños estimados nunca supera max_bytes."""
+        cache = ModelCache(max_entries=10, max_bytes=150)
+        small = self._make_model_file('small.joblib', size=100)
+        big = self._make_model_file('big.joblib', size=100)
+
+        cache.get_or_load(1, small, self.adapter)
+        cache.get_or_load(2, big, self.adapter)
+
+        self.assertLessEqual(cache.stats()["bytes"], 150)
+        self.assertFalse(cache.peek(1, small))
+
+    def test_new_file_replaces_old_entry(self):
+        """Un archivo nuevo para el mismo MLModel fuerza recarga y descarta el viejo."""
+        cache = ModelCache(max_entries=4, max_bytes=1024)
+        path = self._make_model_file('m1.joblib', size=10)
+        cache.get_or_load(1, path, self.adapter)
+
+        self._make_model_file('m1.joblib', size=20)
+        _, hit = cache.get_or_load(1, path, self.adapter)
+
+        self.assertFalse(hit)
+        self.assertEqual(cache.stats()["entries"], 1)
+
+    def test_invalidate(self):
+        cache = ModelCache(max_entries=4, max_bytes=1024)
+        path = self._make_model_file('m1.joblib')
+        cache.get_or_load(1, path, self.adapter)
+
+        cache.invalidate(1)
+
+        self.assertFalse(cache.peek(1, path))
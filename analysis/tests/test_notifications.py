@@ -0,0 +1,98 @@
+import tempfile
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from analysis import notifications
+from analysis.model_cache import model_cache
+from analysis.models import MLModel, AnalysisResult
+from analysis.tasks import launch_analysis_task
+from datasets.models import MetaData
+
+User = get_user_model()
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+class DoubleAdapter:
+    """Adaptador de prueba: duplica la primera columna."""
+    uses_dataset = False
+
+    def load(self, file_obj):
+        return object()
+
+    def predict(self, model, data, **params):
+        return [row[0] * 2 for row in data]
+
+
+class PublishTests(SimpleTestCase):
+    def test_channel_layer_errors_do_not_propagate(self):
+        layer = mock.Mock()
+        layer.group_send = mock.AsyncMock(side_effect=ConnectionError("redis caído"))
+        with mock.patch.object(notifications, 'get_channel_layer', return_value=layer):
+            self.assertFalse(notifications.publish(1, {'status': 'RUNNING'}))
+
+    def test_sends_to_the_consumer_handler(self):
+        layer = mock.Mock()
+        layer.group_send = mock.AsyncMock()
+        with mock.patch.object(notifications, 'get_channel_layer', return_value=layer):
+            self.assertTrue(notifications.publish(5, {'status': 'RUNNING'}))
+
+        layer.group_send.assert_awaited_once_with(
+            'user_5', {'type': 'send_notification', 'message': {'status': 'RUNNING'}}
+        )
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class AnalysisNotificationTests(TestCase):
+    """
+    launch_analysis_task publica RUNNING y luego SUCCESS/FAILURE en el grupo
+    del dueño del dataset, con un resumen del resultado.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='notify', email='n@example.com', password='pass1234')
+        self.dataset = MetaData.objects.create(
+            owner=self.user, name='ds',
+            file=SimpleUploadedFile('ds.csv', b'a\n1\n', content_type='text/csv'),
+        )
+        self.mlmodel = MLModel.objects.create(
+            name='m', version='1', framework='sklearn', owner=self.user,
+            file=SimpleUploadedFile('m.joblib', b'model'),
+        )
+        mock.patch.dict('analysis.ml_inference.ADAPTERS', {'sklearn': DoubleAdapter()}).start()
+        self.publish = mock.patch.object(notifications, 'publish').start()
+        self.addCleanup(mock.patch.stopall)
+        caches['predictions'].clear()
+        model_cache.clear()
+
+    def launch(self, vector):
+        analysis = AnalysisResult.objects.create(
+            dataset=self.dataset, model=self.mlmodel, parameters={'vector_2d': vector},
+        )
+        launch_analysis_task(analysis.pk)
+        return analysis
+
+    def messages(self):
+        return [c.args for c in self.publish.call_args_list]
+
+    def test_running_then_success_with_summary(self):
+        analysis = self.launch([[1.0]])
+
+        (user_running, running), (user_done, done) = self.messages()
+        self.assertEqual((user_running, user_done), (self.user.pk, self.user.pk))
+        self.assertEqual(running['status'], 'RUNNING')
+        self.assertEqual(done['status'], 'SUCCESS')
+        self.assertEqual(done['analysis_id'], analysis.pk)
+        self.assertEqual(done['summary']['url'], f"/api/v1/analysis/{analysis.pk}/")
+        self.assertIsNotNone(done['summary']['total_ms'])
+
+    def test_failure_carries_the_error(self):
+        with mock.patch.object(DoubleAdapter, 'predict', side_effect=ValueError("entrada inválida")):
+            with self.assertRaises(RuntimeError):
+                self.launch([[1.0]])
+
+        _, done = self.messages()[-1]
+        self.assertEqual(done['status'], 'FAILURE')
+        self.assertIn('entrada inválida', done['error'])
@@ -0,0 +1,94 @@
+import io
+import os
+import tempfile
+from unittest import mock
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+
+try:
+    import onnx
+    from onnx import helper, TensorProto, numpy_helper
+    import onnxruntime  # noqa: F401
+except ImportError:  # pragma: no cover
+    onnx = None
+
+from analysis.adapters import ADAPTERS
+
+WEIGHTS = np.array([[1.0, 0.0], [0.0, 1.0], [1.0, 1.0]], dtype=np.float32)
+
+
+def linear_model_bytes():
+    """y = x @ W con x: float32[N, 3] → y: float32[N, 2]."""
+    graph = helper.make_graph(
+        [helper.make_node('MatMul', ['x', 'W'], ['y'])],
+        'linear',
+        [helper.make_tensor_value_info('x', TensorProto.FLOAT, ['N', 3])],
+        [helper.make_tensor_value_info('y', TensorProto.FLOAT, ['N', 2])],
+        initializer=[numpy_helper.from_array(WEIGHTS, 'W')],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 13)])
+    model.ir_version = 8
+    return model.SerializeToString()
+
+
+@override_settings(ANALYSIS_ONNX_CACHE_DIR=tempfile.mkdtemp(), ANALYSIS_NUMPY_OUTPUT_MIN_ROWS=4)
+class OnnxSessionTests(SimpleTestCase):
+    """
+    Pruebas del camino ONNX:
+      - El modelo optimizado se guarda en disco y se reutiliza
+      - Los inputs (listas, enteros, una sola fila) se convierten a float32[N, 3]
+      - El buffer de salida reutilizado no se filtra entre llamadas
+    """
+
+    def setUp(self):
+        if onnx is None:
+            self.skipTest('onnx/onnxruntime no instalados')
+        self.adapter = ADAPTERS['onnx']
+        self.model_bytes = linear_model_bytes()
+
+    def load(self):
+        return self.adapter.load(io.BytesIO(self.model_bytes))
+
+    def test_optimized_model_is_cached_on_disk(self):
+        from django.conf import settings
+        self.load()
+        cached = os.listdir(settings.ANALYSIS_ONNX_CACHE_DIR)
+        self.assertEqual(len([f for f in cached if f.endswith('.onnx')]), 1)
+
+        session = self.load()
+        self.assertEqual(self.adapter.predict(session, [[1, 2, 3]]), [[4.0, 5.0]])
+
+    def test_cached_graph_is_portable_and_session_uses_all(self):
+        import onnxruntime as ort
+        from analysis.onnx_session import build_session
+        levels = []
+        real = ort.InferenceSession
+
+        def spy(path_or_bytes, sess_options=None, **kwargs):
+            levels.append((isinstance(path_or_bytes, str), sess_options.graph_optimization_level))
+            return real(path_or_bytes, sess_options=sess_options, **kwargs)
+
+        with override_settings(ANALYSIS_ONNX_CACHE_DIR=tempfile.mkdtemp()), \
+                mock.patch.object(ort, 'InferenceSession', side_effect=spy):
+            build_session(ort, self.model_bytes)
+            build_session(ort, self.model_bytes)
+
+        ALL, EXTENDED = ort.GraphOptimizationLevel.ORT_ENABLE_ALL, ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED
+        # Primera carga: guarda EXTENDED y abre el archivo con ALL; segunda: solo lo abre
+        self.assertEqual(levels, [(False, EXTENDED), (True, ALL), (True, ALL)])
+
+    def test_inputs_are_converted_and_reshaped(self):
+        session = self.load()
+        self.assertEqual(self.adapter.predict(session, [1, 2, 3]), [[4.0, 5.0]])
+        self.assertEqual(session.prepare([[1, 2, 3]]).dtype, np.float32)
+
+    def test_reused_output_buffer_is_not_shared(self):
+        session = self.load()
+        rows = np.arange(12, dtype=np.float64).reshape(4, 3)
+
+        first = self.adapter.predict(session, rows)
+        second = self.adapter.predict(session, rows + 1)
+
+        self.assertIsInstance(first, np.ndarray)
+        np.testing.assert_allclose(first, rows @ WEIGHTS)
+        np.testing.assert_allclose(second, (rows + 1) @ WEIGHTS)
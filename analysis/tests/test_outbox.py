@@ -0,0 +1,140 @@
+from datetime import timedelta
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from analysis import outbox
+from analysis.models import MLModel, HyperparameterDefinition, AnalysisResult, AnalysisOutbox
+from datasets.models import MetaData
+
+User = get_user_model()
+
+
+class OutboxFixture:
+    def setUp(self):
+        self.user = User.objects.create_user(username='outbox', email='o@example.com', password='pass1234')
+        self.dataset = MetaData.objects.create(owner=self.user, name='ds', file='ds.csv')
+        self.mlmodel = MLModel.objects.create(name='m', version='1', framework='sklearn', owner=self.user, file='m.joblib')
+
+
+class OutboxEnqueueTests(OutboxFixture, APITestCase):
+    """POST /api/v1/analysis/ escribe análisis y outbox juntos y no toca el broker."""
+
+    def setUp(self):
+        super().setUp()
+        HyperparameterDefinition.objects.create(model=self.mlmodel, position=1, key_hint='x', dtype='float')
+        self.client.force_authenticate(user=self.user)
+        self.payload = {'model': self.mlmodel.pk, 'dataset': self.dataset.pk, 'param_1': '1.0'}
+
+    def test_create_writes_outbox_row_without_publishing(self):
+        with mock.patch('analysis.tasks.launch_analysis_task.apply_async') as apply_async:
+            response = self.client.post(reverse('analysis-list'), self.payload, format='json')
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(AnalysisOutbox.objects.get().analysis_id, response.data['id'])
+        apply_async.assert_not_called()
+
+    def test_outbox_failure_rolls_back_the_analysis(self):
+        with mock.patch.object(outbox, 'enqueue', side_effect=RuntimeError("bd")):
+            with self.assertRaises(RuntimeError):
+                self.client.post(reverse('analysis-list'), self.payload, format='json')
+
+        self.assertFalse(AnalysisResult.objects.exists())
+
+
+class DispatchPendingTests(OutboxFixture, TestCase):
+    """
+    Pruebas del dispatcher:
+      - Publica un lote por una sola conexión y lo marca como publicado
+      - Si el broker falla corta el lote y deja la fila con el error
+      - Los RUNNING de un worker caído vuelven a PENDING y al outbox
+      - Elige la cola de afinidad y la registra; las de nodos caídos se republican
+      - Vencido el TTL, un análisis aún PENDING se republica y uno terminado se borra
+    """
+
+    def setUp(self):
+        super().setUp()
+        for _ in range(3):
+            outbox.enqueue(AnalysisResult.objects.create(dataset=self.dataset, model=self.mlmodel, parameters={}))
+        app = mock.patch('analysis.outbox.current_app').start()
+        self.producer = app.producer_or_acquire.return_value.__enter__.return_value
+        self.apply_async = mock.patch('analysis.tasks.launch_analysis_task.apply_async').start()
+        self.addCleanup(mock.patch.stopall)
+
+    def pending(self):
+        return AnalysisOutbox.objects.filter(dispatched_at__isnull=True).order_by('id')
+
+    def test_publishes_a_batch_over_one_producer(self):
+        self.assertEqual(outbox.dispatch_pending(batch_size=2), 2)
+
+        self.assertEqual(self.pending().count(), 1)
+        self.assertEqual({c.kwargs['producer'] for c in self.apply_async.call_args_list}, {self.producer})
+        self.assertEqual(outbox.drain(), 1)
+        self.assertFalse(self.pending().exists())
+
+    def test_broker_failure_keeps_the_row(self):
+        self.apply_async.side_effect = [None, ConnectionError("broker caído")]
+
+        self.assertEqual(outbox.dispatch_pending(), 1)
+
+        pending = list(self.pending())
+        self.assertEqual(len(pending), 2)
+        self.assertEqual(pending[0].attempts, 1)
+        self.assertIn("broker caído", pending[0].last_error)
+
+    def test_requeue_stale_running(self):
+        self.assertEqual(outbox.dispatch_pending(), 3)
+        stale, fresh = AnalysisResult.objects.order_by('id')[:2]
+        AnalysisResult.objects.filter(pk__in=[stale.pk, fresh.pk]).update(status='RUNNING')
+        AnalysisResult.objects.filter(pk=stale.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(outbox.requeue_stale(), 1)
+
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, 'PENDING')
+        self.assertEqual([row.analysis_id for row in self.pending()], [stale.pk])
+        self.assertEqual(AnalysisResult.objects.get(pk=fresh.pk).status, 'RUNNING')
+
+    def test_routes_with_kwargs_and_records_queue(self):
+        queues = ['analysis.w1@host', 'analysis.w2@host']
+        with mock.patch('analysis.routing.route_for', side_effect=lambda m, fw, a: queues[a % 2]) as route_for:
+            self.assertEqual(outbox.dispatch_pending(), 3)
+
+        route_for.assert_called_with(self.mlmodel.pk, 'sklearn', mock.ANY)
+        for call in self.apply_async.call_args_list:
+            analysis_id = call.args[0][0]
+            self.assertEqual(call.args[1], {'model_id': self.mlmodel.pk, 'framework': 'sklearn'})
+            self.assertEqual(call.kwargs['queue'], queues[analysis_id % 2])
+            self.assertEqual(AnalysisOutbox.objects.get(analysis_id=analysis_id).queue, queues[analysis_id % 2])
+
+    def test_requeue_stranded_republishes_dead_node_queues(self):
+        self.assertEqual(outbox.dispatch_pending(), 3)
+        dead, live, running = AnalysisOutbox.objects.order_by('id')
+        AnalysisOutbox.objects.filter(pk__in=[dead.pk, running.pk]).update(queue='analysis.dead@host')
+        AnalysisOutbox.objects.filter(pk=live.pk).update(queue='analysis.live@host')
+        AnalysisResult.objects.filter(pk=running.analysis_id).update(status='RUNNING')
+
+        with mock.patch('analysis.routing.live_queues', return_value=['analysis.live@host']):
+            self.assertEqual(outbox.requeue_stranded(), 1)
+        with mock.patch('analysis.routing.live_queues', return_value=[]):
+            self.assertEqual(outbox.requeue_stranded(), 0)
+
+        self.assertEqual([row.pk for row in self.pending()], [dead.pk])
+        self.assertEqual(self.pending().get().queue, '')
+
+    def test_expired_pending_rows_are_republished(self):
+        self.assertEqual(outbox.dispatch_pending(), 3)
+        pending, running, done = AnalysisOutbox.objects.order_by('id')
+        AnalysisResult.objects.filter(pk=running.analysis_id).update(status='RUNNING')
+        AnalysisResult.objects.filter(pk=done.analysis_id).update(status='SUCCESS')
+        AnalysisOutbox.objects.update(dispatched_at=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(outbox.release_finished(), 2)
+
+        self.assertEqual([row.pk for row in self.pending()], [pending.pk])
+        self.assertEqual(set(AnalysisOutbox.objects.values_list('pk', flat=True)), {pending.pk, running.pk})
+        self.assertEqual(outbox.dispatch_pending(), 1)
+        self.assertEqual(self.apply_async.call_args.args[0], (pending.analysis_id,))
@@ -0,0 +1,119 @@
+import hashlib
+import tempfile
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from analysis.models import MLModel, HyperparameterDefinition, AnalysisResult, AnalysisOutbox
+from analysis.prediction_cache import prediction_cache, vector_hash
+from analysis.result_store import read_predictions
+from analysis.tasks import launch_analysis_task
+from datasets.models import MetaData
+
+User = get_user_model()
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+class CountingAdapter:
+    """Adaptador de prueba: duplica la primera columna y cuenta los predict."""
+    uses_dataset = False
+
+    def __init__(self):
+        self.calls = 0
+
+    def load(self, file_obj):
+        return object()
+
+    def predict(self, model, data, **params):
+        self.calls += 1
+        return [row[0] * 2 for row in data]
+
+
+class VectorHashTests(TestCase):
+    def test_numeric_vectors_are_canonical(self):
+        self.assertEqual(vector_hash([[1, 2]]), vector_hash([[1.0, 2.0]]))
+        self.assertNotEqual(vector_hash([[1, 2]]), vector_hash([[2, 1]]))
+        self.assertNotEqual(vector_hash([[1, 2]]), vector_hash([[1], [2]]))
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class PredictionCacheTests(APITestCase):
+    """
+    Pruebas de la cache de predicciones:
+      - Un vector repetido se responde en create sin encolar la tarea
+      - La tarea cierra el análisis desde la cache sin ejecutar predict
+      - Un archivo de modelo nuevo no reutiliza predicciones viejas
+      - El hash del archivo se calcula al subirlo, no en cada búsqueda
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='pc', email='pc@example.com', password='pass1234')
+        self.client.force_authenticate(user=self.user)
+        self.dataset = MetaData.objects.create(
+            owner=self.user, name='ds',
+            file=SimpleUploadedFile('ds.csv', b'a\n1\n', content_type='text/csv'),
+        )
+        self.mlmodel = MLModel.objects.create(
+            name='m', version='1', framework='sklearn', owner=self.user,
+            file=SimpleUploadedFile('m.joblib', b'model-v1'),
+        )
+        HyperparameterDefinition.objects.create(model=self.mlmodel, position=1, key_hint='x', dtype='float')
+        self.payload = {'model': self.mlmodel.pk, 'dataset': self.dataset.pk, 'param_1': '3'}
+        self.adapter = CountingAdapter()
+        for target in ('analysis.ml_inference.ADAPTERS', 'analysis.sync_inference.ADAPTERS'):
+            mock.patch.dict(target, {'sklearn': self.adapter}).start()
+        self.addCleanup(mock.patch.stopall)
+        caches['predictions'].clear()
+
+    def launch(self):
+        analysis = AnalysisResult.objects.create(
+            dataset=self.dataset, model=self.mlmodel, parameters={'vector_2d': [[3.0]]},
+        )
+        launch_analysis_task(analysis.pk)
+        analysis.refresh_from_db()
+        return analysis
+
+    def test_repeated_vector_skips_the_broker(self):
+        with mock.patch('analysis.prediction_cache.file_sha256') as rehash:
+            first = self.launch()
+            self.assertEqual(first.status, 'SUCCESS')
+
+            response = self.client.post(reverse('analysis-list'), self.payload, format='json')
+        rehash.assert_not_called()
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['predictions'], [6.0])
+        self.assertTrue(response.data['metrics']['cache_hit'])
+        self.assertFalse(AnalysisOutbox.objects.exists())
+        self.assertEqual(self.adapter.calls, 1)
+
+    def test_task_completes_from_cache(self):
+        self.launch()
+        second = self.launch()
+
+        self.assertEqual(self.adapter.calls, 1)
+        self.assertEqual(second.status, 'SUCCESS')
+        self.assertTrue(second.metrics['cache_hit'])
+        self.assertEqual(read_predictions(second.output_path), [6.0])
+
+    def test_new_model_file_invalidates_entries(self):
+        self.launch()
+        self.mlmodel.file = SimpleUploadedFile('m.joblib', b'model-v2')
+        self.mlmodel.save()
+
+        self.assertIsNone(prediction_cache.lookup(self.mlmodel.pk, self.mlmodel.file.path, [[3.0]]))
+        self.launch()
+        self.assertEqual(self.adapter.calls, 2)
+
+    def test_upload_records_file_hash(self):
+        self.assertEqual(self.mlmodel.file_sha256, hashlib.sha256(b'model-v1').hexdigest())
+
+        self.mlmodel.file = SimpleUploadedFile('m.joblib', b'model-v2')
+        self.mlmodel.save()
+        self.mlmodel.refresh_from_db()
+        self.assertEqual(self.mlmodel.file_sha256, hashlib.sha256(b'model-v2').hexdigest())
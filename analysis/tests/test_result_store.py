@@ -0,0 +1,68 @@
+import json
+import os
+import tempfile
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+
+from analysis.result_store import (
+    PredictionWriter, write_predictions, read_predictions, count_predictions, read_page,
+    iter_json_chunks, merge_parts,
+)
+
+
+class ResultStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def base(self, name):
+        return os.path.join(self.tmpdir.name, name)
+
+    def test_numeric_chunks_are_written_as_npy(self):
+        with PredictionWriter(self.base('out'), fmt='npy') as writer:
+            writer.append([[0.1, 0.9], [0.4, 0.6]])
+            writer.append(np.array([[0.7, 0.3]]))
+
+        self.assertTrue(writer.out_path.endswith('.npy'))
+        self.assertEqual(np.load(writer.out_path).shape, (3, 2))
+        self.assertEqual(count_predictions(writer.out_path), 3)
+        self.assertEqual(read_predictions(writer.out_path, 1, 2), [[0.4, 0.6]])
+        self.assertFalse(os.path.exists(writer.out_path + '.tmp'))
+
+    def test_read_page_returns_slice_and_total(self):
+        npy_path = write_predictions(list(range(10)), self.base('page'), fmt='npy')
+        json_path = write_predictions(['a', 'b', 'c'], self.base('page_labels'))
+
+        self.assertEqual(read_page(npy_path, 2, 5), ([2, 3, 4], 10))
+        self.assertEqual(read_page(json_path, 1), (['b', 'c'], 3))
+
+    def test_labels_fall_back_to_json(self):
+        out_path = write_predictions(['benigno', 'maligno'], self.base('labels'), fmt='npy')
+
+        self.assertTrue(out_path.endswith('.json'))
+        self.assertEqual(read_predictions(out_path), ['benigno', 'maligno'])
+
+    @override_settings(ANALYSIS_RESULT_FORMAT='json')
+    def test_json_format_setting(self):
+        out_path = write_predictions([1, 2, 3], self.base('legacy'))
+
+        self.assertTrue(out_path.endswith('.json'))
+
+    def test_json_export_of_npy_matches_values(self):
+        out_path = write_predictions(list(range(7)), self.base('export'))
+
+        body = ''.join(iter_json_chunks(out_path, chunk_rows=3))
+
+        self.assertEqual(json.loads(body), list(range(7)))
+
+    def test_merge_skips_empty_parts(self):
+        parts = [
+            write_predictions([1, 2], self.base('p0')),
+            write_predictions([], self.base('p1')),
+            write_predictions([3], self.base('p2')),
+        ]
+
+        out_path = merge_parts(parts, self.base('merged'))
+
+        self.assertEqual(read_predictions(out_path), [1, 2, 3])
+        self.assertFalse(any(os.path.exists(p) for p in parts))
@@ -0,0 +1,75 @@
+import tempfile
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+
+from analysis.models import MLModel, AnalysisResult
+from analysis.routing import (
+    AffinityRouter, affinity_cache, pick_queue, rank_queues, live_queues, LIVE_QUEUES_KEY,
+)
+from datasets.models import MetaData
+
+User = get_user_model()
+QUEUES = [f'analysis.w{i}@host' for i in range(8)]
+
+
+class RendezvousTests(TestCase):
+    def test_same_model_same_queue(self):
+        self.assertEqual(pick_queue(1, 'sklearn', queues=QUEUES), pick_queue(1, 'sklearn', queues=list(reversed(QUEUES))))
+
+    def test_only_models_of_removed_queue_move(self):
+        before = {m: pick_queue(m, 'sklearn', queues=QUEUES) for m in range(200)}
+        after = {m: pick_queue(m, 'sklearn', queues=QUEUES[1:]) for m in range(200)}
+
+        moved = {m for m in before if before[m] != after[m]}
+        self.assertEqual(moved, {m for m in before if before[m] == QUEUES[0]})
+
+    def test_models_spread_across_queues(self):
+        used = {rank_queues(f'model:{m}', QUEUES)[0] for m in range(200)}
+        self.assertEqual(used, set(QUEUES))
+
+    def test_no_live_queues_means_default(self):
+        self.assertIsNone(pick_queue(1, 'sklearn', queues=[]))
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), ANALYSIS_AFFINITY_ENABLED=True)
+class AffinityRouterTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='r', email='r@example.com', password='pass1234')
+        dataset = MetaData.objects.create(
+            owner=user, name='ds', file=SimpleUploadedFile('ds.csv', b'a\n1\n', content_type='text/csv'),
+        )
+        mlmodel = MLModel.objects.create(
+            name='m', version='1', framework='sklearn', owner=user, file=SimpleUploadedFile('m.joblib', b'model'),
+        )
+        self.analysis = AnalysisResult.objects.create(dataset=dataset, model=mlmodel, parameters={})
+        self.router = AffinityRouter()
+        self.cache = affinity_cache()
+        self.cache.delete(LIVE_QUEUES_KEY)
+        self.addCleanup(self.cache.delete, LIVE_QUEUES_KEY)
+
+    def test_routes_launch_task_to_model_queue_without_queries(self):
+        self.cache.set(LIVE_QUEUES_KEY, QUEUES)
+        kwargs = {'model_id': self.analysis.model_id, 'framework': 'sklearn'}
+
+        with self.assertNumQueries(0):
+            route = self.router('analysis.tasks.launch_analysis_task', [self.analysis.pk], kwargs, {})
+
+        self.assertEqual(route, {'queue': pick_queue(self.analysis.model_id, 'sklearn', queues=QUEUES)})
+        self.assertIsNone(self.router('analysis.tasks.merge_shards_task', [self.analysis.pk], kwargs, {}))
+
+    def test_without_routing_kwargs_uses_default_queue(self):
+        self.cache.set(LIVE_QUEUES_KEY, QUEUES)
+
+        with self.assertNumQueries(0):
+            self.assertIsNone(self.router('analysis.tasks.launch_analysis_task', [self.analysis.pk], {}, {}))
+
+    def test_live_queues_are_discovered_and_cached(self):
+        replies = {'w1@host': [{'name': 'celery'}, {'name': 'analysis.w1@host'}]}
+        with mock.patch('analysis.routing.current_app') as app:
+            app.control.inspect.return_value.active_queues.return_value = replies
+            self.assertEqual(live_queues(), ['analysis.w1@host'])
+            live_queues()
+
+        app.control.inspect.assert_called_once()
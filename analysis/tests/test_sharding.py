@@ -0,0 +1,120 @@
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from analysis.ml_inference import execute_shard
+from analysis.sharding import plan_shards
+from analysis.result_store import merge_parts, read_predictions, write_predictions
+from analysis.models import MLModel, AnalysisResult, AnalysisShard
+from analysis.tasks import merge_shards_task
+from datasets.models import MetaData
+
+
+class FirstColumnAdapter:
+    """Adaptador de prueba: devuelve la primera columna de cada fila."""
+    uses_dataset = False
+
+    def load(self, file_obj):
+        return object()
+
+    def predict(self, model, data, **params):
+        return [int(row[0]) for row in data]
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ShardingTests(SimpleTestCase):
+    """
+    Pruebas de la puntuación por shards:
+      - Los rangos cubren todas las filas y se cortan en saltos de línea
+      - Puntuar cada shard y fusionar da el mismo resultado que una sola pasada
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.csv_path = os.path.join(self.tmpdir.name, 'data.csv')
+        with open(self.csv_path, 'w') as f:
+            f.write('a,b\n')
+            f.writelines(f'{i},{i * 3}\n' for i in range(1000))
+        self.model_path = os.path.join(self.tmpdir.name, 'model.joblib')
+        with open(self.model_path, 'wb') as f:
+            f.write(b'model')
+
+    def test_ranges_are_line_aligned_and_contiguous(self):
+        ranges = plan_shards(self.csv_path, shard_bytes=500)
+
+        self.assertGreater(len(ranges), 1)
+        self.assertEqual(ranges[-1][1], os.path.getsize(self.csv_path))
+        with open(self.csv_path, 'rb') as f:
+            data = f.read()
+        for (start, end), (next_start, _) in zip(ranges, ranges[1:]):
+            self.assertEqual(end, next_start)
+            self.assertEqual(data[end - 1:end], b'\n')
+
+    def test_sharded_scoring_matches_single_pass(self):
+        ranges = plan_shards(self.csv_path, shard_bytes=700)
+        parts = []
+        with mock.patch.dict('analysis.ml_inference.ADAPTERS', {'sklearn': FirstColumnAdapter()}):
+            for i, (start, end) in enumerate(ranges):
+                _, part, timings = execute_shard(
+                    model_path=self.model_path, framework='sklearn', dataset_path=self.csv_path,
+                    analysis_id=3, shard_index=i, start_byte=start, end_byte=end, chunksize=64,
+                )
+                parts.append(part)
+                self.assertEqual(
+                    {'model_load_ms', 'dataset_load_ms', 'predict_ms', 'result_write_ms', 'model_cache_hit'}, set(timings),
+                )
+
+        out_path = merge_parts(parts, os.path.join(self.tmpdir.name, 'merged'))
+
+        self.assertTrue(out_path.endswith('.npy'))
+        self.assertEqual(read_predictions(out_path), list(range(1000)))
+        self.assertFalse(any(os.path.exists(p) for p in parts))
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class MergeShardsTaskTests(TestCase):
+    """
+    Al fusionar, las etapas de los shards se suman en metrics['timings'], se
+    agregan la espera en cola, el total y el worker, y el análisis se
+    registra en el collector de /metrics.
+    """
+
+    def test_merge_sums_shard_timings(self):
+        user = get_user_model().objects.create_user(username='s', email='s@example.com', password='pass1234')
+        dataset = MetaData.objects.create(owner=user, name='ds', file='ds.csv')
+        mlmodel = MLModel.objects.create(name='m', version='1', framework='sklearn', owner=user, file='m.joblib')
+        analysis = AnalysisResult.objects.create(dataset=dataset, model=mlmodel, parameters={}, status='RUNNING')
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        for index in range(2):
+            AnalysisShard.objects.create(
+                analysis=analysis, index=index, start_byte=0, end_byte=1, status='SUCCESS', rows=2,
+                output_path=write_predictions([index, index], os.path.join(tmpdir.name, f'part{index}')),
+                timings={'dataset_load_ms': 1.0, 'predict_ms': 2.5, 'result_write_ms': 0.5,
+                         'model_cache_hit': bool(index)},
+            )
+        created_at = timezone.now() - timedelta(seconds=5)
+        AnalysisResult.objects.filter(pk=analysis.pk).update(created_at=created_at)
+        started_at = created_at + timedelta(seconds=2)
+
+        with mock.patch('analysis.tasks.collector.observe_analysis') as observe:
+            merge_shards_task(analysis.pk, started_at.isoformat())
+
+        analysis.refresh_from_db()
+        timings = analysis.metrics['timings']
+        self.assertEqual(analysis.status, 'SUCCESS')
+        self.assertEqual(timings['dataset_load_ms'], 2.0)
+        self.assertEqual(timings['predict_ms'], 5.0)
+        # Escritura de los shards más la fusión
+        self.assertGreaterEqual(timings['result_write_ms'], 1.0)
+        self.assertAlmostEqual(timings['queue_wait_ms'], 2000.0, places=0)
+        self.assertGreaterEqual(timings['total_ms'], 3000.0)
+        self.assertEqual(analysis.metrics['worker']['pid'], os.getpid())
+        self.assertFalse(analysis.metrics['model_cache_hit'])
+        observe.assert_called_once_with(analysis.metrics, 'sklearn', 'SUCCESS')
+        self.assertTrue(os.path.basename(analysis.output_path).startswith('out_m_'))
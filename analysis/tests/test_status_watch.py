@@ -0,0 +1,83 @@
+import asyncio
+from unittest import mock
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+
+from analysis import notifications, status_watch
+from analysis.models import MLModel, AnalysisResult
+from datasets.models import MetaData
+
+User = get_user_model()
+
+
+@override_settings(ANALYSIS_STATUS_POLL_SECONDS=0.02,
+                   CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class StatusLongPollTests(TestCase):
+    """
+    Pruebas de GET /api/v1/analysis/<pk>/status/:
+      - Responde de inmediato si el estado ya no es `since`
+      - Espera hasta que record_status() publica un cambio (channel layer o cache)
+      - Vence el timeout con changed=false y no expone análisis ajenos
+    """
+
+    def setUp(self):
+        notifications.status_cache().clear()
+        self.user = User.objects.create_user(username='poll', email='p@example.com', password='pass1234')
+        self.dataset = MetaData.objects.create(owner=self.user, name='ds', file='ds.csv')
+        self.mlmodel = MLModel.objects.create(name='m', version='1', framework='sklearn', owner=self.user, file='m.joblib')
+        self.analysis = AnalysisResult.objects.create(dataset=self.dataset, model=self.mlmodel, parameters={}, status='RUNNING')
+        self.url = f'/api/v1/analysis/{self.analysis.pk}/status/'
+
+    def publish_later(self, status, delay=0.05):
+        async def later():
+            await asyncio.sleep(delay)
+            message = notifications.analysis_message(self.analysis, status)
+            # record_status es síncrono (lo llaman los workers)
+            await sync_to_async(notifications.record_status, thread_sensitive=False)('analysis', self.analysis.pk, message)
+        return asyncio.ensure_future(later())
+
+    async def test_returns_immediately_when_status_already_changed(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(self.url, {'since': 'PENDING', 'timeout': 5})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'changed': True, 'message': mock.ANY})
+        self.assertEqual(response.json()['message']['status'], 'RUNNING')
+
+    async def test_wakes_up_on_published_change(self):
+        await self.async_client.aforce_login(self.user)
+        pending = self.publish_later('SUCCESS')
+        response = await self.async_client.get(self.url, {'since': 'RUNNING', 'timeout': 5})
+        await pending
+
+        body = response.json()
+        self.assertTrue(body['changed'])
+        self.assertEqual(body['message']['status'], 'SUCCESS')
+
+    async def test_cache_signal_without_channel_layer(self):
+        await self.async_client.aforce_login(self.user)
+        with mock.patch.object(status_watch, 'get_channel_layer', None):
+            pending = self.publish_later('FAILURE')
+            response = await self.async_client.get(self.url, {'since': 'RUNNING', 'timeout': 5})
+            await pending
+
+        self.assertEqual(response.json()['message']['status'], 'FAILURE')
+
+    async def test_times_out_without_change(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(self.url, {'since': 'RUNNING', 'timeout': 0.1})
+
+        self.assertEqual(response.json()['changed'], False)
+        self.assertEqual(response.json()['message']['status'], 'RUNNING')
+
+    async def test_other_users_analysis_is_not_found(self):
+        other = await User.objects.acreate_user(username='otro', email='o@example.com', password='pass1234')
+        await self.async_client.aforce_login(other)
+
+        response = await self.async_client.get(self.url, {'timeout': 0})
+        self.assertEqual(response.status_code, 404)
+
+    async def test_requires_authentication(self):
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response.status_code, 401)
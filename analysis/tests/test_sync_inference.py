@@ -0,0 +1,128 @@
+import os
+import tempfile
+import threading
+from unittest import mock
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import caches
+from django.db import DatabaseError
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from analysis.models import MLModel, HyperparameterDefinition, AnalysisResult, AnalysisOutbox
+from analysis.ml_inference import results_base
+from analysis.model_cache import model_cache
+from datasets.models import MetaData
+
+User = get_user_model()
+
+
+class EchoAdapter:
+    """Adaptador de prueba: devuelve la primera columna de cada fila."""
+    uses_dataset = False
+
+    def load(self, file_obj):
+        return object()
+
+    def predict(self, model, data, **params):
+        return [row[0] for row in data]
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class SyncInferenceTests(APITestCase):
+    """
+    Pruebas del modo síncrono de POST /api/v1/analysis/?sync=1:
+      - Modelo caliente → 201 con predicciones y análisis en SUCCESS
+      - Modelo frío → 202 y la tarea queda en el outbox
+      - Sin hilos de predict libres → 202 sin esperar el presupuesto
+      - El archivo se nombra con el id del análisis y no queda huérfano si el guardado falla
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='sync', email='s@example.com', password='pass1234')
+        self.client.force_authenticate(user=self.user)
+        self.dataset = MetaData.objects.create(
+            owner=self.user, name='ds',
+            file=SimpleUploadedFile('ds.csv', b'a\n1\n', content_type='text/csv'),
+        )
+        self.mlmodel = MLModel.objects.create(
+            name='m', version='1', framework='sklearn', owner=self.user,
+            file=SimpleUploadedFile('m.joblib', b'model'),
+        )
+        HyperparameterDefinition.objects.create(model=self.mlmodel, position=1, key_hint='x', dtype='float')
+        self.url = reverse('analysis-list') + '?sync=1'
+        self.payload = {'model': self.mlmodel.pk, 'dataset': self.dataset.pk, 'param_1': '2.5'}
+        mock.patch.dict('analysis.sync_inference.ADAPTERS', {'sklearn': EchoAdapter()}).start()
+        self.addCleanup(mock.patch.stopall)
+        model_cache.clear()
+        caches['predictions'].clear()
+
+    def test_warm_model_answers_synchronously(self):
+        model_cache.get_or_load(self.mlmodel.pk, self.mlmodel.file.path, EchoAdapter())
+
+        response = self.client.post(self.url, self.payload, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['predictions'], [2.5])
+        analysis = AnalysisResult.objects.get()
+        self.assertEqual(analysis.status, 'SUCCESS')
+        self.assertEqual(os.path.splitext(analysis.output_path)[0], results_base(self.mlmodel.runtime_path, analysis.pk))
+        self.assertFalse(AnalysisOutbox.objects.exists())
+
+    def test_failed_save_leaves_no_result_file(self):
+        model_cache.get_or_load(self.mlmodel.pk, self.mlmodel.file.path, EchoAdapter())
+        results_dir = os.path.join(settings.MEDIA_ROOT, 'data/results')
+        before = set(os.listdir(results_dir)) if os.path.isdir(results_dir) else set()
+        save = AnalysisResult.save
+
+        def failing_save(analysis, *args, **kwargs):
+            if kwargs.get('update_fields'):
+                raise DatabaseError("bd caída")
+            return save(analysis, *args, **kwargs)
+
+        self.client.raise_request_exception = True
+        with mock.patch.object(AnalysisResult, 'save', failing_save), self.assertRaises(DatabaseError):
+            self.client.post(self.url, self.payload, format='json')
+
+        self.assertFalse(AnalysisResult.objects.exists())
+        self.assertEqual(set(os.listdir(results_dir)), before)
+
+    def test_cold_model_falls_back_to_celery(self):
+        with mock.patch('analysis.sync_inference._schedule_warm'):
+            response = self.client.post(self.url, self.payload, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(AnalysisOutbox.objects.get().analysis_id, response.data['id'])
+
+    def test_no_free_thread_falls_back_immediately(self):
+        model_cache.get_or_load(self.mlmodel.pk, self.mlmodel.file.path, EchoAdapter())
+
+        with mock.patch('analysis.sync_inference._predict_slots') as slots, \
+                mock.patch('analysis.sync_inference._executor') as executor:
+            slots.acquire.return_value = False
+            response = self.client.post(self.url, self.payload, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        slots.acquire.assert_called_once_with(blocking=False)
+        executor.submit.assert_not_called()
+
+    def test_slot_is_held_until_a_late_predict_finishes(self):
+        from analysis import sync_inference
+        model_cache.get_or_load(self.mlmodel.pk, self.mlmodel.file.path, EchoAdapter())
+        release = threading.Event()
+
+        def slow_predict(mlmodel, inputs):
+            release.wait(5)
+            return [0.0]
+
+        slots = threading.BoundedSemaphore(1)
+        with mock.patch.object(sync_inference, '_predict_slots', slots), \
+                mock.patch.object(sync_inference, '_predict', slow_predict), \
+                override_settings(ANALYSIS_SYNC_BUDGET_MS=10):
+            self.assertIsNone(sync_inference.try_sync_inference(self.mlmodel, [[1.0]]))
+            self.assertFalse(slots.acquire(blocking=False))
+            release.set()
+            self.assertTrue(slots.acquire(timeout=5))
@@ -0,0 +1,33 @@
+from unittest import mock
+from django.test import SimpleTestCase, override_settings
+
+from analysis import thread_budget
+
+
+class ThreadBudgetTests(SimpleTestCase):
+    """
+    Pruebas del presupuesto de hilos:
+      - Por defecto los núcleos se reparten entre los procesos de Celery
+      - El mismo valor llega a torch y a las SessionOptions de ONNX
+    """
+
+    @override_settings(ANALYSIS_THREADS_PER_PROCESS=0, CELERY_WORKER_CONCURRENCY=4)
+    def test_cores_are_divided_across_processes(self):
+        with mock.patch('analysis.thread_budget.multiprocessing.cpu_count', return_value=16):
+            self.assertEqual(thread_budget.threads_per_process(), 4)
+
+    @override_settings(ANALYSIS_THREADS_PER_PROCESS=0, CELERY_WORKER_CONCURRENCY=16)
+    def test_at_least_one_thread(self):
+        with mock.patch('analysis.thread_budget.multiprocessing.cpu_count', return_value=8):
+            self.assertEqual(thread_budget.threads_per_process(), 1)
+
+    @override_settings(ANALYSIS_THREADS_PER_PROCESS=3, ANALYSIS_INTEROP_THREADS=1)
+    def test_budget_is_applied_to_frameworks(self):
+        torch = mock.Mock()
+        thread_budget.configure_framework('torch', torch)
+        torch.set_num_threads.assert_called_once_with(3)
+        torch.set_num_interop_threads.assert_called_once_with(1)
+
+        ort = mock.Mock()
+        options = thread_budget.onnx_session_options(ort)
+        self.assertEqual((options.intra_op_num_threads, options.inter_op_num_threads), (3, 1))
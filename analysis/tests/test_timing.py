@@ -0,0 +1,90 @@
+import os
+import tempfile
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from analysis.model_cache import model_cache
+from analysis.models import MLModel, AnalysisResult
+from analysis.tasks import launch_analysis_task
+from analysis.timing import StageTimer
+from datasets.models import MetaData
+
+User = get_user_model()
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+class DoubleAdapter:
+    """Adaptador de prueba: duplica la primera columna."""
+    uses_dataset = False
+
+    def load(self, file_obj):
+        return object()
+
+    def predict(self, model, data, **params):
+        return [row[0] * 2 for row in data]
+
+
+class StageTimerTests(SimpleTestCase):
+    def test_repeated_stages_accumulate(self):
+        timer = StageTimer()
+        timer.add('predict', 1.5)
+        timer.add('predict', 2.0)
+        with timer.stage('result_write'):
+            pass
+
+        timings = timer.as_dict()
+        self.assertEqual(timings['predict_ms'], 3.5)
+        self.assertGreaterEqual(timings['result_write_ms'], 0.0)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class AnalysisTimingTests(TestCase):
+    """
+    Pruebas del desglose por etapa:
+      - launch_analysis_task guarda cola, carga de modelo, predict, escritura y total
+      - Se registra el pid del worker y si el modelo salió de la cache del proceso
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='timing', email='t@example.com', password='pass1234')
+        self.dataset = MetaData.objects.create(
+            owner=self.user, name='ds',
+            file=SimpleUploadedFile('ds.csv', b'a\n1\n', content_type='text/csv'),
+        )
+        self.mlmodel = MLModel.objects.create(
+            name='m', version='1', framework='sklearn', owner=self.user,
+            file=SimpleUploadedFile('m.joblib', b'model'),
+        )
+        mock.patch.dict('analysis.ml_inference.ADAPTERS', {'sklearn': DoubleAdapter()}).start()
+        self.addCleanup(mock.patch.stopall)
+        caches['predictions'].clear()
+        model_cache.clear()
+
+    def launch(self, value):
+        analysis = AnalysisResult.objects.create(
+            dataset=self.dataset, model=self.mlmodel, parameters={'vector_2d': [[value]]},
+        )
+        launch_analysis_task(analysis.pk)
+        analysis.refresh_from_db()
+        return analysis
+
+    def test_metrics_include_stage_breakdown_and_worker(self):
+        analysis = self.launch(1.0)
+
+        self.assertEqual(analysis.status, 'SUCCESS')
+        timings = analysis.metrics['timings']
+        for key in ('queue_wait_ms', 'model_load_ms', 'predict_ms', 'result_write_ms', 'total_ms'):
+            self.assertIn(key, timings)
+        self.assertNotIn('dataset_load_ms', timings)
+        self.assertGreaterEqual(timings['total_ms'], timings['predict_ms'])
+        self.assertEqual(analysis.metrics['worker']['pid'], os.getpid())
+        self.assertFalse(analysis.metrics['model_cache_hit'])
+
+    def test_second_analysis_hits_the_model_cache(self):
+        self.launch(1.0)
+        second = self.launch(2.0)
+
+        self.assertTrue(second.metrics['model_cache_hit'])
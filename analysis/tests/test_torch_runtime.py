@@ -0,0 +1,74 @@
+import io
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+
+try:
+    import torch
+except ImportError:  # pragma: no cover
+    torch = None
+
+from analysis.adapters import ADAPTERS
+
+
+@override_settings(ANALYSIS_NUMPY_OUTPUT_MIN_ROWS=8, ANALYSIS_TORCH_COMPILE='')
+class TorchFastPathTests(SimpleTestCase):
+    """
+    Pruebas del camino rápido de PyTorch:
+      - El .pt se carga una vez en eval y predice desde listas de filas
+      - Resultados grandes salen como ndarray y no comparten el buffer
+      - trace produce lo mismo que eager
+    """
+
+    def setUp(self):
+        if torch is None:
+            self.skipTest('torch no instalado')
+        torch.manual_seed(0)
+        self.module = torch.nn.Sequential(torch.nn.Linear(3, 2), torch.nn.Dropout(0.5))
+        self.module.train()
+        self.adapter = ADAPTERS['pytorch']
+
+    def load(self):
+        buffer = io.BytesIO()
+        torch.save(self.module, buffer)
+        buffer.seek(0)
+        return self.adapter.load(buffer)
+
+    def expected(self, rows):
+        with torch.no_grad():
+            return self.module.eval()(torch.tensor(rows, dtype=torch.float32)).numpy()
+
+    def test_small_results_are_lists_in_eval_mode(self):
+        model = self.load()
+        self.assertFalse(model.module.training)
+
+        output = self.adapter.predict(model, [[1, 2, 3]])
+
+        self.assertIsInstance(output, list)
+        np.testing.assert_allclose(output, self.expected([[1, 2, 3]]), rtol=1e-6)
+
+    def test_large_results_do_not_share_the_input_buffer(self):
+        model = self.load()
+        first_rows = np.arange(30, dtype=np.float64).reshape(10, 3).tolist()
+
+        first = self.adapter.predict(model, first_rows)
+        self.adapter.predict(model, [[0.0, 0.0, 0.0]] * 10)
+
+        self.assertIsInstance(first, np.ndarray)
+        np.testing.assert_allclose(first, self.expected(first_rows), rtol=1e-5)
+
+    def test_identity_module_output_is_copied(self):
+        self.module = torch.nn.Identity()
+        model = self.load()
+
+        first = self.adapter.predict(model, [[float(i)] * 3 for i in range(10)])
+        self.adapter.predict(model, [[-1.0] * 3] * 10)
+
+        self.assertEqual(first[9].tolist(), [9.0, 9.0, 9.0])
+
+    @override_settings(ANALYSIS_TORCH_COMPILE='trace')
+    def test_trace_matches_eager(self):
+        model = self.load()
+        rows = [[0.5, -1.0, 2.0], [1.0, 1.0, 1.0]]
+
+        np.testing.assert_allclose(self.adapter.predict(model, rows), self.expected(rows), rtol=1e-6)
+        self.assertIsNot(model._runner, model.module)
@@ -0,0 +1,45 @@
+import os
+import tempfile
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from analysis.models import MLModel, AnalysisResult, UserAnalysis
+from analysis.result_store import write_predictions
+from datasets.models import MetaData
+
+User = get_user_model()
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class UserAnalysisPagingTests(APITestCase):
+    """
+    Pruebas de GET /analisis/<id>/ con ?offset=&limit=:
+      - Devuelve la página pedida y el total de filas
+      - offset/limit no numéricos o negativos responden 400
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='pagina', email='p@example.com', password='pass1234')
+        mlmodel = MLModel.objects.create(name='m', version='1', framework='sklearn', owner=self.user, file='m.joblib')
+        dataset = MetaData.objects.create(owner=self.user, name='ds', file='ds.csv')
+        output_path = write_predictions(list(range(10)), os.path.join(MEDIA_ROOT, 'out_paging'))
+        analysis = AnalysisResult.objects.create(
+            dataset=dataset, model=mlmodel, parameters={}, status='SUCCESS', output_path=output_path,
+        )
+        self.url = reverse('user-analysis-detail', args=[UserAnalysis.objects.create(analysis=analysis, user=self.user).pk])
+        self.client.force_authenticate(self.user)
+
+    def test_returns_page_and_total(self):
+        response = self.client.get(self.url, {'offset': 3, 'limit': 4})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['resultado_numerico'], [3, 4, 5, 6])
+        self.assertEqual(response.data['total'], 10)
+
+    def test_invalid_paging_is_a_client_error(self):
+        for params in ({'offset': 'abc'}, {'limit': '1.5'}, {'offset': -1}):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 400, params)
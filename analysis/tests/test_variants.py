@@ -0,0 +1,145 @@
+import io
+import tempfile
+from unittest import mock
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+
+from analysis.models import MLModel, HyperparameterDefinition, ModelVariant
+from analysis.variants import build_variants, generated_inputs
+
+try:
+    import joblib
+    import skl2onnx  # noqa: F401
+    from sklearn.linear_model import LinearRegression, LogisticRegression
+    from sklearn.neural_network import MLPRegressor
+except ImportError:  # pragma: no cover
+    skl2onnx = None
+
+User = get_user_model()
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def dump(estimator):
+    buffer = io.BytesIO()
+    joblib.dump(estimator, buffer)
+    return buffer.getvalue()
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT, ANALYSIS_ONNX_CACHE_DIR=tempfile.mkdtemp(),
+    ANALYSIS_VARIANT_PARITY_ROWS=64, ANALYSIS_VARIANT_BENCH_RUNS=3,
+)
+class ModelVariantTests(TestCase):
+    """
+    Pruebas de las variantes ONNX:
+      - Un clasificador y un regresor sklearn exportan con paridad
+      - La salida de la variante tiene la misma forma que la del original
+      - Un archivo nuevo desactiva la variante y encola la conversión
+      - Sin operadores cuantizables no hay int8; con MatMul sí
+      - No se activa una variante si el archivo cambió durante la conversión
+      - Reconvertir escribe un archivo nuevo y borra el anterior
+    """
+
+    def setUp(self):
+        if skl2onnx is None:
+            self.skipTest('skl2onnx no instalado')
+        self.user = User.objects.create_user(username='v', email='v@example.com', password='pass1234')
+        rng = np.random.default_rng(1)
+        self.X = rng.normal(size=(80, 3))
+
+    def make_model(self, estimator, **fields):
+        mlmodel = MLModel.objects.create(
+            name='m', version='1', framework='sklearn', owner=self.user,
+            file=SimpleUploadedFile('m.joblib', dump(estimator)), **fields,
+        )
+        for position, dtype in enumerate(['float', 'float', 'int'], start=1):
+            HyperparameterDefinition.objects.create(model=mlmodel, position=position, key_hint=f'x{position}', dtype=dtype)
+        return mlmodel
+
+    def test_generated_inputs_follow_hyperparameters(self):
+        inputs = generated_inputs(self.make_model(LinearRegression().fit(self.X, self.X[:, 0])), 10)
+
+        self.assertEqual(inputs.shape, (10, 3))
+        self.assertEqual(inputs.dtype, np.float32)
+        self.assertTrue(np.all(inputs[:, 2] == np.round(inputs[:, 2])))
+
+    def test_classifier_variants_keep_labels(self):
+        mlmodel = self.make_model(LogisticRegression().fit(self.X, self.X[:, 0] > 0))
+
+        variants = {v.kind: v for v in build_variants(mlmodel)}
+
+        fp32 = variants['onnx']
+        self.assertEqual(fp32.status, 'VALID')
+        self.assertLessEqual(fp32.accuracy_delta, 0.01)
+        self.assertIsNotNone(fp32.baseline_latency_ms)
+        self.assertTrue(fp32.file.name.endswith('.onnx'))
+        # LinearClassifier (ai.onnx.ml) no tiene nada que cuantizar: no se intenta
+        self.assertNotIn('onnx-int8', variants)
+        self.assertFalse(ModelVariant.objects.filter(model=mlmodel, kind='onnx-int8').exists())
+
+    def test_matmul_graph_gets_int8_variant(self):
+        mlp = MLPRegressor(hidden_layer_sizes=(16,), max_iter=200, random_state=0).fit(self.X, self.X[:, 0])
+        mlmodel = self.make_model(mlp)
+
+        variants = {v.kind: v for v in build_variants(mlmodel)}
+
+        self.assertEqual(variants['onnx'].status, 'VALID')
+        self.assertIn(variants['onnx-int8'].status, ('VALID', 'INVALID'))
+        self.assertEqual(variants['onnx-int8'].error_message, '')
+        self.assertIsNotNone(variants['onnx-int8'].accuracy_delta)
+
+    def test_changed_file_is_not_activated(self):
+        mlmodel = self.make_model(LinearRegression().fit(self.X, self.X[:, 0]))
+        # Otra subida ya cambió el hash guardado del modelo
+        MLModel.objects.filter(pk=mlmodel.pk).update(file_sha256='0' * 64)
+
+        with mock.patch('analysis.variants.measure', side_effect=[(10.0, self.X[:64, 0]), (1.0, self.X[:64, 0])]):
+            variants = build_variants(mlmodel)
+
+        self.assertEqual([v.status for v in variants], ['VALID'])
+        mlmodel.refresh_from_db()
+        self.assertIsNone(mlmodel.serving_variant)
+
+    def test_rebuild_swaps_variant_file(self):
+        import os
+        mlmodel = self.make_model(LinearRegression().fit(self.X, self.X[:, 0]))
+        first = next(v for v in build_variants(mlmodel) if v.kind == 'onnx')
+        old_path = first.file.path
+
+        second = next(v for v in build_variants(mlmodel) if v.kind == 'onnx')
+
+        self.assertEqual(first.pk, second.pk)
+        self.assertNotEqual(second.file.path, old_path)
+        self.assertTrue(os.path.exists(second.file.path))
+        self.assertFalse(os.path.exists(old_path))
+
+    def test_regressor_variant_matches_output_shape(self):
+        mlmodel = self.make_model(LinearRegression().fit(self.X, self.X @ [1.0, 2.0, 3.0]))
+
+        variant = ModelVariant.objects.get(pk=next(v.pk for v in build_variants(mlmodel) if v.kind == 'onnx'))
+
+        from analysis.adapters import ADAPTERS
+        with open(variant.file.path, 'rb') as f:
+            session = ADAPTERS['onnx'].load(f)
+        output = ADAPTERS['onnx'].predict(session, [[1.0, 1.0, 1.0]])
+        self.assertEqual(np.shape(output), (1,))
+        self.assertAlmostEqual(output[0], 6.0, places=3)
+
+    def test_new_file_resets_serving_variant_and_schedules_conversion(self):
+        mlmodel = self.make_model(LinearRegression().fit(self.X, self.X[:, 0]), auto_optimize=True)
+        variant = ModelVariant.objects.create(model=mlmodel, kind='onnx', source_sha256='x', status='VALID')
+        MLModel.objects.filter(pk=mlmodel.pk).update(serving_variant=variant)
+        mlmodel.refresh_from_db()
+        self.assertEqual(mlmodel.runtime_framework, 'onnx')
+
+        mlmodel.file = SimpleUploadedFile('m2.joblib', dump(LinearRegression().fit(self.X, self.X[:, 1])))
+        with mock.patch('analysis.tasks.convert_model_task.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                mlmodel.save()
+
+        mlmodel.refresh_from_db()
+        self.assertIsNone(mlmodel.serving_variant)
+        self.assertEqual(mlmodel.runtime_framework, 'sklearn')
+        delay.assert_called_once_with(mlmodel.pk)
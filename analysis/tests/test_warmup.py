@@ -0,0 +1,84 @@
+import tempfile
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+
+from analysis.models import MLModel, HyperparameterDefinition, AnalysisResult
+from analysis.model_cache import model_cache
+from analysis.warmup import dummy_inputs, models_to_warm, warm_up
+from datasets.models import MetaData
+
+User = get_user_model()
+
+
+class RecordingAdapter:
+    """Adaptador de prueba: guarda los inputs de cada predict."""
+    uses_dataset = False
+
+    def __init__(self):
+        self.inputs = []
+
+    def load(self, file_obj):
+        return object()
+
+    def predict(self, model, data, **params):
+        self.inputs.append(data)
+        return [0 for _ in data]
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), ANALYSIS_WARMUP_MODEL_IDS=[], ANALYSIS_WARMUP_TOP_N=1)
+class WarmupTests(TestCase):
+    """
+    Pruebas del warm-up de workers:
+      - Se elige el modelo más usado en la ventana
+      - El predict de prueba respeta el orden y dtype de los hiperparámetros
+      - Un modelo que falla no detiene el resto
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='w', email='w@example.com', password='pass1234')
+        self.dataset = MetaData.objects.create(
+            owner=self.user, name='ds',
+            file=SimpleUploadedFile('ds.csv', b'a\n1\n', content_type='text/csv'),
+        )
+        self.hot = self.make_model('hot')
+        self.cold = self.make_model('cold')
+        HyperparameterDefinition.objects.create(model=self.hot, position=2, key_hint='b', dtype='float')
+        HyperparameterDefinition.objects.create(model=self.hot, position=1, key_hint='a', dtype='int')
+        for _ in range(2):
+            AnalysisResult.objects.create(dataset=self.dataset, model=self.hot, parameters={})
+        AnalysisResult.objects.create(dataset=self.dataset, model=self.cold, parameters={})
+        self.adapter = RecordingAdapter()
+        mock.patch.dict('analysis.ml_inference.ADAPTERS', {'sklearn': self.adapter}).start()
+        self.addCleanup(mock.patch.stopall)
+        model_cache.clear()
+
+    def make_model(self, name):
+        return MLModel.objects.create(
+            name=name, version='1', framework='sklearn', owner=self.user,
+            file=SimpleUploadedFile(f'{name}.joblib', b'model'),
+        )
+
+    def test_top_model_by_recent_usage(self):
+        self.assertEqual(models_to_warm(), [self.hot])
+
+    def test_explicit_ids_win(self):
+        with self.settings(ANALYSIS_WARMUP_MODEL_IDS=[self.cold.pk]):
+            self.assertEqual(models_to_warm(), [self.cold])
+
+    def test_warm_up_loads_and_runs_dummy_predict(self):
+        reports = warm_up()
+
+        self.assertEqual(dummy_inputs(self.hot), [[0, 0.0]])
+        self.assertEqual(self.adapter.inputs, [[[0, 0.0]]])
+        self.assertTrue(model_cache.peek(self.hot.pk, self.hot.file.path))
+        self.assertIn('load_ms', reports[0])
+        self.assertIn('predict_ms', reports[0])
+
+    def test_failing_model_is_reported(self):
+        self.cold.framework = 'unknown'
+        reports = warm_up([self.cold, self.hot])
+
+        self.assertIn('error', reports[0])
+        self.assertIn('load_ms', reports[1])
@@ -0,0 +1,99 @@
+# analysis/thread_budget.py
+"""
+Presupuesto de hilos de inferencia por proceso.
+
+Con CELERY_WORKER_CONCURRENCY = cpu_count() cada proceso prefork deja que
+torch, TensorFlow, onnxruntime y BLAS/OpenMP creen pools del tamaño de todos
+los núcleos: N procesos x N hilos. Este módulo reparte los núcleos entre
+los procesos y aplica el mismo valor a todos los frameworks:
+
+    ANALYSIS_THREADS_PER_PROCESS = 0   # 0 = cpu_count() // CELERY_WORKER_CONCURRENCY
+    ANALYSIS_INTEROP_THREADS     = 1
+
+adapters.import_framework llama a configure_framework() justo al importar
+cada framework (los pools se fijan antes del primer uso) y las sesiones ONNX
+usan onnx_session_options(). Para medir distintos repartos ver el comando
+`python manage.py benchmark_threads`.
+"""
+
+import os
+import logging
+import multiprocessing
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Variables de entorno que leen OpenMP/MKL/OpenBLAS al inicializarse
+THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS')
+
+# Permite que benchmark_threads fije el valor en cada proceso hijo
+_override = None
+
+
+def threads_per_process() -> int:
+    if _override is not None:
+        return _override
+    configured = int(getattr(settings, 'ANALYSIS_THREADS_PER_PROCESS', 0))
+    if configured > 0:
+        return configured
+    processes = int(getattr(settings, 'CELERY_WORKER_CONCURRENCY', 0)) or multiprocessing.cpu_count()
+    return max(1, multiprocessing.cpu_count() // processes)
+
+
+def interop_threads() -> int:
+    return max(1, int(getattr(settings, 'ANALYSIS_INTEROP_THREADS', 1)))
+
+
+def set_override(threads) -> None:
+    global _override
+    _override = threads
+
+
+def apply_process_budget() -> int:
+    """
+    Fija el presupuesto para las librerías nativas del proceso (BLAS/OpenMP).
+    Se llama al inicio de cada worker; los frameworks de ML se configuran al
+    importarse. Devuelve el número de hilos aplicado.
+    """
+    threads = threads_per_process()
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = str(threads)
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        pass
+    else:
+        # numpy/sklearn ya cargaron BLAS: las variables de entorno no les llegan
+        threadpool_limits(limits=threads)
+    logger.info("Presupuesto de hilos por proceso: %s (inter-op %s)", threads, interop_threads())
+    return threads
+
+
+def prepare_import() -> None:
+    """Antes de importar un framework: sus pools OpenMP leen estas variables al cargar."""
+    threads = str(threads_per_process())
+    for var in THREAD_ENV_VARS:
+        os.environ.setdefault(var, threads)
+
+
+def configure_framework(module_name, module) -> None:
+    """Aplica el presupuesto a un framework recién importado."""
+    threads, interop = threads_per_process(), interop_threads()
+    try:
+        if module_name == 'torch':
+            module.set_num_threads(threads)
+            module.set_num_interop_threads(interop)
+        elif module_name == 'tensorflow':
+            module.config.threading.set_intra_op_parallelism_threads(threads)
+            module.config.threading.set_inter_op_parallelism_threads(interop)
+    except RuntimeError as exc:
+        # torch/TF solo aceptan inter-op antes de la primera operación paralela
+        logger.warning("No se pudo fijar el presupuesto de hilos de %s: %s", module_name, exc)
+
+
+def onnx_session_options(ort):
+    """SessionOptions de onnxruntime con el presupuesto del proceso."""
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = threads_per_process()
+    options.inter_op_num_threads = interop_threads()
+    return options
@@ -0,0 +1,76 @@
+# analysis/timing.py
+"""
+Desglose de latencia por etapa de cada análisis.
+
+execute()/execute_batch()/execute_dataset() miden carga del dataset, carga
+del modelo (con acierto o fallo de la cache del proceso), predict y
+escritura del resultado con un StageTimer; launch_analysis_task agrega la
+espera en cola (created_at -> inicio de la tarea) y la identidad del
+worker. Con shards, cada score_shard_task guarda sus etapas en
+AnalysisShard.timings y merge_shards_task las suma. Todo queda en
+AnalysisResult.metrics:
+
+    metrics['timings'] = {'queue_wait_ms': .., 'dataset_load_ms': ..,
+                          'model_load_ms': .., 'predict_ms': ..,
+                          'result_write_ms': .., 'total_ms': ..}
+    metrics['model_cache_hit'] = True | False
+    metrics['worker'] = {'hostname': .., 'pid': ..}
+"""
+
+import os
+import socket
+import time
+from contextlib import contextmanager
+
+STAGES = ('queue_wait', 'dataset_load', 'model_load', 'predict', 'result_write')
+
+
+class StageTimer:
+    """Acumula milisegundos por etapa (una etapa puede medirse varias veces)."""
+
+    def __init__(self):
+        self.stages = {}
+        self.model_cache_hit = None
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - start) * 1000)
+
+    def add(self, name, ms):
+        self.stages[name] = self.stages.get(name, 0.0) + ms
+
+    def elapsed(self, name) -> float:
+        return self.stages.get(name, 0.0)
+
+    def as_dict(self) -> dict:
+        return {f"{name}_ms": round(ms, 3) for name, ms in self.stages.items()}
+
+
+def queue_wait_ms(created_at, started_at) -> float:
+    """Milisegundos entre la creación del análisis y el inicio de la tarea."""
+    if created_at is None:
+        return 0.0
+    return max((started_at - created_at).total_seconds() * 1000, 0.0)
+
+
+def worker_identity(hostname=None) -> dict:
+    """Nodo Celery (o host) y pid del proceso que ejecutó el análisis."""
+    return {'hostname': hostname or socket.gethostname(), 'pid': os.getpid()}
+
+
+def with_runtime(metrics, created_at, started_at, started_perf, hostname=None) -> dict:
+    """
+    Completa las métricas de execute*() con la espera en cola, el tiempo
+    total de la tarea y la identidad del worker.
+    """
+    metrics = dict(metrics or {})
+    timings = dict(metrics.get('timings') or {})
+    timings['queue_wait_ms'] = round(queue_wait_ms(created_at, started_at), 3)
+    timings['total_ms'] = round((time.perf_counter() - started_perf) * 1000, 3)
+    metrics['timings'] = timings
+    metrics['worker'] = worker_identity(hostname)
+    return metrics
@@ -0,0 +1,104 @@
+# analysis/torch_runtime.py
+"""
+Camino rápido de inferencia para el PyTorchAdapter.
+
+El módulo se prepara una sola vez al cargarlo (queda en la cache de
+modelos del proceso): eval(), y opcionalmente trace/script/torch.compile
+según ANALYSIS_TORCH_COMPILE. Cada predict:
+
+- copia los inputs a un buffer float32 preasignado por hilo (crece si llega
+  un batch mayor) y lo envuelve con torch.from_numpy, sin copia extra;
+- corre bajo torch.inference_mode();
+- devuelve la salida como numpy; as_predictions decide si se convierte a
+  lista (resultados chicos) o se devuelve el ndarray.
+
+Solo CPU: no hay memoria pinned porque no hay copia a GPU que acelerar.
+"""
+
+import logging
+import threading
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+COMPILE_MODES = ('', 'trace', 'script', 'compile')
+
+
+def compile_mode() -> str:
+    mode = getattr(settings, 'ANALYSIS_TORCH_COMPILE', '') or ''
+    if mode not in COMPILE_MODES:
+        raise ValueError(f"ANALYSIS_TORCH_COMPILE inválido: {mode!r} (opciones: {COMPILE_MODES})")
+    return mode
+
+
+class TorchModel:
+    """Envuelve un nn.Module preparado para inferencia por CPU."""
+
+    def __init__(self, torch, module, mode=None):
+        self.torch = torch
+        self.module = module.eval()
+        self.mode = compile_mode() if mode is None else mode
+        self._runner = self.module
+        self._prepared = self.mode in ('', 'compile')
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        if self.mode == 'compile':
+            self._runner = torch.compile(self.module)
+        # trace/script se hacen con el primer batch (hace falta un input de ejemplo)
+
+    def _prepare(self, example):
+        with self._lock:
+            if self._prepared:
+                return
+            torch = self.torch
+            try:
+                if self.mode == 'trace':
+                    self._runner = torch.jit.freeze(torch.jit.trace(self.module, example))
+                elif self.mode == 'script':
+                    self._runner = torch.jit.freeze(torch.jit.script(self.module))
+            except Exception as exc:
+                # Un módulo no trazable sigue funcionando en modo eager
+                logger.warning("No se pudo aplicar %s al modelo PyTorch: %s", self.mode, exc)
+                self._runner = self.module
+            self._prepared = True
+
+    def _buffer(self, shape) -> np.ndarray:
+        """Buffer float32 del hilo con al menos shape[0] filas."""
+        buf = getattr(self._local, 'buffer', None)
+        if buf is None or buf.shape[1:] != shape[1:] or buf.shape[0] < shape[0]:
+            buf = np.empty(shape, dtype=np.float32)
+            self._local.buffer = buf
+        return buf[:shape[0]]
+
+    @staticmethod
+    def _is_row_list(data) -> bool:
+        """True si data es una lista de filas de escalares (el vector_2d de siempre)."""
+        return (
+            isinstance(data, (list, tuple)) and len(data) > 0
+            and isinstance(data[0], (list, tuple))
+            and not (data[0] and isinstance(data[0][0], (list, tuple)))
+        )
+
+    def to_tensor(self, data):
+        """Tensor float32 sobre el buffer del hilo (las filas se vuelcan directo en él)."""
+        if self._is_row_list(data):
+            shape = (len(data), len(data[0]))
+        else:
+            data = np.asarray(data, dtype=np.float32)
+            if data.ndim == 1:
+                data = data.reshape(1, -1)
+            shape = data.shape
+        buf = self._buffer(shape)
+        buf[...] = data
+        return self.torch.from_numpy(buf), buf
+
+    def run(self, data) -> np.ndarray:
+        inputs, buf = self.to_tensor(data)
+        if not self._prepared:
+            self._prepare(inputs)
+        with self.torch.inference_mode():
+            output = self._runner(inputs)
+        out = output.numpy()
+        # Un módulo que devuelve (una vista de) su input compartiría el buffer
+        return out.copy() if np.shares_memory(out, buf) else out
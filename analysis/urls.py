@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import MLModelViewSet, AnalysisViewSet, ResultController
+from .views import MLModelViewSet, AnalysisViewSet, ResultController, analysis_status_view
 
 router_models = DefaultRouter()
 router_models.register(r"models", MLModelViewSet,  basename="mlmodel")
@@ -15,6 +15,7 @@ router_results.register(r'results', ResultController, basename='results')
 
 
 urlpatterns = [
+    path("analysis/<int:pk>/status/", analysis_status_view, name="analysis-status"),
     path("", include(router_models.urls)),
     path("", include(router_analysis.urls)),
     path("", include(router_results.urls)),
@@ -0,0 +1,257 @@
+# analysis/variants.py
+"""
+Conversión de MLModel sklearn/PyTorch a ONNX (fp32 y int8 dinámico).
+
+build_variants() exporta el modelo (skl2onnx / torch.onnx), opcionalmente
+lo cuantiza con onnxruntime.quantization, y valida cada variante contra el
+original con entradas generadas a partir de sus HyperparameterDefinition:
+paridad numérica (o de etiquetas) y latencia mediana por predict. La
+variante validada más rápida, si le gana al original, queda como
+MLModel.serving_variant y es la que usan los workers, siempre que el
+archivo del modelo no haya cambiado durante la conversión.
+
+Los grafos sin operadores cuantizables (p. ej. LinearClassifier/
+LinearRegressor de ai.onnx.ml) no generan variante int8.
+
+skl2onnx, torch y onnxruntime son opcionales: si faltan, la variante queda
+FAILED con el error y el modelo sigue sirviéndose con su archivo original.
+"""
+
+import io
+import os
+import hashlib
+import time
+import inspect
+import logging
+import tempfile
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.core.files.base import ContentFile
+from django.utils.text import slugify
+from .adapters import ADAPTERS
+from .models import MLModel, ModelVariant
+from .prediction_cache import file_sha256
+
+logger = logging.getLogger(__name__)
+
+CONVERTIBLE_FRAMEWORKS = ('sklearn', 'pytorch')
+
+# Operadores del dominio estándar que quantize_dynamic convierte a int8
+QUANTIZABLE_OPS = {'MatMul', 'Gemm', 'Conv', 'Attention', 'LSTM', 'GRU'}
+
+
+def generated_inputs(mlmodel, rows, seed=0) -> np.ndarray:
+    """Filas aleatorias con el orden y dtype de los hiperparámetros (float32)."""
+    defs = list(mlmodel.hyperparams.all())
+    if not defs:
+        raise ValueError("El modelo no tiene HyperparameterDefinition para generar entradas")
+    if any(hp.dtype == 'str' for hp in defs):
+        raise ValueError("No se pueden exportar a ONNX modelos con hiperparámetros de texto")
+    rng = np.random.default_rng(seed)
+    columns = [
+        rng.integers(0, 10, rows) if hp.dtype == 'int' else rng.normal(size=rows)
+        for hp in defs
+    ]
+    return np.stack(columns, axis=1).astype(np.float32)
+
+
+def export_onnx(framework, model_obj, sample) -> bytes:
+    """Exporta el modelo cargado a ONNX con el batch como dimensión dinámica."""
+    if framework == 'sklearn':
+        from skl2onnx import to_onnx
+        from sklearn.base import is_classifier
+        # Sin zipmap la primera salida es el tensor de etiquetas, como predict()
+        options = {'zipmap': False} if is_classifier(model_obj) else None
+        return to_onnx(model_obj, sample[:1], options=options).SerializeToString()
+
+    if framework == 'pytorch':
+        torch = ADAPTERS['pytorch'].fw
+        buffer = io.BytesIO()
+        kwargs = {}
+        if 'dynamo' in inspect.signature(torch.onnx.export).parameters:
+            # El exportador TorchScript no requiere onnxscript
+            kwargs['dynamo'] = False
+        module = model_obj.module  # TorchModel del adaptador
+        torch.onnx.export(
+            module, torch.from_numpy(sample[:1]), buffer,
+            input_names=['input'], output_names=['output'],
+            dynamic_axes={'input': {0: 'batch'}, 'output': {0: 'batch'}},
+            **kwargs,
+        )
+        return buffer.getvalue()
+
+    raise ValueError(f"Exportación a ONNX no soportada para '{framework}'")
+
+
+def match_output_rank(onnx_bytes, baseline) -> bytes:
+    """
+    Si el original devuelve (N,) y el ONNX (N, 1) (regresores de skl2onnx),
+    agrega un Squeeze para que la variante produzca exactamente lo mismo.
+    """
+    import onnx
+    from onnx import helper, numpy_helper
+
+    model = onnx.load_from_string(onnx_bytes)
+    output = model.graph.output[0]
+    dims = output.type.tensor_type.shape.dim
+    if np.ndim(baseline) != 1 or len(dims) != 2 or dims[1].dim_value != 1:
+        return onnx_bytes
+
+    axes = numpy_helper.from_array(np.array([1], dtype=np.int64), name=f"{output.name}_squeeze_axes")
+    squeezed = f"{output.name}_squeezed"
+    model.graph.initializer.append(axes)
+    model.graph.node.append(helper.make_node('Squeeze', [output.name, axes.name], [squeezed]))
+    model.graph.output.insert(0, helper.make_tensor_value_info(
+        squeezed, output.type.tensor_type.elem_type, [dims[0].dim_param or None],
+    ))
+    return model.SerializeToString()
+
+
+def quantizable(onnx_bytes) -> bool:
+    """True si el grafo tiene algún operador que la cuantización dinámica convierta."""
+    import onnx
+
+    model = onnx.load_from_string(onnx_bytes)
+    return any(node.domain in ('', 'ai.onnx') and node.op_type in QUANTIZABLE_OPS for node in model.graph.node)
+
+
+def quantize_int8(onnx_bytes) -> bytes:
+    """Cuantización dinámica de pesos a int8 (MatMul/Gemm)."""
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    with tempfile.TemporaryDirectory() as tmp:
+        src, dst = os.path.join(tmp, 'fp32.onnx'), os.path.join(tmp, 'int8.onnx')
+        with open(src, 'wb') as f:
+            f.write(onnx_bytes)
+        quantize_dynamic(src, dst, weight_type=QuantType.QInt8)
+        with open(dst, 'rb') as f:
+            return f.read()
+
+
+def measure(adapter, model_obj, inputs, runs) -> tuple:
+    """(mediana en ms de predict sobre `inputs`, salida) tras un predict de calentamiento."""
+    output = adapter.predict(model_obj, inputs)
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        adapter.predict(model_obj, inputs)
+        timings.append((time.perf_counter() - start) * 1000)
+    return round(float(np.median(timings)), 4), np.asarray(output)
+
+
+def parity_delta(baseline, candidate) -> float:
+    """
+    Diferencia entre salidas: fracción de etiquetas distintas si el original
+    es discreto; máxima diferencia absoluta si es continuo.
+    """
+    if baseline.size != candidate.size:
+        raise ValueError(f"Forma de salida distinta: {baseline.shape} vs {candidate.shape}")
+    candidate = candidate.reshape(baseline.shape)
+    if baseline.dtype.kind in 'fc':
+        return float(np.max(np.abs(baseline.astype(np.float64) - candidate.astype(np.float64)))) if baseline.size else 0.0
+    return float(np.mean(baseline != candidate)) if baseline.size else 0.0
+
+
+def _tolerance(baseline) -> float:
+    if baseline.dtype.kind in 'fc':
+        return getattr(settings, 'ANALYSIS_VARIANT_MAX_DELTA', 0.01)
+    return getattr(settings, 'ANALYSIS_VARIANT_MAX_MISMATCH', 0.01)
+
+
+def _save_variant(mlmodel, kind, source_sha, data=None, **fields):
+    """
+    Crea o actualiza la variante. Con `data` el archivo se escribe con un
+    nombre nuevo y la fila pasa a apuntarlo en un solo save(); el archivo
+    anterior, que un worker puede estar sirviendo, se borra después.
+    """
+    variant = ModelVariant.objects.filter(model=mlmodel, kind=kind).first() or ModelVariant(model=mlmodel, kind=kind)
+    for field, value in {'source_sha256': source_sha, 'error_message': '', **fields}.items():
+        setattr(variant, field, value)
+    previous = variant.file.name if variant.file else ''
+    if data is not None:
+        stem = slugify(os.path.splitext(os.path.basename(mlmodel.file.name))[0])
+        variant.file.save(f"{stem}_{kind}_{fields['sha256'][:12]}.onnx", ContentFile(data), save=False)
+    variant.save()
+    if previous and previous != variant.file.name:
+        variant.file.storage.delete(previous)
+    return variant
+
+
+def _activate(mlmodel, serving, source_sha) -> bool:
+    """
+    Deja `serving` como variante activa solo si el archivo del modelo sigue
+    siendo el que se convirtió. El lock del MLModel serializa con una subida
+    concurrente, que resetea serving_variant al guardar.
+    """
+    with transaction.atomic():
+        current = MLModel.objects.select_for_update().only('file', 'file_sha256').get(pk=mlmodel.pk)
+        if (current.file_sha256 or file_sha256(current.file.path)) != source_sha:
+            return False
+        # update() para no disparar las señales de post_save del MLModel
+        MLModel.objects.filter(pk=mlmodel.pk).update(serving_variant=serving)
+    return True
+
+
+def build_variants(mlmodel) -> list:
+    """
+    Genera y valida las variantes ONNX de `mlmodel` y activa la más rápida.
+    Devuelve la lista de ModelVariant (con su estado).
+    """
+    if mlmodel.framework not in CONVERTIBLE_FRAMEWORKS:
+        raise ValueError(f"Solo se convierten modelos {', '.join(CONVERTIBLE_FRAMEWORKS)}")
+
+    source_sha = file_sha256(mlmodel.file.path)
+    inputs = generated_inputs(mlmodel, getattr(settings, 'ANALYSIS_VARIANT_PARITY_ROWS', 256))
+    rows = inputs.tolist()
+    runs = getattr(settings, 'ANALYSIS_VARIANT_BENCH_RUNS', 20)
+
+    adapter = ADAPTERS[mlmodel.framework]
+    with open(mlmodel.file.path, 'rb') as f:
+        original = adapter.load(f)
+    baseline_ms, baseline = measure(adapter, original, rows, runs)
+
+    kinds = ['onnx']
+    if getattr(settings, 'ANALYSIS_VARIANT_QUANTIZE', True):
+        kinds.append('onnx-int8')
+
+    onnx_adapter = ADAPTERS['onnx']
+    variants, fp32_bytes = [], None
+    for kind in kinds:
+        try:
+            if fp32_bytes is None:
+                fp32_bytes = match_output_rank(export_onnx(mlmodel.framework, original, inputs), baseline)
+            if kind == 'onnx-int8' and not quantizable(fp32_bytes):
+                logger.info("MLModel %s: el grafo no tiene operadores cuantizables, sin variante int8", mlmodel.pk)
+                continue
+            data = fp32_bytes if kind == 'onnx' else quantize_int8(fp32_bytes)
+            session = onnx_adapter.load(io.BytesIO(data))
+            latency_ms, output = measure(onnx_adapter, session, rows, runs)
+            delta = parity_delta(baseline, output)
+        except Exception as exc:
+            logger.warning("Variante %s de MLModel %s falló: %s", kind, mlmodel.pk, exc)
+            variants.append(_save_variant(
+                mlmodel, kind, source_sha, status="FAILED", error_message=str(exc),
+                latency_ms=None, baseline_latency_ms=baseline_ms, accuracy_delta=None,
+            ))
+            continue
+
+        variant = _save_variant(
+            mlmodel, kind, source_sha, data=data,
+            status="VALID" if delta <= _tolerance(baseline) else "INVALID",
+            sha256=hashlib.sha256(data).hexdigest(),
+            latency_ms=latency_ms, baseline_latency_ms=baseline_ms, accuracy_delta=delta,
+        )
+        logger.info(
+            "Variante %s de MLModel %s: %s, %.3fms (original %.3fms), delta %s",
+            kind, mlmodel.pk, variant.status, latency_ms, baseline_ms, delta,
+        )
+        variants.append(variant)
+
+    valid = [v for v in variants if v.status == "VALID" and v.latency_ms < baseline_ms]
+    serving = min(valid, key=lambda v: v.latency_ms) if valid else None
+    if not _activate(mlmodel, serving, source_sha):
+        logger.warning("MLModel %s cambió de archivo durante la conversión; no se activa ninguna variante", mlmodel.pk)
+        return variants
+    logger.info("MLModel %s se sirve con %s", mlmodel.pk, serving.kind if serving else "el archivo original")
+    return variants
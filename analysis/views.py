@@ -9,9 +9,10 @@ Define el ViewSet para exponer endpoints de creación,
 listado y detalle de análisis mediante la API REST.
 """
 from django.conf import settings
+import hmac
 import json
 import os
-from django.http import FileResponse, Http404, HttpResponse
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
 from rest_framework import viewsets, permissions, authentication, mixins, generics
 from rest_framework.decorators import action
 from rest_framework.generics import ListAPIView
@@ -27,13 +28,25 @@ from .serializador import LaunchAnalysisSerializer, AnalysisResultSerializer, Hy
 from .filtros import AnalysisResultFilter
 from .reportes import SimpleReportGenerator
 from datasets.permissions import IsOwner
-from .tasks import launch_analysis_task
-
-class AnalysisViewSet(viewsets.GenericViewSet):
+from . import outbox
+from .admission import AdmissionMixin
+from .sync_inference import try_sync_inference, try_cached_inference, save_result
+from .result_store import read_page, iter_json_chunks
+from .metrics_exporter import scrape
+from .notifications import analysis_message, status_cache, status_key
+from .status_watch import status_response
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+class AnalysisViewSet(AdmissionMixin, viewsets.GenericViewSet):
     """
     ViewSet genérico que delega en serializers diferentes
     según la acción: creación vs. consulta de resultados.
+    La creación pasa por el control de admisión 'analysis'.
     """
+    admission_scope = "analysis"
     queryset = AnalysisResult.objects.all()
     authentication_classes = [
         authentication.SessionAuthentication,
@@ -56,14 +69,35 @@ class AnalysisViewSet(viewsets.GenericViewSet):
         serializer = self.get_serializer(data=request.data, context={"request": request})
         serializer.is_valid(raise_exception=True)
 
-        # Creamos el registro con parámetros enviados
-        analysis = serializer.save(status="PENDING")
-        # Encolamos la tarea
-        print(type(request.data), request.data)
-        launch_analysis_task.delay(analysis.id)
+        # Si el mismo vector ya se puntuó con este archivo de modelo, se responde
+        # desde la cache de predicciones. Si no, el modo síncrono opcional
+        # (?sync=1) corre el predict en proceso cuando el modelo está caliente.
+        params = serializer.parsed_parameters()
+        if "vector_2d" in params:
+            mlmodel = serializer.validated_data["model"]
+            outcome = try_cached_inference(mlmodel, params["vector_2d"])
+            if outcome is None and self._wants_sync(request):
+                outcome = try_sync_inference(mlmodel, params["vector_2d"])
+            if outcome is not None:
+                metrics, predictions = outcome
+                analysis = save_result(serializer, mlmodel, metrics, predictions)
+                output = AnalysisResultSerializer(analysis).data
+                output["predictions"] = predictions
+                return Response(output, status=status.HTTP_201_CREATED)
+
+        # Creamos el registro y su fila de outbox en la misma transacción;
+        # el dispatcher la publica en el broker (ver analysis/outbox.py)
+        with transaction.atomic():
+            analysis = serializer.save(status="PENDING")
+            outbox.enqueue(analysis)
 
         output = AnalysisResultSerializer(analysis).data
         return Response(output, status=status.HTTP_202_ACCEPTED)
+
+    @staticmethod
+    def _wants_sync(request):
+        value = request.query_params.get("sync") or request.data.get("sync")
+        return str(value).lower() in ("1", "true", "yes")
       
     def list(self, request):
         """
@@ -92,6 +126,112 @@ class AnalysisViewSet(viewsets.GenericViewSet):
         serializer = AnalysisResultSerializer(instance)
         return Response(serializer.data)
 
+    @action(detail=False, methods=["get"], url_path="status")
+    def bulk_status(self, request):
+        """
+        GET /api/v1/analysis/status/?ids=1,2,3
+        GET /api/v1/analysis/status/?updated_since=<ISO 8601>
+        GET /api/v1/analysis/status/?cursor=<cursor de la respuesta anterior>
+
+        Estado compacto de varios análisis del usuario en una petición. Con
+        ids se responde primero desde la cache de estados (la que escriben
+        los workers al notificar, ver analysis/notifications.py) y los que
+        falten salen de una sola consulta por pk acotada al usuario. Con
+        updated_since o cursor se pagina por keyset sobre (updated_at, id)
+        con el índice (owner, updated_at, id); el cursor de la respuesta
+        continúa justo después de la última fila, aunque varias compartan
+        updated_at.
+        """
+        limit = getattr(settings, "ANALYSIS_BULK_STATUS_MAX", 200)
+        raw_ids = request.query_params.get("ids")
+        raw_since = request.query_params.get("updated_since")
+        raw_cursor = request.query_params.get("cursor")
+
+        if raw_ids:
+            try:
+                ids = list(dict.fromkeys(int(v) for v in raw_ids.split(",") if v.strip()))
+            except ValueError:
+                return Response({"ids": "Lista de enteros separados por coma."}, status=status.HTTP_400_BAD_REQUEST)
+            if len(ids) > limit:
+                return Response({"ids": f"Máximo {limit} ids por petición."}, status=status.HTTP_400_BAD_REQUEST)
+            return Response({"results": _status_rows_by_id(request.user, ids)})
+
+        if raw_cursor or raw_since:
+            try:
+                since, after_id = _parse_cursor(raw_cursor) if raw_cursor else (_parse_since(raw_since), None)
+            except ValueError as exc:
+                field = "cursor" if raw_cursor else "updated_since"
+                return Response({field: str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+            after = Q(updated_at__gt=since)
+            if after_id is not None:
+                after |= Q(updated_at=since, id__gt=after_id)
+            rows = list(
+                _status_values(self.queryset.filter(after, owner=request.user))
+                .order_by("updated_at", "id")[:limit]
+            )
+            last = (rows[-1]["updated_at"], rows[-1]["id"]) if rows else (since, after_id)
+            return Response({
+                "results": [_status_row(r) for r in rows],
+                "cursor": _format_cursor(*last),
+                "more": len(rows) == limit,
+            })
+
+        return Response({"detail": "Indica ids o updated_since."}, status=status.HTTP_400_BAD_REQUEST)
+
+
+def _parse_since(raw):
+    since = parse_datetime(raw)
+    if since is None:
+        raise ValueError("Fecha ISO 8601 inválida.")
+    return timezone.make_aware(since) if timezone.is_naive(since) else since
+
+
+def _format_cursor(updated_at, analysis_id) -> str:
+    """'<updated_at ISO 8601>,<id>' (sin id si aún no hubo filas)."""
+    return f"{updated_at.isoformat()},{'' if analysis_id is None else analysis_id}"
+
+
+def _parse_cursor(raw):
+    since, _, analysis_id = raw.rpartition(",")
+    try:
+        return _parse_since(since), int(analysis_id) if analysis_id else None
+    except ValueError:
+        raise ValueError("Cursor inválido.")
+
+
+def _status_values(qs):
+    return qs.values("id", "model_id", "status", "updated_at", "error_message", "metrics__progress")
+
+
+def _status_row(values) -> dict:
+    row = {k: values[k] for k in ("id", "model_id", "status", "updated_at")}
+    if values.get("metrics__progress") and values["status"] == "RUNNING":
+        row["progress"] = values["metrics__progress"]
+    if values.get("error_message"):
+        row["error"] = values["error_message"]
+    return row
+
+
+def _status_rows_by_id(user, ids) -> list:
+    """Filas en el orden de `ids`; las ajenas o inexistentes se omiten."""
+    cached = status_cache().get_many([status_key("analysis", pk) for pk in ids])
+    rows = {}
+    for entry in cached.values():
+        message = entry["message"]
+        if entry.get("owner_id") == user.pk:
+            rows[message["analysis_id"]] = {
+                "id": message["analysis_id"],
+                "model_id": message.get("model_id"),
+                "status": message["status"],
+                "updated_at": message.get("updated_at"),
+                **{k: message[k] for k in ("progress", "error") if k in message},
+            }
+    missing = [pk for pk in ids if pk not in rows]
+    if missing:
+        qs = AnalysisResult.objects.filter(pk__in=missing, owner=user)
+        rows.update((v["id"], _status_row(v)) for v in _status_values(qs))
+    return [rows[pk] for pk in ids if pk in rows]
+
 
 class ResultController(viewsets.GenericViewSet,
                        mixins.ListModelMixin,
@@ -141,15 +281,23 @@ class ResultController(viewsets.GenericViewSet,
         if not os.path.exists(file_path):
             raise Http404("Archivo de salida no encontrado.")
 
-        file_handle = open(file_path, 'rb')
-
-        # 4) Devolver FileResponse con el nombre original
+        # 4) Exportación JSON negociada (?export=json o Accept: application/json)
         filename = os.path.basename(file_path)
-        response = FileResponse(file_handle, as_attachment=True, filename=filename)
+        if file_path.endswith('.npy') and self._wants_json(request):
+            response = StreamingHttpResponse(iter_json_chunks(file_path), content_type='application/json')
+            json_name = os.path.splitext(filename)[0] + '.json'
+            response['Content-Disposition'] = f'attachment; filename="{json_name}"'
+            return response
+
+        # 5) Devolver FileResponse con el nombre original
+        file_handle = open(file_path, 'rb')
+        return FileResponse(file_handle, as_attachment=True, filename=filename)
 
-        # 5) Opcional: ajustar Content-Type si conoces el formato
-        # response['Content-Type'] = 'application/json'
-        return response
+    @staticmethod
+    def _wants_json(request):
+        if request.query_params.get('export') == 'json':
+            return True
+        return 'application/json' in request.META.get('HTTP_ACCEPT', '')
 
 
 
@@ -184,10 +332,25 @@ class HyperparameterListView(ListAPIView):
             model_id=model_id
         ).order_by('position')
     
+def _non_negative_param(request, name, default) -> int:
+    """Entero >= 0 de la query string; ValueError con un mensaje para el cliente si no lo es."""
+    raw = request.query_params.get(name)
+    if raw in (None, ""):
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        raise ValueError(f"'{name}' debe ser un entero.")
+    if value < 0:
+        raise ValueError(f"'{name}' no puede ser negativo.")
+    return value
+
+
 class UserAnalysisAPIView(generics.RetrieveAPIView):
     """
     Vista de API que permite a un usuario ver los detalles de un análisis específico,
-    leyendo la predicción de un archivo JSON y mapeándola a texto.
+    leyendo la predicción del archivo de resultado (.npy o .json) y mapeándola a texto.
+    Admite ?offset=&limit= para paginar resultados grandes sin leerlos completos.
     """
     queryset = UserAnalysis.objects.all()
     serializer_class = UserAnalysisSerializer
@@ -208,36 +371,29 @@ class UserAnalysisAPIView(generics.RetrieveAPIView):
             instance = self.get_object()
             analysis_result = instance.analysis
             
-            # 2. Lee el archivo JSON del resultado
+            # 2. Lee el archivo de resultado (.npy con mmap o .json), solo la página pedida
             file_path = os.path.join(settings.MEDIA_ROOT, analysis_result.output_path)
             
             if not os.path.exists(file_path):
                 return Response({"error": "Archivo de resultado no encontrado."}, status=status.HTTP_404_NOT_FOUND)
-            
-            with open(file_path, 'r') as f:
-                resultado_data = json.load(f)
-
-            # 3. Extrae la predicción numérica del JSON. 
-            # Asume que la predicción está en una clave 'prediccion' o similar.
-            predictions_list = resultado_data 
-
-            # Create a list to hold the mapped text labels
-            resultados_mapeados = []
-
-            for pred_num in predictions_list:
-                try:
-                    # Get the mapping for each number
-                    mapeo = MapeoResultado.objects.get(
-                        model=analysis_result.model,
-                        valor_prediccion=pred_num
-                    )
-                    # Add the text label to the list
-                    resultados_mapeados.append(mapeo.etiqueta_texto)
-                except MapeoResultado.DoesNotExist:
-                    resultados_mapeados.append("Mapeo no encontrado")
-            
-            if predictions_list is None:
-                return Response({"error": "Formato de archivo de resultado inválido."}, status=status.HTTP_400_BAD_REQUEST)
+
+            try:
+                offset = _non_negative_param(request, "offset", 0)
+                limit = _non_negative_param(request, "limit", getattr(settings, "ANALYSIS_RESULT_PAGE_SIZE", 1000))
+            except ValueError as exc:
+                return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+            predictions_list, total = read_page(file_path, offset, offset + limit)
+
+            # 3. Mapea cada predicción numérica a su etiqueta con una sola consulta
+            mapeos = dict(
+                MapeoResultado.objects.filter(model=analysis_result.model)
+                .values_list("valor_prediccion", "etiqueta_texto")
+            )
+            resultados_mapeados = [
+                mapeos.get(pred_num, "Mapeo no encontrado")
+                if isinstance(pred_num, (int, float)) else "Mapeo no encontrado"
+                for pred_num in predictions_list
+            ]
 
             # 5. Prepara los datos de la respuesta
             data = {
@@ -247,6 +403,8 @@ class UserAnalysisAPIView(generics.RetrieveAPIView):
                 "status": analysis_result.status,
                 "resultado_numerico": predictions_list,
                 "resultado_texto": resultados_mapeados,
+                "offset": offset,
+                "total": total,
                 "created_at": analysis_result.created_at,
             }
             return Response(data, status=status.HTTP_200_OK)
@@ -316,3 +474,37 @@ class LastUserAnalysisAPIView(generics.RetrieveAPIView):
         }
         return Response(data, status=status.HTTP_200_OK)
 
+
+def metrics_view(request):
+    """
+    GET /metrics: métricas en formato de texto de Prometheus (ver
+    analysis/metrics_exporter.py). Solo lee la cache, nunca la BD. Exige
+    'Authorization: Bearer <ANALYSIS_METRICS_TOKEN>'; sin token configurado
+    responde 401 salvo con ANALYSIS_METRICS_PUBLIC.
+    """
+    token = getattr(settings, 'ANALYSIS_METRICS_TOKEN', '')
+    if not token and not getattr(settings, 'ANALYSIS_METRICS_PUBLIC', False):
+        return HttpResponse(status=401)
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}"):
+        return HttpResponse(status=401)
+    return HttpResponse(scrape(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def _analysis_snapshot(user, pk):
+    analysis = (
+        AnalysisResult.objects.filter(pk=pk, dataset__owner=user)
+        .only("id", "model_id", "status", "metrics", "error_message")
+        .first()
+    )
+    if analysis is None:
+        return None
+    return analysis_message(analysis, analysis.status, error=analysis.error_message)
+
+
+async def analysis_status_view(request, pk):
+    """
+    GET /api/v1/analysis/<pk>/status/: espera un cambio de estado del
+    análisis (long-poll, o SSE con Accept: text/event-stream). Ver
+    analysis/status_watch.py.
+    """
+    return await status_response(request, "analysis", pk, _analysis_snapshot)
@@ -0,0 +1,123 @@
+# analysis/warmup.py
+"""
+Precarga de modelos al arrancar cada proceso worker de Celery.
+
+En worker_process_init (ya en el proceso hijo, antes de que consuma tareas)
+se cargan en la cache del proceso los MLModel configurados o los más usados
+recientemente, y se ejecuta un predict de prueba armado con sus
+HyperparameterDefinition para que el framework inicialice kernels, JIT y
+pools de hilos (antes se fija el presupuesto de hilos del proceso, ver
+thread_budget). El tiempo de carga y de predict de cada modelo queda en el log.
+
+El proceso padre espera a que el hijo termine esta señal hasta
+CELERY_WORKER_PROC_ALIVE_TIMEOUT; ese valor debe cubrir el warm-up.
+"""
+
+import time
+import logging
+from datetime import timedelta
+from celery.signals import worker_process_init
+from django.conf import settings
+from django.db import connections
+from django.db.models import Count
+from django.utils import timezone
+from .models import MLModel, AnalysisResult
+from .ml_inference import get_adapter, load_model, run_predict
+from .thread_budget import apply_process_budget
+
+logger = logging.getLogger(__name__)
+
+# Valor de relleno por dtype, del mismo tipo que produce LaunchAnalysisSerializer
+DUMMY_VALUES = {'int': 0, 'float': 0.0, 'str': ''}
+
+
+def dummy_inputs(mlmodel) -> list:
+    """Una fila con un valor neutro por cada hiperparámetro, en orden de position."""
+    return [[DUMMY_VALUES.get(hp.dtype, 0.0) for hp in mlmodel.hyperparams.all()]]
+
+
+def models_to_warm():
+    """
+    MLModel a precargar: los ids de ANALYSIS_WARMUP_MODEL_IDS si se
+    configuraron; si no, los ANALYSIS_WARMUP_TOP_N con más análisis en las
+    últimas ANALYSIS_WARMUP_WINDOW_HOURS horas.
+    """
+    qs = MLModel.objects.select_related('serving_variant').prefetch_related('hyperparams')
+    model_ids = getattr(settings, 'ANALYSIS_WARMUP_MODEL_IDS', [])
+    if model_ids:
+        by_id = qs.in_bulk([int(pk) for pk in model_ids])
+        return [by_id[int(pk)] for pk in model_ids if int(pk) in by_id]
+
+    top_n = getattr(settings, 'ANALYSIS_WARMUP_TOP_N', 3)
+    if top_n <= 0:
+        return []
+    since = timezone.now() - timedelta(hours=getattr(settings, 'ANALYSIS_WARMUP_WINDOW_HOURS', 24))
+    ranked = (
+        AnalysisResult.objects.filter(created_at__gte=since)
+        .values('model_id')
+        .annotate(n=Count('id'))
+        .order_by('-n')[:top_n]
+    )
+    ids = [row['model_id'] for row in ranked]
+    by_id = qs.in_bulk(ids)
+    return [by_id[pk] for pk in ids if pk in by_id]
+
+
+def warm_model(mlmodel) -> dict:
+    """Carga el modelo en la cache del proceso y ejecuta un predict de prueba."""
+    report = {'model_id': mlmodel.pk, 'framework': mlmodel.runtime_framework}
+    adapter = get_adapter(mlmodel.runtime_framework)
+    model_path = mlmodel.runtime_path
+
+    start = time.perf_counter()
+    model_obj = load_model(adapter, mlmodel.runtime_framework, model_path, mlmodel.pk)
+    report['load_ms'] = round((time.perf_counter() - start) * 1000, 3)
+
+    inputs = dummy_inputs(mlmodel)
+    if inputs[0] and not adapter.uses_dataset:
+        start = time.perf_counter()
+        run_predict(adapter, model_obj, inputs, model_path)
+        report['predict_ms'] = round((time.perf_counter() - start) * 1000, 3)
+    return report
+
+
+def warm_up(models=None) -> list:
+    """
+    Precarga `models` (o models_to_warm()) y devuelve un reporte por modelo.
+    Un modelo que falla se reporta con 'error' y no detiene a los demás.
+    """
+    started = time.perf_counter()
+    reports = []
+    for mlmodel in models if models is not None else models_to_warm():
+        try:
+            report = warm_model(mlmodel)
+        except Exception as exc:
+            logger.warning("Warm-up de MLModel %s falló: %s", mlmodel.pk, exc)
+            report = {'model_id': mlmodel.pk, 'framework': mlmodel.runtime_framework, 'error': str(exc)}
+        else:
+            logger.info(
+                "Warm-up MLModel %s (%s): carga %sms, predict %sms",
+                mlmodel.pk, mlmodel.runtime_framework, report['load_ms'], report.get('predict_ms'),
+            )
+        reports.append(report)
+    if reports:
+        logger.info(
+            "Warm-up de %s modelos completado en %.3fs", len(reports), time.perf_counter() - started
+        )
+    return reports
+
+
+@worker_process_init.connect
+def warm_up_worker_process(**kwargs):
+    # Primero el presupuesto de hilos: el warm-up ya importa los frameworks
+    apply_process_budget()
+    if not getattr(settings, 'ANALYSIS_WARMUP_ENABLED', True):
+        return
+    try:
+        warm_up()
+    except Exception:
+        # Sin base de datos u otro fallo global: el worker arranca en frío
+        logger.exception("Warm-up del worker falló")
+    finally:
+        # La conexión abierta aquí no debe reutilizarse entre tareas del hijo
+        connections.close_all()
@@ -8,11 +8,13 @@ from rest_framework_simplejwt.authentication import JWTAuthentication
 from .models import MetaData
 from .serializadorDataset import DatasetSerializer
 from .permissions import IsOwner
+from analysis.admission import AdmissionMixin
 
 
 
 
 class DatasetViewSet(
+    AdmissionMixin,
     mixins.ListModelMixin,
     mixins.CreateModelMixin,
     mixins.RetrieveModelMixin,
@@ -26,7 +28,10 @@ class DatasetViewSet(
       - retrieve: ver detalles si es owner.
       - update/partial_update: modificar atributos propios.
       - destroy: eliminar dataset propio.
+    Las subidas pasan por el control de admisión 'upload'
+    (analysis/admission.py).
     """
+    admission_scope = 'upload'
     authentication_classes = [
         JWTAuthentication,
     ]
@@ -0,0 +1,159 @@
+# locust_fairness.py
+"""
+Prueba de carga de equidad: latencia de cola de usuarios livianos mientras
+un usuario pesado inunda el servicio de análisis.
+
+- HeavyUser (1 instancia): encola análisis sin pausa con su propia cuenta.
+- LightUser (el resto): lanza un análisis de una fila cada pocos segundos
+  y espera a que termine con el long-poll /api/v1/analysis/<id>/status/.
+  El tiempo desde el POST hasta SUCCESS/FAILURE se registra como
+  "ANALYSIS completion:light" (y "completion:heavy" para una muestra del
+  usuario pesado). Al terminar se imprimen p50/p95/p99 de ambos.
+
+Para comparar, correr dos veces con el mismo número de workers: una con
+ANALYSIS_FAIR_MAX_IN_FLIGHT=0 (todo el backlog va al broker, FIFO) y otra
+con el valor por defecto (reparto justo del outbox, analysis/fair_scheduler.py).
+Con reparto justo el p95 de completion:light debería quedar cerca de la
+latencia de un análisis aislado; sin él crece con el backlog del pesado.
+
+Variables de entorno:
+  HEAVY_ACCOUNT   usuario:clave del usuario pesado   (pesado:hola1234)
+  LIGHT_ACCOUNTS  usuario:clave,usuario:clave ...    (usuarioprueba:hola1234)
+  MODEL_ID / DATASET_ID                              (1 / 1)
+  HEAVY_MODE      vector | dataset                   (vector)
+  HEAVY_SAMPLE    1 de cada N análisis pesados se sigue hasta el final (50)
+
+Uso:
+  locust -f locust_fairness.py --headless -u 21 -r 5 --run-time 5m --host=http://localhost:8000
+"""
+
+import os
+import time
+import random
+import itertools
+from locust import HttpUser, task, between, constant, events
+
+MODEL_ID = int(os.environ.get("MODEL_ID", 1))
+DATASET_ID = int(os.environ.get("DATASET_ID", 1))
+HEAVY_MODE = os.environ.get("HEAVY_MODE", "vector")
+HEAVY_SAMPLE = int(os.environ.get("HEAVY_SAMPLE", 50))
+TERMINAL = ("SUCCESS", "FAILURE")
+# Tope de espera por análisis antes de darlo por perdido
+MAX_WAIT_SECONDS = 600
+
+
+def _accounts(raw):
+    return [tuple(item.split(":", 1)) for item in raw.split(",") if ":" in item]
+
+
+HEAVY_ACCOUNT = _accounts(os.environ.get("HEAVY_ACCOUNT", "pesado:hola1234"))[0]
+LIGHT_ACCOUNTS = itertools.cycle(_accounts(os.environ.get("LIGHT_ACCOUNTS", "usuarioprueba:hola1234")))
+
+
+def vector_payload():
+    payload = {"model": MODEL_ID, "dataset": DATASET_ID}
+    for i in range(1, 5):
+        payload[f"param_{i}"] = round(random.uniform(0, 6), 1)
+    return payload
+
+
+class AnalysisClient(HttpUser):
+    abstract = True
+
+    def on_start(self):
+        username, password = self.account()
+        self.headers = {"Content-Type": "application/json"}
+        resp = self.client.post("/api/v1/accounts/login/", json={"username": username, "password": password},
+                                name="auth:jwt", timeout=10)
+        token = None
+        if resp.status_code in (200, 201):
+            try:
+                data = resp.json()
+                token = data.get("access") or data.get("token") or data.get("access_token")
+            except Exception:
+                token = None
+        if token:
+            self.headers["Authorization"] = f"Bearer {token}"
+
+    def account(self):
+        raise NotImplementedError
+
+    def submit(self, payload, name):
+        with self.client.post("/api/v1/analysis/", json=payload, headers=self.headers,
+                              catch_response=True, name=name, timeout=30) as resp:
+            if resp.status_code not in (200, 201, 202):
+                resp.failure(f"Create analysis failed: {resp.status_code} {resp.text[:200]}")
+                return None, None
+            data = resp.json()
+            return data.get("id"), data.get("status")
+
+    def wait_until_done(self, analysis_id, status, started, label):
+        """Long-poll hasta un estado terminal; registra la latencia total como evento."""
+        deadline = started + MAX_WAIT_SECONDS
+        while status not in TERMINAL and time.time() < deadline:
+            res = self.client.get(
+                f"/api/v1/analysis/{analysis_id}/status/", params={"since": status or "PENDING", "timeout": 25},
+                headers=self.headers, name="GET /api/v1/analysis/:id/status/ (long-poll)", timeout=40,
+            )
+            if res.status_code != 200:
+                time.sleep(1)
+                continue
+            status = res.json()["message"]["status"]
+
+        events.request.fire(
+            request_type="ANALYSIS",
+            name=f"completion:{label}",
+            response_time=(time.time() - started) * 1000,
+            response_length=0,
+            exception=None if status in TERMINAL else TimeoutError(f"AnalysisResult {analysis_id} sin terminar"),
+            context={},
+        )
+
+
+class HeavyUser(AnalysisClient):
+    """Un solo cliente que inunda la cola."""
+    fixed_count = 1
+    wait_time = constant(0)
+
+    def account(self):
+        return HEAVY_ACCOUNT
+
+    @task
+    def flood(self):
+        payload = vector_payload()
+        if HEAVY_MODE == "dataset":
+            payload = {"model": MODEL_ID, "dataset": DATASET_ID, "mode": "dataset"}
+        started = time.time()
+        analysis_id, status = self.submit(payload, "POST /api/v1/analysis/ (heavy)")
+        if analysis_id and random.randrange(HEAVY_SAMPLE) == 0:
+            self.wait_until_done(analysis_id, status, started, "heavy")
+
+
+class LightUser(AnalysisClient):
+    """Clientes interactivos: un análisis de una fila y esperan el resultado."""
+    wait_time = between(1, 3)
+
+    def account(self):
+        return next(LIGHT_ACCOUNTS)
+
+    @task
+    def single_row(self):
+        started = time.time()
+        analysis_id, status = self.submit(vector_payload(), "POST /api/v1/analysis/ (light)")
+        if analysis_id:
+            self.wait_until_done(analysis_id, status, started, "light")
+
+
+@events.test_stop.add_listener
+def report_tail_latency(environment, **kwargs):
+    for label in ("light", "heavy"):
+        entry = environment.stats.get(f"completion:{label}", "ANALYSIS")
+        if not entry.num_requests:
+            continue
+        print(
+            f"completion:{label} n={entry.num_requests} "
+            f"p50={entry.get_response_time_percentile(0.5):.0f}ms "
+            f"p95={entry.get_response_time_percentile(0.95):.0f}ms "
+            f"p99={entry.get_response_time_percentile(0.99):.0f}ms "
+            f"fallos={entry.num_failures}"
+        )
@@ -3,6 +3,8 @@ import time
 from celery import shared_task
 from django.utils import timezone
 from .models import PreprocessingJob
+from analysis.metrics_exporter import collector
+from analysis.notifications import notify_preprocessing
 import pandas as pd
 import io
 
@@ -12,6 +14,7 @@ def process_preprocessing_job(self, job_id):
     job.status = PreprocessingJob.Status.RUNNING
     job.started_at = timezone.now()
     job.save(update_fields=['status', 'started_at'])
+    notify_preprocessing(job)
 
     try:
         df = pd.read_csv(job.dataset.file.path)
@@ -30,12 +33,23 @@ def process_preprocessing_job(self, job_id):
         job.finished_at = timezone.now()
         job.log += f"\n Procesadas {len(df_clean)} filas."
         job.save()
+        _observe_duration(job)
+        notify_preprocessing(job)
     except Exception as exc:
         job.status = PreprocessingJob.Status.FAILED
         job.finished_at = timezone.now()
         job.error_message = str(exc)
         job.log += f"\n ERROR: {exc}"
         job.save()
+        _observe_duration(job)
+        notify_preprocessing(job)
         raise self.retry(exc=exc)
 
 
+def _observe_duration(job):
+    """Duración del job para el histograma preprocessing_job_seconds de /metrics."""
+    collector.observe(
+        'preprocessing_job_seconds',
+        (job.finished_at - job.started_at).total_seconds(),
+        {'status': job.status},
+    )
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import PreprocessingJobViewSet
+from .views import PreprocessingJobViewSet, preprocessing_status_view
 
 router = DefaultRouter()
 router.register(
@@ -10,5 +10,6 @@ router.register(
 )
 
 urlpatterns = [
+    path('preprocessing-jobs/<int:pk>/status/', preprocessing_status_view, name='preprocessingjob-status'),
     path('', include(router.urls)),
 ]
@@ -8,6 +8,8 @@ from rest_framework_simplejwt.authentication import JWTAuthentication
 from preprocessing.models import PreprocessingJob
 from preprocessing.serializador import PreprocessingJobSerializer
 from preprocessing.task import process_preprocessing_job
+from analysis.notifications import preprocessing_message
+from analysis.status_watch import status_response
 
 class PreprocessingJobViewSet(viewsets.ModelViewSet):
     queryset = PreprocessingJob.objects.all()
@@ -35,3 +37,11 @@ class PreprocessingJobViewSet(viewsets.ModelViewSet):
         process_preprocessing_job.delay(job.id)
 
 
+def _job_snapshot(user, pk):
+    job = PreprocessingJob.objects.filter(pk=pk, owner=user).first()
+    return preprocessing_message(job) if job else None
+
+
+async def preprocessing_status_view(request, pk):
+    """GET /api/v1/preprocessing-jobs/<pk>/status/: long-poll/SSE del estado del job."""
+    return await status_response(request, "preprocessing", pk, _job_snapshot)